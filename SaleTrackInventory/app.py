@@ -1,11 +1,20 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, make_response, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, abort, Response, stream_with_context
 from flask_login import LoginManager, login_required, current_user
-from storage import Storage
-from auth import init_auth, User
+from werkzeug.local import LocalProxy
+from models.gst_returns import filing_period, period_bounds
+from storage import InsufficientStock, Storage
+from utils.batch_invoices import stream_zip
+from utils.invoice_numbers import invoice_filename
+from utils.render_queue import QueueFull
+from utils.sheet_reader import SUPPORTED_EXTENSIONS, preview_sheet
+from auth import init_auth
 import logging
-import pandas as pd
-from io import BytesIO
 import json
+import os
+import threading
+import time
+import click
+from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,12 +27,27 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Initialize storage
-storage = Storage()
+# Storage is built on first use, not at import: spawned PDF render workers
+# re-import the main module, and must not open the database or start the
+# delivery outbox
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = Storage()
+        return _storage
+
+storage = LocalProxy(get_storage)
 
 # Initialize authentication
 init_auth(app, login_manager, storage)
 
+# Columns the POS product picker needs
+POS_PRODUCT_FIELDS = ['id', 'name', 'price', 'gst_rate', 'quantity', 'barcode']
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -36,27 +60,51 @@ def dashboard():
     stats = storage.get_dashboard_stats()
     return render_template('dashboard.html', stats=stats, user=current_user)
 
+@app.route('/dashboard/series')
+@login_required
+def dashboard_series():
+    try:
+        data = storage.get_sales_series(request.args.get('granularity', 'day'),
+                                        request.args.get('start') or None,
+                                        request.args.get('end') or None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(data)
+
+@app.route('/dashboard/rebuild', methods=['POST'])
+@login_required
+def rebuild_dashboard():
+    drift = storage.rebuild_dashboard_stats()
+    return jsonify({
+        'status': 'success',
+        'drift': {key: {'running': running, 'rebuilt': rebuilt}
+                  for key, (running, rebuilt) in drift.items()}
+    })
+
 @app.route('/inventory', methods=['GET', 'POST'])
 @login_required
 def inventory():
     if request.method == 'POST':
         if 'action' in request.form:
             if request.form['action'] == 'add':
-                storage.add_product(
-                    name=request.form['name'],
-                    price=float(request.form['price']),
-                    quantity=int(request.form['quantity']),
-                    mrp=float(request.form['mrp']),
-                    barcode=request.form.get('barcode'),
-                    unit=request.form.get('unit'),
-                    category=request.form.get('category'),
-                    hsn_code=request.form.get('hsn_code'),
-                    gst_rate=int(request.form.get('gst_rate', 0)),
-                    cess_rate=int(request.form.get('cess_rate', 0))
-                )
-                flash('Product added successfully!', 'success')
+                try:
+                    storage.add_product(
+                        name=request.form['name'],
+                        price=float(request.form['price']),
+                        quantity=int(request.form['quantity']),
+                        mrp=float(request.form['mrp']),
+                        barcode=request.form.get('barcode'),
+                        unit=request.form.get('unit'),
+                        category=request.form.get('category'),
+                        hsn_code=request.form.get('hsn_code'),
+                        gst_rate=int(request.form.get('gst_rate', 0)),
+                        cess_rate=int(request.form.get('cess_rate', 0))
+                    )
+                    flash('Product added successfully!', 'success')
+                except ValueError as e:
+                    flash(str(e), 'error')
             elif request.form['action'] == 'update':
-                storage.update_product(
+                updated = storage.update_product(
                     id=int(request.form['id']),
                     name=request.form['name'],
                     price=float(request.form['price']),
@@ -69,7 +117,10 @@ def inventory():
                     gst_rate=int(request.form.get('gst_rate', 0)),
                     cess_rate=int(request.form.get('cess_rate', 0))
                 )
-                flash('Product updated successfully!', 'success')
+                if updated:
+                    flash('Product updated successfully!', 'success')
+                else:
+                    flash('Error updating product (is the barcode already in use?)', 'error')
 
             elif request.form['action'] == 'import':
                 if 'file' not in request.files:
@@ -81,20 +132,61 @@ def inventory():
                     flash('No file selected', 'error')
                     return redirect(request.url)
 
-                if not file.filename.endswith(('.xlsx', '.xls')):
-                    flash('Invalid file format. Please upload an Excel file.', 'error')
+                if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    flash('Invalid file format. Please upload an Excel or CSV file.', 'error')
                     return redirect(request.url)
 
                 try:
-                    storage.import_products_from_excel(file)
-                    flash('Products imported successfully!', 'success')
+                    report = storage.import_products_from_excel(file)
+                    flash(f'Imported {report.imported} products'
+                          f' ({len(report.errors)} row errors)', 'success')
                 except Exception as e:
                     flash(f'Error importing products: {str(e)}', 'error')
 
                 return redirect(url_for('inventory'))
 
-    products = storage.get_products()
-    return render_template('inventory.html', products=products)
+    filters = product_filters(request.args)
+    page = storage.query_products(limit=100, **filters)
+    return render_template('inventory.html',
+                           products=page['items'],
+                           next_cursor=page['next_cursor'],
+                           filters=filters,
+                           categories=storage.get_categories())
+
+def product_filters(args):
+    """Product list filters shared by the inventory page and /products"""
+    low_stock = args.get('low_stock', '')
+    if low_stock in ('1', 'true', 'on'):
+        low_stock = True
+    elif low_stock.isdigit():
+        # Any other number is a custom stock threshold
+        low_stock = int(low_stock)
+    else:
+        low_stock = None
+    return {
+        'category': args.get('category') or None,
+        'name_prefix': args.get('q') or None,
+        'low_stock': low_stock
+    }
+
+@app.route('/products')
+@login_required
+def list_products():
+    fields = [field for field in request.args.get('fields', '').split(',') if field] or None
+    try:
+        page = storage.query_products(fields=fields,
+                                      order=request.args.get('order', 'id'),
+                                      after=request.args.get('after'),
+                                      limit=request.args.get('limit', 50, type=int),
+                                      **product_filters(request.args))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(page)
+
+@app.route('/products/categories')
+@login_required
+def product_categories():
+    return jsonify(storage.get_categories())
 
 @app.route('/inventory/analyze-excel', methods=['POST'])
 def analyze_excel():
@@ -105,34 +197,16 @@ def analyze_excel():
     if file.filename == '':
         return jsonify({'status': 'error', 'message': 'No file selected'}), 400
 
-    if not file.filename.endswith(('.xlsx', '.xls')):
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
         return jsonify({'status': 'error', 'message': 'Invalid file format'}), 400
 
     try:
-        # Save file content
-        file_content = file.read()
+        # Read only the header and the preview rows, never the whole sheet
+        columns, preview_data = preview_sheet(file.stream, file.filename, rows=5)
 
-        # Create BytesIO object and write content
-        excel_file = BytesIO(file_content)
-
-        # Read Excel file using pandas with explicit engine
-        if file.filename.endswith('.xlsx'):
-            df = pd.read_excel(excel_file, engine='openpyxl')
-        else:
-            df = pd.read_excel(excel_file, engine='xlrd')
-
-        # Reset file pointer
-        excel_file.seek(0)
-
-        if df.empty:
+        if not preview_data:
             return jsonify({'status': 'error', 'message': 'Excel file is empty'}), 400
 
-        # Get column names
-        columns = df.columns.tolist()
-
-        # Get preview data (first 5 rows)
-        preview_data = df.head().to_dict('records')
-
         # Convert all data to string format for JSON serialization
         preview_data = [{k: str(v) for k, v in row.items()} for row in preview_data]
 
@@ -161,10 +235,7 @@ def import_excel():
 
     try:
         mappings = json.loads(mappings)
-        df = pd.read_excel(file)
-
-        # Create reverse mapping
-        reverse_mapping = {v: k for k, v in mappings.items() if v}
+        dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes')
 
         # Validate required fields
         required_fields = {'name', 'price', 'quantity'}
@@ -177,77 +248,72 @@ def import_excel():
                 'message': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
 
-        # Process each row
-        success_count = 0
-        errors = []
-        valid_products = []
-
-        for idx, row in df.iterrows():
-            try:
-                # Basic validation
-                name = str(row[reverse_mapping['name']]).strip()
-                if not name:
-                    raise ValueError("Product name cannot be empty")
-
-                price = float(row[reverse_mapping['price']])
-                if price <= 0:
-                    raise ValueError("Price must be greater than 0")
-
-                quantity = int(row[reverse_mapping['quantity']])
-                if quantity < 0:
-                    raise ValueError("Quantity cannot be negative")
-
-                # GST validation
-                gst_rate = 0
-                if 'gst_rate' in reverse_mapping:
-                    gst_rate = float(row[reverse_mapping['gst_rate']])
-                    if gst_rate not in [0, 5, 12, 18, 28]:
-                        raise ValueError("Invalid GST rate. Must be 0, 5, 12, 18, or 28")
-
-                # Construct product data
-                product_data = {
-                    'name': name,
-                    'price': price,
-                    'quantity': quantity,
-                    'barcode': str(row[reverse_mapping['barcode']]).strip() if 'barcode' in reverse_mapping else None,
-                    'unit': str(row[reverse_mapping['unit']]).strip() if 'unit' in reverse_mapping else None,
-                    'category': str(row[reverse_mapping['category']]).strip() if 'category' in reverse_mapping else None,
-                    'hsn_code': str(row[reverse_mapping['hsn_code']]).strip() if 'hsn_code' in reverse_mapping else None,
-                    'gst_rate': gst_rate
-                }
-
-                # Check for duplicate barcodes if provided
-                if product_data['barcode'] and storage.get_product_by_barcode(product_data['barcode']):
-                    raise ValueError(f"Duplicate barcode: {product_data['barcode']}")
-
-                valid_products.append(product_data)
-                success_count += 1
-
-            except Exception as e:
-                errors.append(f'Error in row {idx + 1}: {str(e)}')
-
-        # Only add products if there are no errors
-        if not errors:
-            for product_data in valid_products:
-                storage.add_product(**product_data)
+        report = storage.import_products_chunked(file.stream, file.filename,
+                                                 mappings, dry_run=dry_run)
+        result = report.to_dict()
 
-            return jsonify({
-                'status': 'success',
-                'message': f'Successfully imported {success_count} products'
-            })
-        else:
+        if report.errors:
             return jsonify({
                 'status': 'error',
                 'message': 'Validation errors found',
-                'errors': errors
+                **result
             }), 400
 
+        if dry_run:
+            message = f'Validated {report.valid_rows} products, nothing imported'
+        else:
+            message = f'Successfully imported {report.imported} products'
+        return jsonify({'status': 'success', 'message': message, **result})
+
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Error importing products: {str(e)}'
         }), 400
 
+@app.route('/products/search')
+@login_required
+def search_products():
+    fields = [field for field in request.args.get('fields', '').split(',') if field] or None
+    started = time.perf_counter()
+    results = storage.search_products(request.args.get('q', ''),
+                                      limit=request.args.get('limit', 20, type=int),
+                                      fields=fields)
+    response = jsonify(results)
+    response.headers['Server-Timing'] = (
+        f'search;dur={(time.perf_counter() - started) * 1000:.3f}')
+    return response
+
+@app.route('/products/scan/<path:barcode>')
+@login_required
+def scan_product(barcode):
+    started = time.perf_counter()
+    product = storage.get_product_by_barcode(barcode)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if product is None:
+        response = jsonify({'status': 'not_found', 'barcode': barcode})
+        response.status_code = 404
+    else:
+        response = jsonify({
+            'id': product['id'],
+            'name': product['name'],
+            'barcode': product['barcode'],
+            'price': product['price'],
+            'mrp': product['mrp'],
+            'stock': product['quantity'],
+            'unit': product['unit'],
+            'hsn_code': product['hsn_code'],
+            'gst_rate': product['gst_rate'],
+            'cess_rate': product['cess_rate']
+        })
+    response.headers['Server-Timing'] = f'lookup;dur={elapsed_ms:.3f}'
+    return response
+
+@app.route('/products/scan-stats')
+@login_required
+def scan_stats():
+    return jsonify(storage.hot_products.stats())
+
 @app.route('/sales', methods=['GET', 'POST'])
 @login_required
 def sales():
@@ -258,48 +324,128 @@ def sales():
             if data and 'items' in data:
                 # Handle multiple items from POS interface
                 customer_id = data.get('customer_id')
-                sale_items = []
-
-                for item in data['items']:
-                    sale_data = storage.add_sale(
-                        product_id=int(item['productId']),
-                        quantity=int(item['quantity']),
-                        price=float(item['price']),
-                        customer_id=customer_id
-                    )
-                    sale_items.append(sale_data)
-
-                # Generate PDF bill
-                customer = storage.get_customer(customer_id) if customer_id else None
-                pdf_content = storage.generate_bill_pdf(sale_items, customer)
-
-                response = make_response(pdf_content)
-                response.headers['Content-Type'] = 'application/pdf'
-                response.headers['Content-Disposition'] = 'inline; filename=bill.pdf'
-                return response
+                basket = [{
+                    'product_id': item.get('productId'),
+                    'quantity': item.get('quantity'),
+                    'price': item.get('price')
+                } for item in data['items']]
+
+                with storage.db.transaction():
+                    # Stock, bill, lines and customer totals commit together
+                    bill = storage.checkout(basket, customer_id, data.get('series'))
+                    bill_id = bill['bill_id']
+
+                    # Queued in the same transaction, so a committed sale
+                    # always has its deliveries recorded; sending is async
+                    deliveries = []
+                    for channel in data.get('send_via') or []:
+                        try:
+                            deliveries.append({
+                                'channel': channel,
+                                'delivery_id': storage.send_bill(bill_id, channel)
+                            })
+                        except ValueError as e:
+                            deliveries.append({'channel': channel, 'error': str(e)})
+
+                # The sale is committed; the PDF renders in the background
+                # and is fetched from /bills/<id>/pdf
+                try:
+                    job = storage.queue_bill_pdf(bill_id)
+                    pdf_status = job.status
+                except QueueFull:
+                    pdf_status = 'deferred'
+                except Exception as e:
+                    logging.error(f"Error queueing bill {bill_id} PDF: {str(e)}")
+                    pdf_status = 'error'
+
+                return jsonify({
+                    'status': 'success',
+                    'bill_id': bill_id,
+                    'bill_no': bill['bill_no'],
+                    'pdf_status': pdf_status,
+                    'pdf_url': url_for('bill_pdf', bill_id=bill_id),
+                    'deliveries': deliveries
+                }), 201
             else:
                 # Handle single item from form submission
-                customer_id = request.form.get('customer_id')
-                sale_data = storage.add_sale(
-                    product_id=int(request.form['product_id']),
-                    quantity=int(request.form['quantity']),
-                    price=float(request.form['price']),
-                    customer_id=customer_id
-                )
+                storage.checkout([{
+                    'product_id': request.form.get('product_id'),
+                    'quantity': request.form.get('quantity'),
+                    'price': request.form.get('price')
+                }], request.form.get('customer_id'), request.form.get('series'))
                 flash('Sale recorded successfully!', 'success')
                 return redirect(url_for('sales'))
 
+        except InsufficientStock as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e),
+                'product_id': e.product_id,
+                'available': e.available
+            }), 409
         except Exception as e:
             logging.error(f"Error recording sale: {str(e)}")
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
-    products = storage.get_products()
-    sales = storage.get_sales()
-    customers = storage.get_customers()
+    # Only the first page of the catalogue; the rest loads through /products
+    products = storage.query_products(fields=POS_PRODUCT_FIELDS, order='name',
+                                      limit=50)['items']
+    # The ledger is shown a page at a time, newest first
+    try:
+        page = storage.page_sales(after=request.args.get('after'),
+                                  limit=request.args.get('limit', 50, type=int))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    # Customers are looked up on demand through /customers/search
     return render_template('sales.html', 
                          products=products, 
-                         sales=sales, 
-                         customers=customers)
+                         sales=page['items'],
+                         next_cursor=page['next_cursor'])
+
+@app.route('/customers', methods=['POST'])
+@login_required
+def add_customer():
+    data = request.get_json(silent=True) or request.form
+    try:
+        customer_id = storage.add_customer(data.get('name'), data.get('mobile'),
+                                           data.get('email') or None,
+                                           data.get('gst_no') or None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(storage.get_customer(customer_id)), 201
+
+@app.route('/customers/<int:customer_id>', methods=['GET', 'PUT'])
+@login_required
+def customer_detail(customer_id):
+    if request.method == 'PUT':
+        changes = {key: value for key, value in (request.get_json(silent=True) or {}).items()
+                   if key in ('name', 'mobile', 'email', 'gst_no')}
+        try:
+            return jsonify(storage.update_customer(customer_id, **changes))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    customer = storage.get_customer(customer_id)
+    if customer is None:
+        abort(404)
+    return jsonify(customer)
+
+@app.route('/customers/lookup')
+@login_required
+def lookup_customer():
+    if request.args.get('gst_no'):
+        customer = storage.get_customer_by_gst(request.args['gst_no'])
+    else:
+        customer = storage.get_customer_by_mobile(request.args.get('mobile'))
+    if customer is None:
+        abort(404)
+    return jsonify(customer)
+
+@app.route('/customers/search')
+@login_required
+def search_customers():
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(storage.search_customers(request.args.get('q', ''), limit))
 
 @app.route('/purchases', methods=['GET', 'POST'])
 @login_required
@@ -312,11 +458,18 @@ def purchases():
         )
         flash('Purchase recorded successfully!', 'success')
 
-    products = storage.get_products()
-    purchases = storage.get_purchases()
-    return render_template('purchases.html', products=products, purchases=purchases)
+    products = storage.query_products(fields=['id', 'name'], order='name',
+                                      limit=50)['items']
+    try:
+        page = storage.page_purchases(after=request.args.get('after'),
+                                      limit=request.args.get('limit', 50, type=int))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return render_template('purchases.html', products=products, purchases=page['items'],
+                           next_cursor=page['next_cursor'])
 
 @app.route('/reports')
+@login_required
 def reports():
     report_type = request.args.get('type', 'sales')
     format_type = request.args.get('format', 'html')
@@ -324,20 +477,196 @@ def reports():
     end_date = request.args.get('end_date')
 
     if report_type == 'balance_sheet':
-        data = storage.accounting.get_balance_sheet()
+        data = storage.accounting.get_balance_sheet(end_date)
         return render_template('reports.html', balance_sheet=data)
     elif report_type == 'income_statement':
         data = storage.accounting.get_income_statement(start_date, end_date)
         return render_template('reports.html', income_statement=data)
-    elif format_type == 'excel':
-        return storage.export_report_to_excel(report_type, start_date, end_date)
+    elif report_type == 'gst':
+        period = request.args.get('period') or datetime.now().strftime('%Y-%m')
+        try:
+            if format_type in ('gstr1', 'gstr3b'):
+                # The GSTN offline tool imports these files as they are
+                data = getattr(storage.gst_returns, format_type)(period)
+                response = make_response(json.dumps(data, indent=2))
+                response.mimetype = 'application/json'
+                response.headers['Content-Disposition'] = (
+                    f'attachment; filename={format_type.upper()}_{filing_period(period)}.json')
+                return response
+            start, end = period_bounds(period)
+            data = storage.gst_returns.summary(start, end)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        if format_type == 'json':
+            return jsonify(data)
+        return render_template('reports.html', gst_summary=data, period=period,
+                               categories=storage.get_categories())
+
+    # Exports stream rows from the database cursor as the client reads them
+    category = request.args.get('category') or None
+    try:
+        if format_type == 'excel':
+            return storage.export_report_to_excel(report_type, start_date, end_date,
+                                                  category)
+        if format_type == 'csv':
+            return storage.generate_csv_report(report_type, start_date, end_date,
+                                               category)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return render_template('reports.html', categories=storage.get_categories())
+
+@app.route('/reports/analytics/<kind>')
+@login_required
+def analytics_report(kind):
+    # Vectorized over the columnar snapshot, not the ledger tables
+    start_date = request.args.get('start_date') or None
+    end_date = request.args.get('end_date') or None
+    try:
+        if kind == 'top-products':
+            data = storage.analytics.top_products(
+                start_date, end_date, limit=min(request.args.get('limit', 10, type=int), 100),
+                by=request.args.get('by', 'revenue'))
+        elif kind == 'timeseries':
+            data = storage.analytics.time_series(start_date, end_date,
+                                                 request.args.get('frequency', 'day'))
+        elif kind == 'categories':
+            data = storage.analytics.categories(start_date, end_date)
+        else:
+            abort(404)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(data)
+
+@app.route('/bills/<int:bill_id>/pdf')
+@login_required
+def bill_pdf(bill_id):
+    try:
+        job = storage.queue_bill_pdf(bill_id)
+    except QueueFull:
+        response = jsonify({'status': 'busy', 'bill_id': bill_id})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+    if job is None:
+        abort(404)
+
+    if job.status != 'done':
+        response = jsonify({'bill_id': bill_id, **job.to_dict()})
+        response.headers['Retry-After'] = '1'
+        return response, 202
+
+    return pdf_response(job.result, job.key, f'bill-{bill_id}.pdf')
+
+@app.route('/bills/render-metrics')
+@login_required
+def bill_render_metrics():
+    return jsonify(storage.render_queue.metrics())
+
+@app.route('/bills/cache-stats')
+@login_required
+def bill_cache_stats():
+    return jsonify(storage.bill_cache.stats())
 
-    if format_type == 'csv':
-        return storage.generate_csv_report(report_type)
+@app.route('/bills/<int:bill_id>/send', methods=['POST'])
+@login_required
+def send_bill(bill_id):
+    data = request.get_json(silent=True) or request.form
+    try:
+        delivery_id = storage.send_bill(bill_id, data.get('channel', 'email'),
+                                        data.get('recipient'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({
+        'delivery_id': delivery_id,
+        'status': 'pending',
+        'status_url': url_for('delivery_status', delivery_id=delivery_id)
+    }), 202
+
+@app.route('/bills/<int:bill_id>/deliveries')
+@login_required
+def bill_deliveries(bill_id):
+    return jsonify(storage.deliveries.for_bill(bill_id))
+
+@app.route('/deliveries/<int:delivery_id>')
+@login_required
+def delivery_status(delivery_id):
+    delivery = storage.deliveries.get(delivery_id)
+    if delivery is None:
+        abort(404)
+    return jsonify(delivery)
 
-    return render_template('reports.html', 
-                         sales=storage.get_sales(),
-                         purchases=storage.get_purchases())
+@app.route('/deliveries/<int:delivery_id>/retry', methods=['POST'])
+@login_required
+def retry_delivery(delivery_id):
+    delivery = storage.deliveries.retry(delivery_id)
+    if delivery is None:
+        abort(404)
+    return jsonify(delivery), 202
+
+@app.route('/deliveries/metrics')
+@login_required
+def delivery_metrics():
+    return jsonify(storage.deliveries.metrics())
+
+@app.route('/bills/batch')
+@login_required
+def bills_batch():
+    # bill_no may be repeated or comma-separated
+    bill_nos = [bill_no.strip()
+                for value in request.args.getlist('bill_no')
+                for bill_no in value.split(',') if bill_no.strip()]
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if not (bill_nos or start_date or end_date):
+        return jsonify({
+            'status': 'error',
+            'message': 'Provide bill_no values or a start_date/end_date range'
+        }), 400
+
+    bill_ids = storage.find_bill_ids(start_date, end_date, bill_nos)
+    if not bill_ids:
+        abort(404)
+
+    files = ((invoice_filename(bill_no), pdf)
+             for bill_no, pdf in storage.iter_bill_pdfs(bill_ids))
+    response = Response(stream_with_context(stream_zip(files)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=bills.zip'
+    return response
+
+@app.cli.command('export-bills')
+@click.option('--start-date', help='First bill date, YYYY-MM-DD')
+@click.option('--end-date', help='Last bill date, YYYY-MM-DD')
+@click.option('--bill-no', multiple=True, help='Bill number; may be repeated')
+@click.option('--output', default='bills.zip', show_default=True)
+@click.option('--workers', type=int, help='Render processes (default: PDF_WORKERS)')
+def export_bills(start_date, end_date, bill_no, output, workers):
+    """Render bills in parallel into a ZIP of PDFs."""
+    if workers:
+        # Read when Storage starts the render pool, on first use below
+        os.environ['PDF_WORKERS'] = str(workers)
+    bill_ids = storage.find_bill_ids(start_date, end_date, bill_no)
+    exported = 0
+
+    def files():
+        nonlocal exported
+        for number, pdf in storage.iter_bill_pdfs(bill_ids):
+            exported += 1
+            yield invoice_filename(number), pdf
+
+    with open(output, 'wb') as f:
+        for chunk in stream_zip(files()):
+            f.write(chunk)
+    click.echo(f'Exported {exported} bills to {output}')
+
+def pdf_response(pdf_content, etag, filename):
+    response = make_response(pdf_content)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'inline; filename={filename}'
+    # Clients revalidate with If-None-Match and get a 304 for unchanged bills
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 @app.route('/sales/<int:sale_id>/pdf')
 def get_sale_pdf(sale_id):
@@ -345,16 +674,18 @@ def get_sale_pdf(sale_id):
     if not sale:
         abort(404)
 
+    if sale.get('bill_id'):
+        return redirect(url_for('bill_pdf', bill_id=sale['bill_id']))
+
     customer = None
     if sale.get('customer_id'):
         customer = storage.get_customer(sale.get('customer_id'))
 
-    pdf_content = storage.generate_bill_pdf([sale], customer)
-
-    response = make_response(pdf_content)
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = 'inline; filename=bill.pdf'
-    return response
+    invoice = storage.build_invoice([sale], customer,
+                                    bill_no=f"SALE-{sale_id:05d}",
+                                    date=sale['date'])
+    etag, pdf_content = storage.render_pdf_cached(invoice)
+    return pdf_response(pdf_content, etag, 'bill.pdf')
 
 @app.route('/export-products')
 def export_products():
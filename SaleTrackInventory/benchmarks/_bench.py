@@ -0,0 +1,18 @@
+"""Setup shared by the benchmark scripts.
+
+Importing this puts the SaleTrackInventory directory on sys.path, so a
+script run as `python benchmarks/bench_<name>.py` can import the app's
+modules.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def arg_parser(doc):
+    """Argument parser described by the first line of a script's docstring"""
+    return argparse.ArgumentParser(description=doc.splitlines()[0])
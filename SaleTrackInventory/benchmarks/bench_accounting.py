@@ -0,0 +1,131 @@
+"""Journal posting cost and statement latency: prefix sums vs scanning lines.
+
+Posts a year or more of sales and purchases to the journal, then times
+income statements and balance sheets for random ranges read from the
+account_balances prefix sums, against the same figures summed from every
+journal line in the range. Both must agree.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_accounting.py --entries 200000 --days 730
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def scanned_income_statement(db, start_day, end_day):
+    rows = db.execute_query(
+        """
+        SELECT account, SUM(debit) AS debit, SUM(credit) AS credit
+        FROM journal_lines
+        WHERE account IN ('Sales', 'Purchases', 'Expenses') AND date >= %s AND date <= %s
+        GROUP BY account
+        """, (start_day, end_day + '~'))
+    totals = {row['account']: (row['debit'], row['credit']) for row in rows}
+    debit, credit = totals.get('Sales', (0, 0))
+    sales = credit - debit
+    debit, credit = totals.get('Purchases', (0, 0))
+    purchases = debit - credit
+    debit, credit = totals.get('Expenses', (0, 0))
+    expenses = debit - credit
+    return {'sales': round(sales, 2), 'purchases': round(purchases, 2),
+            'expenses': round(expenses, 2),
+            'profit': round(sales - purchases - expenses, 2)}
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--entries', type=int, default=200_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        from database import Database
+        from models.accounting import AccountingSystem
+
+        db = Database()
+        journal = AccountingSystem(db)
+        rng = random.Random(11)
+        first_day = datetime(2024, 4, 1)
+
+        started = time.perf_counter()
+        batch = 5000
+        for offset in range(0, args.entries, batch):
+            # Entries arrive in date order, as they do at the till
+            with db.transaction():
+                for number in range(offset, min(args.entries, offset + batch)):
+                    date = first_day + timedelta(
+                        seconds=int(number * args.days * 86400 / args.entries))
+                    subtotal = rng.uniform(10, 5000)
+                    line = {'date': date, 'subtotal': subtotal, 'gst_amount': subtotal * 0.18,
+                            'cess': 0.0, 'product_name': 'Item', 'id': number}
+                    if rng.random() < 0.8:
+                        journal.post_sale([line], reference=f"B{number}", source_id=number)
+                    else:
+                        journal.post_purchase(line)
+        elapsed = time.perf_counter() - started
+        print(f"posted {args.entries} entries in {elapsed:.1f}s "
+              f"({elapsed / args.entries * 1e6:.0f} us/entry)")
+        print('balance rows:', db.execute_query("SELECT COUNT(*) FROM account_balances")[0][0],
+              'journal lines:', db.execute_query("SELECT COUNT(*) FROM journal_lines")[0][0])
+
+        ranges = []
+        for _ in range(args.queries):
+            start = rng.randrange(args.days)
+            end = rng.randrange(start, args.days)
+            ranges.append(((first_day + timedelta(days=start)).strftime('%Y-%m-%d'),
+                           (first_day + timedelta(days=end)).strftime('%Y-%m-%d')))
+
+        prefix_ms, scan_ms = [], []
+        for start_day, end_day in ranges:
+            t0 = time.perf_counter()
+            fast = journal.get_income_statement(start_day, end_day)
+            t1 = time.perf_counter()
+            slow = scanned_income_statement(db, start_day, end_day)
+            t2 = time.perf_counter()
+            prefix_ms.append((t1 - t0) * 1000)
+            scan_ms.append((t2 - t1) * 1000)
+            for key in slow:
+                if abs(fast[key] - slow[key]) > 0.05:
+                    print(f"MISMATCH {start_day}..{end_day} {key}: {fast[key]} != {slow[key]}")
+                    sys.exit(1)
+
+        sheet_ms = []
+        for _, end_day in ranges:
+            t0 = time.perf_counter()
+            journal.get_balance_sheet(end_day)
+            sheet_ms.append((time.perf_counter() - t0) * 1000)
+
+        print(f"{'query':>28} {'p50 ms':>10} {'p95 ms':>10}")
+        for label, samples in (('income statement (prefix)', prefix_ms),
+                               ('income statement (scan)', scan_ms),
+                               ('balance sheet (prefix)', sheet_ms)):
+            print(f"{label:>28} {percentile(samples, 50):>10.3f} {percentile(samples, 95):>10.3f}")
+
+        before = [journal.get_income_statement(*bounds) for bounds in ranges[:20]]
+        rebuilt = journal.rebuild_balances()
+        after = [journal.get_income_statement(*bounds) for bounds in ranges[:20]]
+        for old, new in zip(before, after):
+            if any(abs(old[key] - new[key]) > 0.05 for key in old):
+                print('MISMATCH after rebuild:', old, new)
+                sys.exit(1)
+        print(f"rebuild_balances wrote {rebuilt} rows; statements unchanged")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Top products, time series and categories over the columnar snapshot.
+
+Fills sale_lines with --lines lines over a year and purchase_lines with a
+tenth as many, then times:
+
+- the first refresh, which copies every line into the snapshot;
+- an incremental refresh after another --append lines were sold;
+- top products, the daily time series and the category breakdown over the
+  snapshot;
+- the same three reports by walking line dicts in Python, which is what
+  building them from get_sales()/get_purchases() amounted to.
+
+It checks both ways give the same revenue. Parquet files are written too if
+pyarrow or fastparquet is installed.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_analytics.py --lines 1000000
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+CATEGORIES = ('Grocery', 'Dairy', 'Snacks', 'Beverages', 'Household', 'Personal Care', '')
+
+
+def line_rows(count, products, start, rng, first_id=1):
+    step = 365 * 86400 / count
+    for number in range(count):
+        product_id = rng.randint(1, products)
+        quantity = rng.randint(1, 6)
+        price = round(rng.uniform(10, 500), 2)
+        subtotal = round(price * quantity, 2)
+        gst = round(subtotal * 0.18, 2)
+        yield (first_id + number,
+               (start + timedelta(seconds=number * step)).strftime(DATE_FORMAT),
+               product_id, f'Product {product_id}', quantity, price, subtotal, gst, gst,
+               subtotal + gst)
+
+
+def insert(db, table, rows):
+    db.executemany(
+        f"""
+        INSERT INTO {table} (id, date, product_id, product_name, quantity, price, subtotal,
+                             gst_amount, igst, total)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def by_hand(db):
+    """Top products, daily series and categories from line dicts"""
+    categories = {row[0]: row[1] or 'Uncategorized'
+                  for row in db.execute_query("SELECT id, category FROM products")}
+    cost = {}
+    for row in db.iter_query("SELECT product_id, quantity, subtotal FROM purchase_lines"):
+        line = dict(zip(('product_id', 'quantity', 'subtotal'), row))
+        totals = cost.setdefault(line['product_id'], [0.0, 0])
+        totals[0] += line['subtotal']
+        totals[1] += line['quantity']
+    products, days, by_category = {}, {}, {}
+    for row in db.iter_query("SELECT date, product_id, quantity, subtotal FROM sale_lines"):
+        line = dict(zip(('date', 'product_id', 'quantity', 'subtotal'), row))
+        unit = cost.get(line['product_id'])
+        margin = line['subtotal'] - line['quantity'] * unit[0] / unit[1] if unit else 0.0
+        for key, groups in ((line['product_id'], products), (line['date'][:10], days),
+                            (categories.get(line['product_id']), by_category)):
+            group = groups.setdefault(key, [0.0, 0, 0.0])
+            group[0] += line['subtotal']
+            group[1] += line['quantity']
+            group[2] += margin
+    top = sorted(products.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    return top, days, by_category
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--append', type=int, default=10_000,
+                        help='lines sold between two refreshes')
+    parser.add_argument('--products', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        from database import Database
+        from models.analytics import SalesAnalytics
+
+        db = Database()
+        rng = random.Random(24)
+        db.executemany(
+            "INSERT INTO products (id, name, price, quantity, mrp, category) "
+            "VALUES (?, ?, 0, 0, 0, ?)",
+            ((product_id, f'Product {product_id}', rng.choice(CATEGORIES))
+             for product_id in range(1, args.products + 1)))
+        start = datetime(2025, 7, 1)
+        insert(db, 'sale_lines', line_rows(args.lines, args.products, start, rng))
+        insert(db, 'purchase_lines', line_rows(args.lines // 10, args.products, start, rng))
+        print(f"loaded {args.lines:,} sale lines, {args.lines // 10:,} purchase lines")
+
+        analytics = SalesAnalytics(db, os.path.join(tmp, 'analytics'),
+                                   refresh_seconds=float('inf'))
+        print(f"parquet engine: {analytics.engine or 'none (in memory only)'}")
+        copied, full_seconds = timed(analytics.refresh)
+        insert(db, 'sale_lines', line_rows(args.append, args.products,
+                                           start + timedelta(days=365), rng,
+                                           first_id=args.lines + 1))
+        appended, append_seconds = timed(analytics.refresh)
+        assert (copied, appended) == (args.lines + args.lines // 10, args.append)
+
+        top, top_seconds = timed(analytics.top_products, limit=10)
+        series, series_seconds = timed(analytics.time_series, frequency='day')
+        categories, category_seconds = timed(analytics.categories)
+        (hand_top, days, _), hand_seconds = timed(by_hand, db)
+
+        print(f"{'step':>32} {'seconds':>8}")
+        for label, seconds in ((f'first refresh ({copied:,} lines)', full_seconds),
+                               (f'incremental refresh ({appended:,})', append_seconds),
+                               ('top products', top_seconds),
+                               ('daily time series', series_seconds),
+                               ('categories', category_seconds),
+                               ('all three, vectorized',
+                                top_seconds + series_seconds + category_seconds),
+                               ('all three, Python loop', hand_seconds)):
+            print(f"{label:>32} {seconds:>8.3f}")
+
+        assert [row['product_id'] for row in top] == [item[0] for item in hand_top]
+        revenue = sum(row['revenue'] for row in categories)
+        hand_revenue = sum(group[0] for group in days.values())
+        assert abs(revenue - hand_revenue) < 1, (revenue, hand_revenue)
+        assert abs(sum(row['sales'] for row in series) - hand_revenue) < 1
+        print(f"revenue {revenue:,.2f} matches the loop over {len(days)} days")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Barcode scan latency: index lookup, hot-SKU cache and the JSON endpoint.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_barcode_scan.py --products 200000 --scans 5000
+"""
+import os
+import random
+import tempfile
+import time
+
+from _bench import arg_parser
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label, samples):
+    print(f"{label:>22} {percentile(samples, 50):>10.1f} {percentile(samples, 99):>10.1f}")
+
+
+def timed(fn, arguments):
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        fn(argument)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--scans', type=int, default=5000)
+    parser.add_argument('--hot', type=int, default=500,
+                        help='distinct SKUs making up most scans')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from database import Database
+
+        db = Database()
+        db.executemany(
+            "INSERT INTO products (name, price, quantity, mrp, barcode, gst_rate) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((f'Product {i}', 10.0, 100, 12.0, f'890{i:010d}', 18)
+             for i in range(args.products)))
+        plan = db.execute_query(
+            "EXPLAIN QUERY PLAN SELECT * FROM products "
+            "WHERE barcode = ? AND barcode IS NOT NULL AND barcode != ''", ('x', ))
+        print('plan:', plan[0][-1])
+        db.close()
+
+        from app import app, storage
+        storage.users['bench'] = {'username': 'bench'}
+
+        rng = random.Random(7)
+        cold = [f'890{rng.randrange(args.products):010d}' for _ in range(args.scans)]
+        # A counter scans the same few hundred SKUs over and over
+        hot_skus = [f'890{rng.randrange(args.products):010d}' for _ in range(args.hot)]
+        hot = [rng.choice(hot_skus) for _ in range(args.scans)]
+
+        print(f"{'path':>22} {'p50 us':>10} {'p99 us':>10}")
+        storage.hot_products.maxsize = 0
+        report('index only', timed(storage.get_product_by_barcode, cold))
+        storage.hot_products.maxsize = 2048
+        storage.hot_products.clear()
+        timed(storage.get_product_by_barcode, hot_skus)
+        report('hot-SKU cache', timed(storage.get_product_by_barcode, hot))
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = 'bench'
+        server = []
+
+        def scan(barcode):
+            response = client.get(f'/products/scan/{barcode}')
+            server.append(float(response.headers['Server-Timing'].split('dur=')[1]) * 1000)
+
+        report('endpoint round trip', timed(scan, hot))
+        report('endpoint server-side', server)
+        print(storage.hot_products.stats())
+        storage.deliveries.shutdown()
+        storage.render_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Concurrent checkout stress: stock must never go negative or drift.
+
+Many tills sell from the same handful of low-stock SKUs at once. Every
+checkout either commits in full or raises InsufficientStock, so at the end
+each product's stock equals its starting quantity minus what sale_lines
+recorded, and none is below zero.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_checkout.py --tills 16 --checkouts 500 --stock 200
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from _bench import arg_parser
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--tills', type=int, default=16,
+                        help='threads checking out concurrently')
+    parser.add_argument('--checkouts', type=int, default=500,
+                        help='baskets per till')
+    parser.add_argument('--products', type=int, default=5,
+                        help='contended SKUs')
+    parser.add_argument('--stock', type=int, default=200,
+                        help='starting quantity of each SKU')
+    parser.add_argument('--basket', type=int, default=3,
+                        help='lines per basket')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from storage import InsufficientStock, Storage
+
+        storage = Storage()
+        storage.deliveries.shutdown()
+        for i in range(args.products):
+            storage.add_product(f'Hot {i}', 10.0, args.stock, 12.0, gst_rate=18)
+        product_ids = [row['id'] for row in
+                       storage.db.execute_query("SELECT id FROM products ORDER BY id")]
+        customer_id = storage.add_customer('Bench Customer', '9800000000')
+
+        lock = threading.Lock()
+        latencies = []
+        outcomes = {'sold': 0, 'refused': 0, 'errors': 0}
+        start = threading.Barrier(args.tills)
+
+        def till(seed):
+            rng = random.Random(seed)
+            local = []
+            counts = {'sold': 0, 'refused': 0, 'errors': 0}
+            start.wait()
+            for _ in range(args.checkouts):
+                basket = [{
+                    'product_id': rng.choice(product_ids),
+                    'quantity': rng.randint(1, 3),
+                    'price': 10.0
+                } for _ in range(rng.randint(1, args.basket))]
+                started = time.perf_counter()
+                try:
+                    storage.checkout(basket, customer_id)
+                    counts['sold'] += 1
+                except InsufficientStock:
+                    counts['refused'] += 1
+                except Exception as e:
+                    print('checkout failed:', e)
+                    counts['errors'] += 1
+                local.append((time.perf_counter() - started) * 1000)
+            with lock:
+                latencies.extend(local)
+                for key, value in counts.items():
+                    outcomes[key] += value
+
+        threads = [threading.Thread(target=till, args=(seed, ))
+                   for seed in range(args.tills)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = args.tills * args.checkouts
+        print(f"{total} checkouts from {args.tills} tills in {elapsed:.2f}s "
+              f"({total / elapsed:.0f}/s)")
+        print(f"sold {outcomes['sold']}, refused {outcomes['refused']}, "
+              f"errors {outcomes['errors']}")
+        print(f"latency ms: p50 {percentile(latencies, 50):.2f} "
+              f"p99 {percentile(latencies, 99):.2f}")
+
+        failures = []
+        for product_id in product_ids:
+            stock = storage.get_product(product_id)['quantity']
+            sold = storage.db.execute_query(
+                "SELECT COALESCE(SUM(quantity), 0) FROM sale_lines WHERE product_id = %s",
+                (product_id, ))[0][0]
+            print(f"product {product_id}: stock {stock}, sold {sold}")
+            if stock < 0:
+                failures.append(f"product {product_id} went negative ({stock})")
+            if stock + sold != args.stock:
+                failures.append(f"product {product_id} drifted: "
+                                f"{stock} + {sold} != {args.stock}")
+
+        orphans = storage.db.execute_query(
+            "SELECT COUNT(*) FROM sale_lines WHERE bill_id IS NULL")[0][0]
+        bills = storage.db.execute_query("SELECT COUNT(*) FROM bills")[0][0]
+        billed = storage.db.execute_query("SELECT COALESCE(SUM(total), 0) FROM bills")[0][0]
+        spent = storage.get_customer(customer_id)['total_purchases']
+        if orphans:
+            failures.append(f"{orphans} sale lines without a bill")
+        if bills != outcomes['sold']:
+            failures.append(f"{bills} bills for {outcomes['sold']} checkouts")
+        if abs(billed - spent) > 1e-6:
+            failures.append(f"customer total {spent} != billed {billed}")
+
+        storage.render_queue.shutdown()
+        if failures:
+            print('FAILED:', *failures, sep='\n  ')
+            sys.exit(1)
+        print('OK: no negative stock, no partial baskets')
+
+
+if __name__ == '__main__':
+    main()
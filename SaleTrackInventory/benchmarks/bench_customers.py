@@ -0,0 +1,105 @@
+"""Customer lookup latency by mobile, GSTIN and typeahead prefix.
+
+Loads N synthetic customers and compares the old linear scan over a list
+of dicts with Storage's indexed lookups. Run from the SaleTrackInventory
+directory:
+
+    python benchmarks/bench_customers.py --customers 1000000
+"""
+import os
+import random
+import tempfile
+import time
+
+from _bench import arg_parser
+
+from utils.customer_index import normalize_gstin, normalize_mobile, normalize_name
+
+STATES = ('27', '29', '33', '07', '24')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_customers(count):
+    for i in range(count):
+        mobile = f'9{i:09d}'
+        # Roughly a third of customers are registered businesses
+        gst_no = f'{STATES[i % 5]}{i:010d}1Z{i % 10}' if i % 3 == 0 else None
+        name = f'Customer {i}'
+        yield (name, normalize_name(name), mobile, normalize_mobile(mobile), None,
+               gst_no, normalize_gstin(gst_no), '2024-04-01 10:00:00')
+
+
+def timed(fn, arguments):
+    samples = []
+    for argument in arguments:
+        started = time.perf_counter()
+        fn(argument)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def report(label, samples):
+    print(f"{label:>26} {percentile(samples, 50):>10.1f} {percentile(samples, 99):>10.1f}")
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--customers', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--scan-lookups', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from database import Database
+
+        db = Database()
+        started = time.perf_counter()
+        db.executemany(
+            """
+            INSERT INTO customers (name, name_key, mobile, mobile_key, email,
+                                   gst_no, gst_key, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, make_customers(args.customers))
+        print(f"inserted {args.customers} customers in {time.perf_counter() - started:.1f}s")
+        db.close()
+
+        from storage import Storage
+
+        started = time.perf_counter()
+        storage = Storage()
+        print(f"loaded index of {len(storage.customer_index)} customers in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(1)
+        picks = [rng.randrange(args.customers) for _ in range(args.lookups)]
+        mobiles = [f'+91 9{i:09d}' for i in picks]
+        gstins = [f'{STATES[i % 5]}{i:010d}1z{i % 10}' for i in
+                  (i - i % 3 for i in picks)]
+        prefixes = [f'9{i:09d}'[:6] for i in picks]
+        names = [f'customer {i}'[:12] for i in picks]
+
+        # The previous implementation: a generator scan over every customer
+        customers = [{'mobile': f'9{i:09d}'} for i in range(args.customers)]
+
+        def scan(mobile):
+            return next((c for c in customers if c['mobile'] == mobile), None)
+
+        print(f"{'lookup':>26} {'p50 us':>10} {'p99 us':>10}")
+        report('linear scan (old)', timed(scan, [m[-10:] for m in mobiles[:args.scan_lookups]]))
+        report('by mobile', timed(storage.get_customer_by_mobile, mobiles))
+        report('by GSTIN', timed(storage.get_customer_by_gst, gstins))
+        report('typeahead mobile prefix', timed(storage.search_customers, prefixes))
+        report('typeahead name prefix', timed(storage.search_customers, names))
+        storage.deliveries.shutdown()
+        storage.render_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
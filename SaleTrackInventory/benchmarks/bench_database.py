@@ -0,0 +1,98 @@
+"""Insert throughput and checkout latency for the pooled Database layer.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_database.py --checkouts 200 --lines 5
+"""
+import os
+import tempfile
+import threading
+import time
+
+from _bench import arg_parser
+
+from database import Database
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def setup(db, products):
+    with db.transaction() as connection:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS bench_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                total REAL NOT NULL
+            )
+        """)
+    db.executemany(
+        "INSERT INTO products (name, price, quantity, mrp) VALUES (?, ?, ?, ?)",
+        [(f"Product {i}", 10.0, 10 ** 9, 12.0) for i in range(products)])
+
+
+def checkout(db, product_ids, lines):
+    # One basket: decrement stock and write every line in a single commit
+    with db.transaction() as connection:
+        for product_id in product_ids[:lines]:
+            connection.execute(
+                "UPDATE products SET quantity = quantity - 1 WHERE id = ?",
+                (product_id, ))
+        connection.executemany(
+            "INSERT INTO bench_lines (product_id, quantity, total) VALUES (?, ?, ?)",
+            [(product_id, 1, 10.0) for product_id in product_ids[:lines]])
+
+
+def run(writers, checkouts, lines, products):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'), pool_size=writers)
+        setup(db, products)
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def worker(seed):
+            local = []
+            ids = [(seed * lines + i) % products + 1 for i in range(lines)]
+            for _ in range(checkouts):
+                started = time.perf_counter()
+                checkout(db, ids, lines)
+                local.append(time.perf_counter() - started)
+            with latencies_lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(n, )) for n in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        db.close()
+
+    inserted = writers * checkouts * lines
+    return inserted / elapsed, percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--checkouts', type=int, default=200,
+                        help='checkouts per writer thread')
+    parser.add_argument('--lines', type=int, default=5,
+                        help='lines per checkout')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--writers', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print(f"{'writers':>8} {'inserts/s':>12} {'p99 ms':>10}")
+    for writers in args.writers:
+        rate, p99 = run(writers, args.checkouts, args.lines, args.products)
+        print(f"{writers:>8} {rate:>12.0f} {p99:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""GST return summaries for a month of millions of sale lines.
+
+Fills sale_lines with --lines lines dated in one month, plus a tenth as
+many in the month before and after. A tenth of the bills go to customers
+with a GSTIN, some of them in other states. The gst_daily rollup is kept
+by its triggers as the lines are inserted.
+
+It then times the summary, GSTR-1 and GSTR-3B for that month. For
+comparison it also times a GROUP BY over every line (what rebuilding the
+rollup does) and the by-hand approach this replaces: looping over every
+exported sale line in Python and grouping it by HSN and rate. All of them
+give the same taxable value.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_gst_returns.py --lines 2000000
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+PERIOD = '2026-07'
+
+
+def generate(lines, products, customers, rng):
+    catalogue = [(product_id, f'Product {product_id}', f'{rng.randint(1000, 9999)}',
+                  rng.choice((0, 5, 12, 18, 28))) for product_id in range(1, products + 1)]
+    outside = lines // 10
+    months = (('2026-06-01', outside), ('2026-07-01', lines), ('2026-08-01', outside))
+    bill_id = 0
+    for first_day, count in months:
+        start = datetime.strptime(first_day, '%Y-%m-%d')
+        step = 28 * 86400 / count
+        written = 0
+        while written < count:
+            bill_id += 1
+            stamp = (start + timedelta(seconds=written * step)).strftime(DATE_FORMAT)
+            customer_id = rng.randint(1, customers) if rng.random() < 0.1 else None
+            bill = []
+            for _ in range(min(rng.randint(1, 5), count - written)):
+                product_id, name, hsn, gst_rate = rng.choice(catalogue)
+                quantity = rng.randint(1, 4)
+                subtotal = round(rng.uniform(10, 500), 2) * quantity
+                half = round(subtotal * gst_rate / 200, 2)
+                bill.append((bill_id, stamp, product_id, name, hsn, customer_id, quantity,
+                             round(subtotal / quantity, 2), subtotal, half, half,
+                             2 * half, 0.0, gst_rate, 2 * half, subtotal + 2 * half))
+                written += 1
+            yield bill_id, stamp, customer_id, bill
+
+
+def by_hand(db, start, end):
+    """What filing from the CSV export amounted to: a Python loop over every line"""
+    groups = {}
+    for hsn_code, gst_rate, subtotal, cgst, sgst, cess in db.iter_query(
+            "SELECT hsn_code, gst_rate, subtotal, cgst, sgst, cess FROM sale_lines "
+            "WHERE date >= ? AND date <= ?", (start, end)):
+        group = groups.setdefault((hsn_code, gst_rate), [0.0, 0.0, 0.0, 0.0])
+        group[0] += subtotal
+        group[1] += cgst
+        group[2] += sgst
+        group[3] += cess
+    return groups
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=2_000_000,
+                        help='sale lines in the month being filed')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--customers', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        from database import Database
+        from models.gst_returns import GstReturns, period_bounds
+
+        db = Database()
+        rng = random.Random(23)
+        db.executemany(
+            """
+            INSERT INTO customers (id, name, name_key, mobile, mobile_key, gst_no,
+                                   gst_key, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, '2026-01-01 00:00:00')
+            """,
+            ((number, f'Customer {number}', f'customer {number}', str(9000000000 + number),
+              str(9000000000 + number), gstin, gstin)
+             for number in range(1, args.customers + 1)
+             for gstin in [f"{rng.choice(('29', '29', '29', '27', '33'))}"
+                           f"ABCDE{number:04d}F1Z5" if number % 2 else None]))
+
+        started = time.perf_counter()
+        bills = []
+        lines = []
+
+        def flush():
+            db.executemany("INSERT INTO bills (id, bill_no, date, customer_id) "
+                           "VALUES (?, ?, ?, ?)", bills)
+            db.executemany(
+                """
+                INSERT INTO sale_lines (bill_id, date, product_id, product_name, hsn_code,
+                                        customer_id, quantity, price, subtotal, cgst, sgst,
+                                        igst, cess, gst_rate, gst_amount, total)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, lines)
+            bills.clear()
+            lines.clear()
+
+        for bill_id, stamp, customer_id, bill in generate(args.lines, args.products,
+                                                          args.customers, rng):
+            bills.append((bill_id, f'INV/{bill_id}', stamp, customer_id))
+            lines.extend(bill)
+            if len(lines) >= 100_000:
+                flush()
+        flush()
+        total = db.execute_query("SELECT COUNT(*) FROM sale_lines")[0][0]
+        print(f"loaded {total:,} lines in {time.perf_counter() - started:.1f}s")
+
+        returns = GstReturns(db, '29AAAAA0000A1Z5')
+        start, end = period_bounds(PERIOD)
+        summary, summary_seconds = timed(returns.summary, start, end)
+        _, gstr1_seconds = timed(returns.gstr1, PERIOD)
+        _, gstr3b_seconds = timed(returns.gstr3b, PERIOD)
+        groups, hand_seconds = timed(by_hand, db, start, end)
+        _, rebuild_seconds = timed(db.rebuild_gst_daily)
+
+        print(f"{PERIOD}: {summary['totals']['lines']:,} lines, "
+              f"{len(summary['by_hsn'])} HSN/rate rows, "
+              f"{summary['b2b']['lines']:,} B2B lines")
+        print(f"{'step':>28} {'seconds':>8}")
+        for label, seconds in (('summary (grouped SQL)', summary_seconds),
+                               ('GSTR-1 incl. B2B invoices', gstr1_seconds),
+                               ('GSTR-3B', gstr3b_seconds),
+                               ('GROUP BY over all lines', rebuild_seconds),
+                               ('Python loop over lines', hand_seconds)):
+            print(f"{label:>28} {seconds:>8.2f}")
+
+        hand_taxable = round(sum(group[0] for group in groups.values()), 2)
+        assert abs(hand_taxable - summary['totals']['txval']) < 0.05, \
+            (hand_taxable, summary['totals']['txval'])
+        assert returns.summary(start, end) == summary, "rollup drifted from the lines"
+        print(f"taxable value {summary['totals']['txval']:,.2f} matches the loop")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Invoice numbering under concurrency: no duplicates, and no gaps when unbuffered.
+
+Several processes, each with several threads, write bills that take their
+number from InvoiceNumberAllocator inside the bill's transaction. A share
+of the transactions roll back after taking a number, as a failed checkout
+would. bills.bill_no is UNIQUE, so a duplicate surfaces as an
+IntegrityError in a worker.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_invoice_numbers.py --processes 4 --threads 4 --bills 2000
+    python benchmarks/bench_invoice_numbers.py --processes 4 --threads 4 --block-size 50
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from _bench import arg_parser
+
+
+class Rollback(Exception):
+    pass
+
+
+def worker(path, seed, threads, bills, block_size, rollback_rate):
+    from database import Database
+    from utils.invoice_numbers import InvoiceNumberAllocator
+
+    db = Database(path)
+    allocator = InvoiceNumberAllocator(db, block_size=block_size)
+    counts = {'committed': 0, 'rolled_back': 0, 'duplicates': 0}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        local = {'committed': 0, 'rolled_back': 0, 'duplicates': 0}
+        for _ in range(bills):
+            try:
+                with db.transaction() as connection:
+                    bill_no = allocator.allocate()
+                    connection.execute(
+                        "INSERT INTO bills (bill_no, date) VALUES (?, datetime('now'))",
+                        (bill_no, ))
+                    if rng.random() < rollback_rate:
+                        raise Rollback()
+                local['committed'] += 1
+            except Rollback:
+                local['rolled_back'] += 1
+            except sqlite3.IntegrityError:
+                local['duplicates'] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + number, ))
+            for number in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    allocator.release()
+    db.close()
+    return counts
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4,
+                        help='threads per process')
+    parser.add_argument('--bills', type=int, default=500,
+                        help='bills attempted per thread')
+    parser.add_argument('--block-size', type=int, default=1)
+    parser.add_argument('--rollback-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        from database import Database
+        Database(path).close()
+
+        context = multiprocessing.get_context('spawn')
+        started = time.perf_counter()
+        with context.Pool(args.processes) as pool:
+            results = pool.starmap(worker, [
+                (path, seed, args.threads, args.bills, args.block_size,
+                 args.rollback_rate) for seed in range(args.processes)
+            ])
+        elapsed = time.perf_counter() - started
+
+        totals = {key: sum(result[key] for result in results) for key in results[0]}
+        db = Database(path)
+        numbers = sorted(int(row[0].rsplit('/', 1)[1])
+                         for row in db.execute_query("SELECT bill_no FROM bills"))
+        last_no = db.execute_query(
+            "SELECT COALESCE(MAX(last_no), 0) FROM invoice_sequences")[0][0]
+        db.close()
+
+        gaps = (numbers[-1] - len(numbers)) if numbers else 0
+        print(f"{args.processes} processes x {args.threads} threads, "
+              f"block size {args.block_size}")
+        print(f"{totals['committed']} bills committed, {totals['rolled_back']} rolled back "
+              f"in {elapsed:.2f}s ({totals['committed'] / elapsed:.0f} bills/s)")
+        print(f"numbers 1..{numbers[-1] if numbers else 0}, {gaps} gaps, "
+              f"sequence at {last_no}, {totals['duplicates']} duplicates")
+
+        failures = []
+        if totals['duplicates'] or len(set(numbers)) != len(numbers):
+            failures.append('duplicate invoice numbers issued')
+        if len(numbers) != totals['committed']:
+            failures.append(f"{len(numbers)} bills stored for {totals['committed']} commits")
+        if args.block_size == 1 and gaps:
+            failures.append(f"{gaps} gaps in an unbuffered sequence")
+        if failures:
+            print('FAILED:', *failures, sep='\n  ')
+            sys.exit(1)
+        print('OK')
+
+
+if __name__ == '__main__':
+    main()
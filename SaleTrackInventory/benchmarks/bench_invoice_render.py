@@ -0,0 +1,55 @@
+"""Bills rendered per second by the shared Jinja invoice renderer.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_invoice_render.py --seconds 2
+"""
+import time
+
+from _bench import arg_parser
+
+from utils.invoice_renderer import InvoiceRenderer
+
+
+def make_items(lines):
+    return [{
+        'product_name': f'Product <{i}> & Co',
+        'hsn_code': '8471',
+        'quantity': 2,
+        'price': 99.5,
+        'subtotal': 199.0,
+        'gst_rate': 18,
+        'gst_amount': 35.82,
+        'total': 234.82
+    } for i in range(lines)]
+
+
+def bench(renderer, items, seconds):
+    customer = {'name': 'Walk-in', 'mobile': '9999999999', 'gst_no': None}
+    # QR generation is cached separately, so a fixed image is used here
+    qr_code = 'iVBORw0KGgo='
+    rendered = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        renderer.render('INV-00001', '2024-04-01 10:00:00', items, customer,
+                        qr_code)
+        rendered += 1
+    return rendered / (time.perf_counter() - started)
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='time spent on each invoice size')
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 500])
+    args = parser.parse_args()
+
+    renderer = InvoiceRenderer()
+    print(f"{'lines':>6} {'bills/s':>10}")
+    for lines in args.lines:
+        rate = bench(renderer, make_items(lines), args.seconds)
+        print(f"{lines:>6} {rate:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
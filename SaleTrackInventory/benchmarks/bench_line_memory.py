@@ -0,0 +1,105 @@
+"""Bytes per sale line held in memory: plain dicts vs slotted SaleLine records.
+
+Writes N realistic sale lines (a few thousand products, bills of one to
+five lines sharing a timestamp, mostly zero cess), then loads them the way
+get_sales() does, once into the old per-line dicts and once into SaleLine
+records, and reports the traced heap held per line and the load time.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_line_memory.py --lines 1000000
+"""
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def dict_line(row):
+    # What get_sales() returned before SaleLine
+    line = dict(row)
+    line['date'] = datetime.strptime(line['date'], DATE_FORMAT)
+    return line
+
+
+def generate(lines, products):
+    rng = random.Random(5)
+    catalogue = [(product_id, f'Product {product_id} {rng.choice(["Rice", "Soap", "Oil", "Tea"])} '
+                  f'{rng.randint(100, 999)}g', f'{rng.randint(1000, 9999)}{rng.randint(10, 99)}',
+                  rng.choice((0, 5, 12, 18, 28)))
+                 for product_id in range(1, products + 1)]
+    date = datetime(2024, 4, 1)
+    bill_id = 0
+    written = 0
+    while written < lines:
+        bill_id += 1
+        date += timedelta(seconds=rng.randint(5, 120))
+        stamp = date.strftime(DATE_FORMAT)
+        for _ in range(min(rng.randint(1, 5), lines - written)):
+            product_id, name, hsn, gst_rate = rng.choice(catalogue)
+            quantity = rng.randint(1, 4)
+            price = round(rng.uniform(10, 500), 2)
+            subtotal = price * quantity
+            gst = subtotal * gst_rate / 100
+            written += 1
+            yield (bill_id, stamp, product_id, name, hsn, None, quantity, price, subtotal,
+                   gst / 2, gst / 2, gst, 0.0, gst_rate, gst, subtotal + gst)
+
+
+def measure(db, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    lines = [build(row) for row in db.iter_query("SELECT * FROM sale_lines")]
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(lines)
+    del lines
+    gc.collect()
+    return count, held, elapsed
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        from database import Database
+        from models.records import SaleLine
+
+        db = Database()
+        # Every line belongs to a bill; there are never more bills than lines
+        db.executemany("INSERT INTO bills (id, bill_no, date) VALUES (?, ?, '')",
+                       ((number, str(number)) for number in range(1, args.lines + 1)))
+        db.executemany(
+            """
+            INSERT INTO sale_lines (bill_id, date, product_id, product_name, hsn_code,
+                                    customer_id, quantity, price, subtotal, cgst, sgst,
+                                    igst, cess, gst_rate, gst_amount, total)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, generate(args.lines, args.products))
+
+        print(f"{'representation':>16} {'lines':>9} {'bytes/line':>11} {'total MB':>9} {'load s':>7}")
+        results = {}
+        for label, build in (('dict', dict_line), ('SaleLine', SaleLine.from_row)):
+            count, held, elapsed = measure(db, build)
+            results[label] = held / count
+            print(f"{label:>16} {count:>9} {held / count:>11.0f} {held / 1e6:>9.1f} {elapsed:>7.2f}")
+        print(f"SaleLine holds {results['dict'] / results['SaleLine']:.1f}x less per line")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
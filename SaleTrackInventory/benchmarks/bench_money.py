@@ -0,0 +1,116 @@
+"""GST on 100k lines: float per line vs paise per line vs the NumPy batch.
+
+Generates N lines (prices with up to three decimals, the usual GST slabs,
+some cess) grouped into bills of one to five lines, then:
+
+- times the old float calculate_tax, the paise calculate_tax and
+  calculate_tax_batch over every line;
+- checks the batch gives exactly the paise of the per-line function;
+- counts how often the printed invoice stops adding up with floats: lines
+  whose printed CGST + SGST differs from their printed GST, and bills whose
+  printed total differs from the sum of their printed line totals.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_money.py --lines 100000
+"""
+import random
+import time
+
+from _bench import arg_parser
+
+
+def float_tax(price, quantity, gst_rate, cess_rate=0):
+    # Storage.calculate_tax before the paise engine
+    subtotal = price * quantity
+    gst_amount = subtotal * (gst_rate / 100)
+    cess = subtotal * (cess_rate / 100)
+    return {
+        'subtotal': subtotal,
+        'cgst': gst_amount / 2,
+        'sgst': gst_amount / 2,
+        'igst': gst_amount,
+        'cess': cess,
+        'gst_amount': gst_amount,
+        'total': subtotal + gst_amount + cess
+    }
+
+
+def printed_paise(amount):
+    # What the invoice shows, read back as paise
+    return round(float(f"{amount:.2f}") * 100)
+
+
+def generate(lines, seed=22):
+    rng = random.Random(seed)
+    prices = [round(rng.uniform(1, 5000), rng.choice((0, 1, 2, 2, 2, 3)))
+              for _ in range(lines)]
+    quantities = [rng.randint(1, 24) for _ in range(lines)]
+    gst_rates = [rng.choice((0, 3, 5, 5, 12, 18, 18, 28)) for _ in range(lines)]
+    cess_rates = [rng.choice((0, 0, 0, 0, 1, 12)) for _ in range(lines)]
+    bills = []
+    start = 0
+    while start < lines:
+        size = min(rng.randint(1, 5), lines - start)
+        bills.append(range(start, start + size))
+        start += size
+    return prices, quantities, gst_rates, cess_rates, bills
+
+
+def mismatches(taxes, bills, paise_of):
+    """(lines whose halves don't add up, bills whose lines don't add up)"""
+    lines = sum(1 for tax in taxes
+                if paise_of(tax['cgst']) + paise_of(tax['sgst']) != paise_of(tax['gst_amount']))
+    bad_bills = sum(1 for bill in bills
+                    if sum(paise_of(taxes[i]['total']) for i in bill)
+                    != paise_of(sum(taxes[i]['total'] for i in bill)))
+    return lines, bad_bills
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=100_000)
+    args = parser.parse_args()
+
+    from utils.money import calculate_tax, tax_paise, tax_paise_batch, tax_rows
+
+    prices, quantities, gst_rates, cess_rates, bills = generate(args.lines)
+    columns = list(zip(prices, quantities, gst_rates, cess_rates))
+
+    started = time.perf_counter()
+    floats = [float_tax(*line) for line in columns]
+    float_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    paise = [tax_paise(*line) for line in columns]
+    paise_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = tax_paise_batch(prices, quantities, gst_rates, cess_rates)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = tax_rows(batch)
+    rows_seconds = time.perf_counter() - started
+
+    differing = sum(1 for line, row in zip(paise, rows) if line != row)
+    assert calculate_tax(*columns[0])['total'] == paise[0]['total'] / 100
+
+    print(f"{'engine':>22} {'seconds':>8} {'lines/s':>12}")
+    for label, seconds in (('float per line', float_seconds),
+                           ('paise per line', paise_seconds),
+                           ('paise batch (NumPy)', batch_seconds),
+                           ('batch + split to rows', batch_seconds + rows_seconds)):
+        print(f"{label:>22} {seconds:>8.3f} {args.lines / seconds:>12,.0f}")
+    print(f"batch lines differing from per-line paise: {differing}")
+
+    float_lines, float_bills = mismatches(floats, bills, printed_paise)
+    paise_lines, paise_bills = mismatches(paise, bills, lambda amount: amount)
+    print(f"{'':>22} {'lines off':>10} {'bills off':>10}  (of {args.lines} lines, "
+          f"{len(bills)} bills)")
+    print(f"{'float':>22} {float_lines:>10} {float_bills:>10}")
+    print(f"{'paise':>22} {paise_lines:>10} {paise_bills:>10}")
+
+
+if __name__ == '__main__':
+    main()
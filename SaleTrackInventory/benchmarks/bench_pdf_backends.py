@@ -0,0 +1,76 @@
+"""Throughput and peak RSS of the invoice PDF backends.
+
+Each backend runs in its own fresh process so peak RSS is not shared.
+wkhtmltopdf runs as a child process, so its memory is reported from
+RUSAGE_CHILDREN. Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_pdf_backends.py --bills 50 --lines 20
+"""
+import multiprocessing
+import resource
+import time
+
+from _bench import arg_parser
+
+
+def make_invoice(lines):
+    from utils.invoice_renderer import DEFAULT_COMPANY_INFO, InvoiceRenderer
+    from utils.qr_codes import qr_png
+
+    items = [{
+        'product_name': f'Product {i}',
+        'hsn_code': '8471',
+        'quantity': 2,
+        'price': 99.5,
+        'subtotal': 199.0,
+        'gst_rate': 18,
+        'gst_amount': 35.82,
+        'total': 234.82
+    } for i in range(lines)]
+    return {
+        'company': DEFAULT_COMPANY_INFO,
+        'bill_no': 'INV-00001',
+        'date': '2024-04-01 10:00:00',
+        'items': items,
+        'customer': {'name': 'Walk-in', 'mobile': '9999999999', 'gst_no': None},
+        'totals': InvoiceRenderer.totals(items),
+        'qr_png': qr_png({'bill_no': 'INV-00001'})
+    }
+
+
+def run_backend(backend_name, bills, lines):
+    from utils.pdf_renderer import render_invoice_pdf
+
+    invoice = make_invoice(lines)
+    render_invoice_pdf(invoice, backend_name)  # warm up imports
+    started = time.perf_counter()
+    for _ in range(bills):
+        render_invoice_pdf(invoice, backend_name)
+    elapsed = time.perf_counter() - started
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return bills / elapsed, own / 1024, children / 1024
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--bills', type=int, default=50)
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--backends', nargs='+', default=['canvas', 'pdfkit'])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'backend':>8} {'bills/s':>10} {'RSS MB':>8} {'child RSS MB':>13}")
+    for backend in args.backends:
+        with context.Pool(1) as pool:
+            try:
+                rate, own, children = pool.apply(run_backend,
+                                                 (backend, args.bills, args.lines))
+            except Exception as e:
+                print(f"{backend:>8} unavailable: {e}")
+                continue
+        print(f"{backend:>8} {rate:>10.1f} {own:>8.1f} {children:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
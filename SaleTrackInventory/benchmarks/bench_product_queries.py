@@ -0,0 +1,67 @@
+"""Full-catalogue get_products vs keyset-paginated query_products.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_product_queries.py --products 100000
+"""
+import os
+import tempfile
+import time
+
+from _bench import arg_parser
+
+CATEGORIES = ('Grocery', 'Dairy', 'Snacks', 'Beverages', 'Household')
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from storage import Storage
+
+        storage = Storage()
+        storage.db.executemany(
+            "INSERT INTO products (name, price, quantity, mrp, barcode, category, gst_rate) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((f'Product {i:06d}', 10.0, i % 50, 12.0, f'890{i:010d}',
+              CATEGORIES[i % len(CATEGORIES)], 18) for i in range(args.products)))
+
+        # A cursor deep into the catalogue, to show later pages cost the same
+        deep = storage.query_products(order='name', name_prefix='Product 09',
+                                      limit=args.page)['next_cursor']
+        pos_fields = ['id', 'name', 'price', 'gst_rate', 'quantity', 'barcode']
+        cases = (
+            ('get_products (all rows)', storage.get_products),
+            ('first page, all columns', lambda: storage.query_products(limit=args.page)),
+            ('first page, POS columns', lambda: storage.query_products(
+                fields=pos_fields, order='name', limit=args.page)),
+            ('deep page by name', lambda: storage.query_products(
+                fields=pos_fields, order='name', after=deep, limit=args.page)),
+            ('name prefix search', lambda: storage.query_products(
+                fields=pos_fields, order='name', name_prefix='product 0421', limit=args.page)),
+            ('category + low stock', lambda: storage.query_products(
+                category='Dairy', low_stock=True, limit=args.page)),
+        )
+        print(f"{'query':>26} {'ms':>10}")
+        for label, fn in cases:
+            print(f"{label:>26} {timed(fn):>10.2f}")
+        storage.deliveries.shutdown()
+        storage.render_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
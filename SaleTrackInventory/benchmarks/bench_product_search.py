@@ -0,0 +1,95 @@
+"""As-you-type product search latency over the FTS5 index.
+
+The catalogue has a long-tailed vocabulary: a few thousand brands with
+Pareto-distributed popularity, so some prefixes match tens of thousands of
+products. Every keystroke of sampled product names is searched. Run from
+the SaleTrackInventory directory:
+
+    python benchmarks/bench_product_search.py --products 500000
+"""
+import os
+import random
+import tempfile
+import time
+
+from _bench import arg_parser
+
+SIZES = ('100g', '200g', '500g', '1kg', '5kg', '250ml', '1L', 'pack of 6')
+CATEGORIES = ('Grocery', 'Dairy', 'Snacks', 'Beverages', 'Household', 'Personal Care')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_products(count, rng):
+    def word(syllables):
+        return ''.join(rng.choice('bcdfghjklmnprstvw') + rng.choice('aeiou')
+                       for _ in range(syllables))
+
+    brands = [word(rng.randint(2, 4)).title() for _ in range(3000)]
+    items = [word(rng.randint(2, 4)).title() for _ in range(4000)]
+    for i in range(count):
+        brand = brands[min(int(rng.paretovariate(1.2)) - 1, len(brands) - 1)]
+        name = f'{brand} {rng.choice(items)} {rng.choice(SIZES)}'
+        yield (name, 10.0, 100, 12.0, f'890{i:010d}', rng.choice(CATEGORIES),
+               f'{rng.randrange(1000, 9999)}', 18)
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--products', type=int, default=500_000)
+    parser.add_argument('--samples', type=int, default=40,
+                        help='product names whose every keystroke is searched')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from storage import Storage
+
+        storage = Storage()
+        storage.deliveries.shutdown()
+        started = time.perf_counter()
+        storage.db.executemany(
+            "INSERT INTO products (name, price, quantity, mrp, barcode, category, hsn_code, gst_rate) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", make_products(args.products, rng))
+        print(f"inserted {args.products} products (FTS kept by triggers) in "
+              f"{time.perf_counter() - started:.1f}s")
+        storage.db.execute_query("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+        # Fold the bulk load out of the WAL, as a long-running server would have
+        storage.db.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        step = max(1, args.products // args.samples)
+        names = [row[0] for row in storage.db.execute_query(
+            "SELECT name FROM products WHERE id % ? = 0 LIMIT ?", (step, args.samples))]
+        samples = []
+        for name in names + [f'890{args.products // 2:010d}']:
+            for end in range(2, len(name) + 1):
+                started = time.perf_counter()
+                storage.search_products(name[:end], limit=args.limit)
+                samples.append((time.perf_counter() - started) * 1000)
+
+        print(f"{len(samples)} keystrokes: p50 {percentile(samples, 50):.2f}ms "
+              f"p95 {percentile(samples, 95):.2f}ms p99 {percentile(samples, 99):.2f}ms "
+              f"max {max(samples):.2f}ms")
+
+        query = ' '.join(names[0].split()[:2])[:-1]
+        print(f"top hits for {query!r}:",
+              [product['name'] for product in storage.search_products(query, limit=3)])
+
+        # Triggers keep the index in step with edits
+        product = storage.search_products(names[0], limit=1)[0]
+        storage.update_product(product['id'], 'Zebra Crossing Paint', 10.0, 1, 12.0)
+        print('after rename:', [p['name'] for p in storage.search_products('zebra cro')],
+              'old name still found:',
+              any(p['id'] == product['id'] for p in storage.search_products(names[0])))
+        storage.render_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Report export memory: streamed CSV and xlsx stay flat as row counts grow.
+
+Fills sale_lines with N rows, then drains the /reports CSV and Excel
+responses through the Flask test client for each size, recording the
+bytes produced and the time taken. With --memory a second, traced pass
+records the peak Python heap (tracemalloc) while streaming; tracing
+slows openpyxl down several times, so it is kept out of the timings.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_report_export.py --rows 10000 100000 1000000
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+
+def drain(client, url):
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    size = 0
+    lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    return response.status_code, size, lines, time.perf_counter() - started
+
+
+def traced_peak(client, url):
+    tracemalloc.start()
+    drain(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--skip-xlsx', action='store_true',
+                        help='xlsx is much slower to write; time CSV only')
+    parser.add_argument('--memory', action='store_true',
+                        help='also measure the peak heap in a traced pass')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['BILL_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from app import app, storage
+        storage.deliveries.shutdown()
+        storage.users['bench'] = {'username': 'bench'}
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = 'bench'
+
+        first = datetime(2024, 4, 1)
+        loaded = 0
+        print(f"{'rows':>9} {'format':>6} {'MB':>8} {'seconds':>8} {'peak heap MB':>13}")
+        for target in sorted(args.rows):
+            storage.db.executemany(
+                """
+                INSERT INTO sale_lines (date, product_id, product_name, hsn_code,
+                                        quantity, price, subtotal, cgst, sgst, igst, total)
+                VALUES (?, 1, 'Product', '1234', 2, 50.0, 100.0, 9.0, 9.0, 18.0, 118.0)
+                """, (((first + timedelta(seconds=number * 30)).strftime('%Y-%m-%d %H:%M:%S'), )
+                      for number in range(loaded, target)))
+            loaded = target
+
+            formats = ['csv'] if args.skip_xlsx else ['csv', 'excel']
+            for fmt in formats:
+                url = f'/reports?type=sales&format={fmt}'
+                status, size, _, elapsed = drain(client, url)
+                assert status == 200, status
+                peak = f"{traced_peak(client, url) / 1e6:.2f}" if args.memory else '-'
+                print(f"{target:>9} {fmt:>6} {size / 1e6:>8.1f} {elapsed:>8.2f} {peak:>13}")
+
+        _, _, lines, _ = drain(
+            client, '/reports?type=sales&format=csv&start_date=2024-04-01&end_date=2024-04-01')
+        print(f"start_date=end_date=2024-04-01: {lines - 1} rows (2880 per day expected)")
+        storage.render_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Dashboard chart series as the ledger grows, from rollups vs from the lines.
+
+Grows sale_lines in steps up to --lines lines, all sold over the same year,
+so each step packs more lines into every bucket. Purchases are a tenth as
+many. At every step it times the daily series for the year and the hourly
+series for its last week. Both are read from sales_rollups and compared with
+a GROUP BY over sale_lines and purchase_lines for the same range. It also
+reports what the rollup triggers add to writing the lines.
+
+Run from the SaleTrackInventory directory:
+
+    python benchmarks/bench_sales_trends.py --lines 2000000
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from _bench import arg_parser
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+START = datetime(2025, 10, 1)
+END = START + timedelta(days=365) - timedelta(seconds=1)
+TRIGGERS = ('{table}_rollup_insert', '{table}_rollup_delete', '{table}_rollup_update')
+
+
+def line_rows(count, rng):
+    for _ in range(count):
+        stamp = START + timedelta(seconds=rng.randrange(365 * 86400))
+        quantity = rng.randint(1, 6)
+        subtotal = round(rng.uniform(10, 500) * quantity, 2)
+        yield (stamp.strftime(DATE_FORMAT), rng.randint(1, 5000), 'Product', quantity,
+               subtotal, round(subtotal * 1.18, 2))
+
+
+def insert(db, table, rows):
+    db.executemany(f"INSERT INTO {table} (date, product_id, product_name, quantity, "
+                   f"price, subtotal, total) VALUES (?, ?, ?, ?, 0, ?, ?)", rows)
+
+
+def grouped(db, granularity, start, end):
+    """The same series straight from the ledger, one GROUP BY per table"""
+    width = 13 if granularity == 'hour' else 10
+    series = {}
+    for table in ('sale_lines', 'purchase_lines'):
+        for bucket, amount in db.execute_query(
+                f"SELECT substr(date, 1, {width}), SUM(total) FROM {table} "
+                f"WHERE date >= ? AND date <= ? GROUP BY 1", (start, end + '~')):
+            series.setdefault(bucket, []).append(amount)
+    return series
+
+
+def timed(function, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--lines', type=int, default=2_000_000)
+    parser.add_argument('--steps', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        from database import Database
+        from models.sales_trends import SalesTrends
+
+        db = Database()
+        trends = SalesTrends(db)
+        rng = random.Random(25)
+        last_week = (END - timedelta(days=6)).strftime('%Y-%m-%d')
+        year = (START.strftime('%Y-%m-%d'), END.strftime('%Y-%m-%d'))
+
+        print(f"{'sale lines':>12} {'day/rollup':>11} {'day/GROUP BY':>13} "
+              f"{'hour/rollup':>12} {'hour/GROUP BY':>14}")
+        written = 0
+        insert_seconds = 0.0
+        for step in range(1, args.steps + 1):
+            target = args.lines * step // args.steps
+            started = time.perf_counter()
+            insert(db, 'sale_lines', line_rows(target - written, rng))
+            insert(db, 'purchase_lines', line_rows((target - written) // 10, rng))
+            insert_seconds += time.perf_counter() - started
+            written = target
+
+            daily, day_rollup = timed(trends.series, 'day', *year)
+            _, day_lines = timed(grouped, db, 'day', *year, repeat=1)
+            _, hour_rollup = timed(trends.series, 'hour', last_week, year[1])
+            _, hour_lines = timed(grouped, db, 'hour', last_week, year[1], repeat=1)
+            assert daily['totals']['sale_lines'] == written
+            print(f"{written:>12,} {day_rollup:>11.4f} {day_lines:>13.3f} "
+                  f"{hour_rollup:>12.4f} {hour_lines:>14.3f}")
+
+        sales = db.execute_query("SELECT COALESCE(SUM(total), 0) FROM sale_lines")[0][0]
+        assert abs(daily['totals']['sales'] - sales) < 1, (daily['totals']['sales'], sales)
+
+        # The same number of lines again without the triggers, for their cost
+        count = min(args.lines, 200_000)
+        with db.transaction() as connection:
+            for table in ('sale_lines', 'purchase_lines'):
+                for trigger in TRIGGERS:
+                    connection.execute(f"DROP TRIGGER {trigger.format(table=table)}")
+        started = time.perf_counter()
+        insert(db, 'sale_lines', line_rows(count, rng))
+        bare = time.perf_counter() - started
+        per_line = insert_seconds / (written + written // 10)
+        print(f"writing a line: {per_line * 1e6:.1f}us with the rollup triggers, "
+              f"{bare / count * 1e6:.1f}us without")
+        print(f"daily totals match sale_lines: {sales:,.2f}")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Bill e-mail throughput: one SMTP session per message vs the pooled sender.
+
+Runs against a local aiosmtpd server (pip install aiosmtpd), optionally
+with an artificial per-command delay to mimic a remote relay. Run from the
+SaleTrackInventory directory:
+
+    python benchmarks/bench_smtp_sender.py --messages 200 --pool 4 --latency 0.005
+"""
+import asyncio
+import os
+import smtplib
+import socket
+import time
+
+from _bench import arg_parser
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import SMTP
+
+from utils.bill_sender import BillSender
+
+
+class Sink:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+class SlowSMTP(SMTP):
+    latency = 0.0
+
+    async def push(self, status):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await super().push(status)
+
+
+class SlowController(Controller):
+    def factory(self):
+        return SlowSMTP(self.handler, **self.SMTP_kwargs)
+
+
+def messages(count, pdf):
+    for i in range(count):
+        yield {
+            'to_email': f'customer{i}@example.com',
+            'subject': f'Invoice INV-{i:05d}',
+            'body': 'Please find your bill attached.',
+            'pdf_content': pdf
+        }
+
+
+def fresh_connection_per_message(sender, count, pdf):
+    # The original send_email: connect, (TLS), login, send and quit each time
+    for message in messages(count, pdf):
+        msg = sender.build_email(message['to_email'], message['subject'],
+                                 message['body'], message['pdf_content'])
+        with smtplib.SMTP(sender.smtp_host, sender.smtp_port) as server:
+            server.send_message(msg)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = arg_parser(__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--pool', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server waits before each reply')
+    parser.add_argument('--pdf-kb', type=int, default=40)
+    args = parser.parse_args()
+
+    SlowSMTP.latency = args.latency
+    handler = Sink()
+    port = free_port()
+    controller = SlowController(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        pdf = os.urandom(args.pdf_kb * 1024)
+        sender = BillSender('127.0.0.1', port, 'billing@example.com', None, None,
+                            pool_size=args.pool, use_tls=False)
+
+        started = time.perf_counter()
+        fresh_connection_per_message(sender, args.messages, pdf)
+        fresh = args.messages / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        results = sender.send_bulk(messages(args.messages, pdf))
+        pooled = args.messages / (time.perf_counter() - started)
+        sender.close()
+
+        failed = sum(not result['ok'] for result in results)
+        print(f"{'mode':>22} {'msgs/s':>10}")
+        print(f"{'connection per message':>22} {fresh:>10.1f}")
+        print(f"{'pooled send_bulk':>22} {pooled:>10.1f}")
+        print(f"sessions opened: {sender.smtp_pool.connects}, failed: {failed}, "
+              f"received: {handler.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,651 @@
-
-import os
-import sqlite3
-import logging
-
-class Database:
-    def __init__(self):
-        try:
-            self.connection = sqlite3.connect('local.db', check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
-            self.create_tables()
-        except Exception as e:
-            logging.error(f"Database connection error: {e}")
-            raise
-
-    def create_tables(self):
-        # Create products table
-        self.connection.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price REAL NOT NULL,
-                quantity INTEGER NOT NULL,
-                mrp REAL NOT NULL,
-                barcode TEXT,
-                unit TEXT,
-                category TEXT,
-                hsn_code TEXT,
-                gst_rate INTEGER DEFAULT 0,
-                cess_rate INTEGER DEFAULT 0
-            )
-        """)
-        self.connection.commit()
-
-    def execute_query(self, query, params=None):
-        cursor = self.connection.cursor()
-        try:
-            # Convert PostgreSQL placeholder to SQLite
-            query = query.replace('%s', '?')
-            cursor.execute(query, params or ())
-            self.connection.commit()
-            try:
-                return cursor.fetchall()
-            except:
-                return []
-        finally:
-            cursor.close()
+import os
+import queue
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+# Bucket keys per grain, as the text a line's date starts with. Weeks are
+# summed from days when read.
+ROLLUP_GRAINS = {
+    'hour': "substr({date}, 1, 13) || ':00:00'",
+    'day': "substr({date}, 1, 10)",
+    'month': "substr({date}, 1, 7) || '-01'",
+}
+# Ledger table -> (count column, paise column) it adds to in sales_rollups
+ROLLUP_SOURCES = {
+    'sale_lines': ('sale_lines', 'sales'),
+    'purchase_lines': ('purchase_lines', 'purchases'),
+}
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by request threads"""
+
+    def __init__(self, path, size=8, timeout=30):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path,
+                                     timeout=self.timeout,
+                                     check_same_thread=False,
+                                     isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        # WAL lets readers run alongside the single writer and
+        # synchronous=NORMAL drops the fsync from every commit
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a database connection")
+
+    def release(self, connection):
+        if connection.in_transaction:
+            # A connection must never go back to the pool mid-transaction
+            connection.rollback()
+        self._idle.put_nowait(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class Database:
+    def __init__(self, path=None, pool_size=None):
+        self.path = path or os.environ.get('DATABASE_PATH', 'local.db')
+        self.pool = ConnectionPool(
+            self.path,
+            size=pool_size or int(os.environ.get('DATABASE_POOL_SIZE', 8)))
+        self._local = threading.local()
+        try:
+            self.create_tables()
+        except Exception as e:
+            logging.error(f"Database connection error: {e}")
+            raise
+
+    def create_tables(self):
+        with self.transaction() as connection:
+            # Create products table
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    mrp REAL NOT NULL,
+                    barcode TEXT,
+                    unit TEXT,
+                    category TEXT,
+                    hsn_code TEXT,
+                    gst_rate INTEGER DEFAULT 0,
+                    cess_rate INTEGER DEFAULT 0
+                )
+            """)
+
+            # Ledger tables: one row per bill and one row per sold or
+            # purchased line. Dates are stored as 'YYYY-MM-DD HH:MM:SS' text
+            # so lexical order is chronological order.
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS bills (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bill_no TEXT UNIQUE,
+                    date TEXT NOT NULL,
+                    customer_id INTEGER,
+                    subtotal REAL NOT NULL DEFAULT 0,
+                    gst_amount REAL NOT NULL DEFAULT 0,
+                    cess REAL NOT NULL DEFAULT 0,
+                    total REAL NOT NULL DEFAULT 0
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sale_lines (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bill_id INTEGER REFERENCES bills(id),
+                    date TEXT NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    product_name TEXT NOT NULL,
+                    hsn_code TEXT,
+                    customer_id INTEGER,
+                    quantity INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    subtotal REAL NOT NULL,
+                    cgst REAL NOT NULL DEFAULT 0,
+                    sgst REAL NOT NULL DEFAULT 0,
+                    igst REAL NOT NULL DEFAULT 0,
+                    cess REAL NOT NULL DEFAULT 0,
+                    gst_rate INTEGER NOT NULL DEFAULT 0,
+                    gst_amount REAL NOT NULL DEFAULT 0,
+                    total REAL NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS purchase_lines (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    product_name TEXT NOT NULL,
+                    hsn_code TEXT,
+                    quantity INTEGER NOT NULL,
+                    price REAL NOT NULL,
+                    subtotal REAL NOT NULL,
+                    cgst REAL NOT NULL DEFAULT 0,
+                    sgst REAL NOT NULL DEFAULT 0,
+                    igst REAL NOT NULL DEFAULT 0,
+                    cess REAL NOT NULL DEFAULT 0,
+                    gst_rate INTEGER NOT NULL DEFAULT 0,
+                    gst_amount REAL NOT NULL DEFAULT 0,
+                    total REAL NOT NULL
+                )
+            """)
+            # mobile_key and gst_key hold the normalized forms that lookups
+            # and uniqueness are checked against; name_key is casefolded
+            # for prefix search
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS customers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    name_key TEXT NOT NULL,
+                    mobile TEXT NOT NULL,
+                    mobile_key TEXT NOT NULL,
+                    email TEXT,
+                    gst_no TEXT,
+                    gst_key TEXT,
+                    created_at TEXT NOT NULL,
+                    total_purchases REAL NOT NULL DEFAULT 0,
+                    last_purchase_date TEXT
+                )
+            """)
+            # Outbound bill deliveries. Rows survive restarts; next_attempt_at
+            # is a Unix timestamp so backoff delays can be sub-second.
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    subject TEXT,
+                    body TEXT NOT NULL DEFAULT '',
+                    bill_id INTEGER REFERENCES bills(id),
+                    attachment BLOB,
+                    filename TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 5,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    sent_at TEXT,
+                    claimed_at REAL
+                )
+            """)
+            # Outboxes created before sends were leased
+            outbox_columns = {row['name'] for row in connection.execute("PRAGMA table_info(outbox)")}
+            if 'claimed_at' not in outbox_columns:
+                connection.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+            # Last invoice number issued per series and financial year
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS invoice_sequences (
+                    series TEXT NOT NULL,
+                    fy TEXT NOT NULL,
+                    last_no INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (series, fy)
+                )
+            """)
+            # Double-entry journal. account_balances holds one row per
+            # account and day: the day's movements plus the running totals
+            # through that day, so any balance is a single index seek.
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal_entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    reference TEXT,
+                    source TEXT,
+                    source_id INTEGER
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal_lines (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entry_id INTEGER NOT NULL REFERENCES journal_entries(id),
+                    date TEXT NOT NULL,
+                    account TEXT NOT NULL,
+                    debit REAL NOT NULL DEFAULT 0,
+                    credit REAL NOT NULL DEFAULT 0
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS account_balances (
+                    account TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    debit REAL NOT NULL DEFAULT 0,
+                    credit REAL NOT NULL DEFAULT 0,
+                    cum_debit REAL NOT NULL DEFAULT 0,
+                    cum_credit REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (account, day)
+                )
+            """)
+            for statement in (
+                    "CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(date)",
+                    "CREATE INDEX IF NOT EXISTS idx_bills_customer ON bills(customer_id, date)",
+                    "CREATE INDEX IF NOT EXISTS idx_sale_lines_date ON sale_lines(date)",
+                    "CREATE INDEX IF NOT EXISTS idx_sale_lines_product ON sale_lines(product_id, date)",
+                    "CREATE INDEX IF NOT EXISTS idx_sale_lines_customer ON sale_lines(customer_id, date)",
+                    "CREATE INDEX IF NOT EXISTS idx_sale_lines_bill ON sale_lines(bill_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_purchase_lines_date ON purchase_lines(date)",
+                    "CREATE INDEX IF NOT EXISTS idx_purchase_lines_product ON purchase_lines(product_id, date)",
+                    "CREATE INDEX IF NOT EXISTS idx_products_name ON products(name COLLATE NOCASE, id)",
+                    "CREATE INDEX IF NOT EXISTS idx_products_category ON products(category, id)",
+                    "CREATE INDEX IF NOT EXISTS idx_products_quantity ON products(quantity, id)",
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_mobile ON customers(mobile_key)",
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_gst ON customers(gst_key) WHERE gst_key IS NOT NULL",
+                    "CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name_key)",
+                    "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)",
+                    "CREATE INDEX IF NOT EXISTS idx_outbox_bill ON outbox(bill_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_journal_entries_date ON journal_entries(date)",
+                    "CREATE INDEX IF NOT EXISTS idx_journal_entries_source ON journal_entries(source, source_id)",
+                    "CREATE INDEX IF NOT EXISTS idx_journal_lines_account ON journal_lines(account, date)",
+                    "CREATE INDEX IF NOT EXISTS idx_journal_lines_entry ON journal_lines(entry_id)",
+            ):
+                connection.execute(statement)
+
+            # Barcodes identify a product at the counter, so they must be
+            # unique. Blank barcodes are left out of the index.
+            try:
+                connection.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_products_barcode ON products(barcode) "
+                    "WHERE barcode IS NOT NULL AND barcode != ''")
+            except sqlite3.IntegrityError:
+                logging.warning("Duplicate product barcodes found; "
+                                "barcode index created without the unique constraint")
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_products_barcode_dup ON products(barcode) "
+                    "WHERE barcode IS NOT NULL AND barcode != ''")
+
+        self.has_fts = self._create_product_search()
+        self._create_gst_daily()
+        self._create_sales_rollups()
+
+    def _create_product_search(self):
+        """FTS5 index over products, kept in sync by triggers.
+
+        It is an external-content table, so the text lives only in products.
+        The update trigger fires only for the indexed columns; stock changes
+        at checkout never touch the index. Prefix indexes up to six
+        characters let a half-typed word be looked up directly. Without
+        them, FTS5 would merge every matching term's posting list, which is
+        slow for popular brands. Returns False when this SQLite build lacks
+        FTS5.
+        """
+        with self.transaction() as connection:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+            try:
+                connection.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                        name, category, barcode, hsn_code,
+                        content='products', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2',
+                        prefix='2 3 4 5 6'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Full-text product search unavailable: {e}")
+                return False
+
+            connection.execute("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                    INSERT INTO products_fts(rowid, name, category, barcode, hsn_code)
+                    VALUES (new.id, new.name, new.category, new.barcode, new.hsn_code);
+                END
+            """)
+            connection.execute("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, name, category, barcode, hsn_code)
+                    VALUES ('delete', old.id, old.name, old.category, old.barcode, old.hsn_code);
+                END
+            """)
+            connection.execute("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_update
+                AFTER UPDATE OF name, category, barcode, hsn_code ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, name, category, barcode, hsn_code)
+                    VALUES ('delete', old.id, old.name, old.category, old.barcode, old.hsn_code);
+                    INSERT INTO products_fts(rowid, name, category, barcode, hsn_code)
+                    VALUES (new.id, new.name, new.category, new.barcode, new.hsn_code);
+                END
+            """)
+            if not exists:
+                # Index products that predate the search table
+                connection.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        return True
+
+    def _create_gst_daily(self):
+        """Sale lines summed per day, HSN and rate, kept in sync by triggers.
+
+        GST returns read a month from here: a few thousand rows a day,
+        however many lines were sold, instead of sorting every line of the
+        month. Amounts are in paise. The update trigger fires only for the
+        columns summed, so linking a line to a bill does not touch it.
+        """
+        key = "substr({row}.date, 1, 10), COALESCE(NULLIF({row}.hsn_code, ''), 'NA'), {row}.gst_rate"
+        paise = ", ".join(f"CAST(ROUND({{row}}.{column} * 100) AS INTEGER)"
+                          for column in ('subtotal', 'cgst', 'sgst', 'igst', 'cess'))
+        add = f"""
+            INSERT INTO gst_daily (day, hsn_code, gst_rate, lines, quantity, subtotal,
+                                   cgst, sgst, igst, cess, description)
+            VALUES ({key.format(row='new')}, 1, new.quantity, {paise.format(row='new')},
+                    new.product_name)
+            ON CONFLICT (day, hsn_code, gst_rate) DO UPDATE SET
+                lines = lines + 1, quantity = quantity + excluded.quantity,
+                subtotal = subtotal + excluded.subtotal, cgst = cgst + excluded.cgst,
+                sgst = sgst + excluded.sgst, igst = igst + excluded.igst,
+                cess = cess + excluded.cess;
+        """
+        old_paise = [f"CAST(ROUND(old.{column} * 100) AS INTEGER)"
+                     for column in ('subtotal', 'cgst', 'sgst', 'igst', 'cess')]
+        remove = f"""
+            UPDATE gst_daily SET
+                lines = lines - 1, quantity = quantity - old.quantity,
+                subtotal = subtotal - {old_paise[0]}, cgst = cgst - {old_paise[1]},
+                sgst = sgst - {old_paise[2]}, igst = igst - {old_paise[3]},
+                cess = cess - {old_paise[4]}
+            WHERE (day, hsn_code, gst_rate) = ({key.format(row='old')});
+        """
+        with self.transaction() as connection:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'gst_daily'").fetchone()
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS gst_daily (
+                    day TEXT NOT NULL,
+                    hsn_code TEXT NOT NULL,
+                    gst_rate INTEGER NOT NULL,
+                    lines INTEGER NOT NULL DEFAULT 0,
+                    quantity INTEGER NOT NULL DEFAULT 0,
+                    subtotal INTEGER NOT NULL DEFAULT 0,
+                    cgst INTEGER NOT NULL DEFAULT 0,
+                    sgst INTEGER NOT NULL DEFAULT 0,
+                    igst INTEGER NOT NULL DEFAULT 0,
+                    cess INTEGER NOT NULL DEFAULT 0,
+                    description TEXT,
+                    PRIMARY KEY (day, hsn_code, gst_rate)
+                )
+            """)
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS gst_daily_insert AFTER INSERT ON sale_lines BEGIN
+                    {add}
+                END
+            """)
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS gst_daily_delete AFTER DELETE ON sale_lines BEGIN
+                    {remove}
+                END
+            """)
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS gst_daily_update
+                AFTER UPDATE OF date, hsn_code, gst_rate, quantity, subtotal, cgst, sgst, igst, cess
+                ON sale_lines BEGIN
+                    {remove}
+                    {add}
+                END
+            """)
+            if not exists:
+                # Sum the lines sold before the rollup existed
+                self.rebuild_gst_daily()
+
+    def rebuild_gst_daily(self):
+        """Recompute gst_daily from sale_lines; returns the rows written"""
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM gst_daily")
+            connection.execute("""
+                INSERT INTO gst_daily (day, hsn_code, gst_rate, lines, quantity, subtotal,
+                                       cgst, sgst, igst, cess, description)
+                SELECT substr(date, 1, 10), COALESCE(NULLIF(hsn_code, ''), 'NA'), gst_rate,
+                       COUNT(*), SUM(quantity),
+                       SUM(CAST(ROUND(subtotal * 100) AS INTEGER)),
+                       SUM(CAST(ROUND(cgst * 100) AS INTEGER)),
+                       SUM(CAST(ROUND(sgst * 100) AS INTEGER)),
+                       SUM(CAST(ROUND(igst * 100) AS INTEGER)),
+                       SUM(CAST(ROUND(cess * 100) AS INTEGER)),
+                       MIN(product_name)
+                FROM sale_lines
+                GROUP BY 1, 2, 3
+            """)
+            return connection.execute("SELECT COUNT(*) FROM gst_daily").fetchone()[0]
+
+    def _create_sales_rollups(self):
+        """Sale and purchase totals per hour, day and month, kept by triggers.
+
+        Each committed line adds to one bucket of each grain inside its own
+        transaction, so a dashboard chart reads one row per bucket however
+        many lines were sold in it. Amounts are line totals in paise. The
+        update triggers fire only when a line's date or total changes.
+        """
+        with self.transaction() as connection:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sales_rollups'").fetchone()
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sales_rollups (
+                    grain TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    sale_lines INTEGER NOT NULL DEFAULT 0,
+                    sales INTEGER NOT NULL DEFAULT 0,
+                    purchase_lines INTEGER NOT NULL DEFAULT 0,
+                    purchases INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (grain, bucket)
+                ) WITHOUT ROWID
+            """)
+            for table, (lines, amount) in ROLLUP_SOURCES.items():
+                add = "".join(f"""
+                    INSERT INTO sales_rollups (grain, bucket, {lines}, {amount})
+                    VALUES ('{grain}', {key.format(date='new.date')}, 1,
+                            CAST(ROUND(new.total * 100) AS INTEGER))
+                    ON CONFLICT (grain, bucket) DO UPDATE SET
+                        {lines} = {lines} + 1, {amount} = {amount} + excluded.{amount};
+                """ for grain, key in ROLLUP_GRAINS.items())
+                remove = "".join(f"""
+                    UPDATE sales_rollups SET
+                        {lines} = {lines} - 1,
+                        {amount} = {amount} - CAST(ROUND(old.total * 100) AS INTEGER)
+                    WHERE grain = '{grain}' AND bucket = {key.format(date='old.date')};
+                """ for grain, key in ROLLUP_GRAINS.items())
+                connection.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_rollup_insert
+                    AFTER INSERT ON {table} BEGIN
+                        {add}
+                    END
+                """)
+                connection.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_rollup_delete
+                    AFTER DELETE ON {table} BEGIN
+                        {remove}
+                    END
+                """)
+                connection.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_rollup_update
+                    AFTER UPDATE OF date, total ON {table} BEGIN
+                        {remove}
+                        {add}
+                    END
+                """)
+            if not exists:
+                # Sum the lines written before the rollups existed
+                self.rebuild_sales_rollups()
+
+    def rebuild_sales_rollups(self):
+        """Recompute sales_rollups from the ledger; returns the rows written"""
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM sales_rollups")
+            for table, (lines, amount) in ROLLUP_SOURCES.items():
+                for grain, key in ROLLUP_GRAINS.items():
+                    # WHERE true keeps SQLite from reading ON CONFLICT as a join
+                    connection.execute(f"""
+                        INSERT INTO sales_rollups (grain, bucket, {lines}, {amount})
+                        SELECT '{grain}', {key.format(date='date')}, COUNT(*),
+                               SUM(CAST(ROUND(total * 100) AS INTEGER))
+                        FROM {table}
+                        WHERE true
+                        GROUP BY 2
+                        ON CONFLICT (grain, bucket) DO UPDATE SET
+                            {lines} = excluded.{lines}, {amount} = excluded.{amount}
+                    """)
+            return connection.execute("SELECT COUNT(*) FROM sales_rollups").fetchone()[0]
+
+    @contextmanager
+    def connection(self):
+        """Yield the connection pinned by an open transaction, or a pooled one"""
+        pinned = getattr(self._local, 'connection', None)
+        if pinned is not None:
+            yield pinned
+            return
+
+        connection = self.pool.acquire()
+        try:
+            yield connection
+        finally:
+            self.pool.release(connection)
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """Group several statements into a single commit.
+
+        Nested calls join the outer transaction, so helpers that write can be
+        composed inside one checkout without committing half-way through.
+        """
+        if getattr(self._local, 'connection', None) is not None:
+            self._local.depth += 1
+            try:
+                yield self._local.connection
+            finally:
+                self._local.depth -= 1
+            return
+
+        connection = self.pool.acquire()
+        self._local.connection = connection
+        self._local.depth = 1
+        self._local.callbacks = []
+        self._local.rollbacks = []
+        callbacks = []
+        try:
+            # IMMEDIATE takes the write lock up front so two writers cannot
+            # both read, then deadlock upgrading to a write
+            connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                callbacks = self._local.rollbacks
+                raise
+            callbacks = self._local.callbacks
+        finally:
+            self._local.connection = None
+            self._local.depth = 0
+            self._local.callbacks = []
+            self._local.rollbacks = []
+            self.pool.release(connection)
+
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"Post-transaction callback failed: {e}")
+
+    def in_transaction(self):
+        return getattr(self._local, 'connection', None) is not None
+
+    def on_commit(self, callback):
+        """Run callback once the current transaction commits, or now outside one"""
+        if self.in_transaction():
+            self._local.callbacks.append(callback)
+        else:
+            callback()
+
+    def on_rollback(self, callback):
+        """Run callback if the current transaction rolls back; no-op outside one"""
+        if self.in_transaction():
+            self._local.rollbacks.append(callback)
+
+    def execute_query(self, query, params=None):
+        # Convert PostgreSQL placeholder to SQLite
+        query = query.replace('%s', '?')
+        with self.connection() as connection:
+            cursor = connection.execute(query, params or ())
+            try:
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Yield rows as the cursor produces them, for results too big to fetch at once.
+
+        One connection is held until the generator is exhausted or closed.
+        """
+        query = query.replace('%s', '?')
+        with self.connection() as connection:
+            cursor = connection.execute(query, params or ())
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def execute_insert(self, query, params=None):
+        """Run an INSERT and return the new rowid"""
+        query = query.replace('%s', '?')
+        with self.connection() as connection:
+            cursor = connection.execute(query, params or ())
+            try:
+                return cursor.lastrowid
+            finally:
+                cursor.close()
+
+    def executemany(self, query, seq_of_params):
+        """Bulk write path: every row goes through one statement and one commit"""
+        query = query.replace('%s', '?')
+        with self.transaction() as connection:
+            cursor = connection.executemany(query, seq_of_params)
+            try:
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def close(self):
+        self.pool.close()
@@ -1,43 +1,275 @@
-
-from datetime import datetime
-
-class AccountingEntry:
-    def __init__(self, date, description, debit=0, credit=0, category=None, reference=None):
-        self.date = date
-        self.description = description
-        self.debit = debit
-        self.credit = credit
-        self.category = category
-        self.reference = reference
-
-class AccountingSystem:
-    def __init__(self):
-        self.entries = []
-        self.categories = ['Sales', 'Purchases', 'Expenses', 'Assets', 'Liabilities']
-        
-    def add_entry(self, entry):
-        self.entries.append(entry)
-        
-    def get_balance_sheet(self):
-        assets = sum(e.debit - e.credit for e in self.entries if e.category == 'Assets')
-        liabilities = sum(e.credit - e.debit for e in self.entries if e.category == 'Liabilities')
-        equity = assets - liabilities
-        return {'assets': assets, 'liabilities': liabilities, 'equity': equity}
-        
-    def get_income_statement(self, start_date=None, end_date=None):
-        sales = sum(e.credit - e.debit for e in self.entries if e.category == 'Sales' 
-                   and (not start_date or e.date >= start_date)
-                   and (not end_date or e.date <= end_date))
-        purchases = sum(e.debit - e.credit for e in self.entries if e.category == 'Purchases'
-                       and (not start_date or e.date >= start_date)
-                       and (not end_date or e.date <= end_date))
-        expenses = sum(e.debit - e.credit for e in self.entries if e.category == 'Expenses'
-                      and (not start_date or e.date >= start_date)
-                      and (not end_date or e.date <= end_date))
-        profit = sales - purchases - expenses
-        return {
-            'sales': sales,
-            'purchases': purchases,
-            'expenses': expenses,
-            'profit': profit
-        }
+from datetime import datetime, timedelta
+
+from utils.money import money_sum, to_paise, to_rupees
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Chart of accounts: name -> type. Assets and expenses carry debit balances,
+# the rest credit balances.
+ACCOUNTS = {
+    'Cash': 'asset',
+    'GST Input Credit': 'asset',
+    'Cess Input Credit': 'asset',
+    'GST Payable': 'liability',
+    'Cess Payable': 'liability',
+    'Capital': 'equity',
+    'Sales': 'income',
+    'Purchases': 'expense',
+    'Expenses': 'expense',
+}
+
+DEBIT_TYPES = ('asset', 'expense')
+
+
+def _day(date):
+    """'YYYY-MM-DD' for a datetime, date or date-like string"""
+    if isinstance(date, str):
+        return date[:10]
+    return date.strftime('%Y-%m-%d')
+
+
+def _previous_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+class AccountingEntry:
+    """One balanced journal entry: lines are (account, debit, credit)"""
+
+    def __init__(self, date, description, lines=(), reference=None, source=None,
+                 source_id=None):
+        self.date = date
+        self.description = description
+        self.lines = list(lines)
+        self.reference = reference
+        self.source = source
+        self.source_id = source_id
+
+    def debit(self, account, amount):
+        self.lines.append((account, amount, 0.0))
+        return self
+
+    def credit(self, account, amount):
+        self.lines.append((account, 0.0, amount))
+        return self
+
+
+class AccountingSystem:
+    """Double-entry journal stored in SQLite.
+
+    Every entry is written to journal_entries / journal_lines, and each
+    line also adds to account_balances: one row per account and day with
+    that day's movements and the account's running totals up to and
+    including the day. A balance at any date is then a single index seek,
+    and a statement for a date range is the difference of two such prefix
+    sums, however many entries the range holds.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.categories = list(ACCOUNTS)
+
+    def add_entry(self, entry):
+        return self.post(entry.date, entry.description, entry.lines, entry.reference,
+                         entry.source, entry.source_id)
+
+    def post(self, date, description, lines, reference=None, source=None, source_id=None):
+        """Write a balanced entry and return its id; joins an open transaction.
+
+        Lines are merged per account and rounded to paise. An entry whose
+        amounts are all zero is not written and returns None.
+        """
+        legs = {}
+        for account, debit, credit in lines:
+            if account not in ACCOUNTS:
+                raise ValueError(f"Unknown account: {account}")
+            debit = to_paise(debit)
+            credit = to_paise(credit)
+            if debit < 0 or credit < 0:
+                raise ValueError("Journal amounts cannot be negative")
+            total_debit, total_credit = legs.get(account, (0, 0))
+            legs[account] = (total_debit + debit, total_credit + credit)
+
+        # Balanced to the paisa, not to within a float tolerance
+        debits = sum(debit for debit, _ in legs.values())
+        credits = sum(credit for _, credit in legs.values())
+        if debits != credits:
+            raise ValueError(f"Unbalanced journal entry: debits {to_rupees(debits):.2f}, "
+                             f"credits {to_rupees(credits):.2f}")
+        legs = {account: (to_rupees(debit), to_rupees(credit))
+                for account, (debit, credit) in legs.items() if debit or credit}
+        if not legs:
+            return None
+
+        if not isinstance(date, str):
+            date = date.strftime(DATE_FORMAT)
+        day = _day(date)
+
+        with self.db.transaction() as connection:
+            entry_id = connection.execute(
+                """
+                INSERT INTO journal_entries (date, description, reference, source, source_id)
+                VALUES (?, ?, ?, ?, ?)
+                """, (date, description, reference, source, source_id)).lastrowid
+            connection.executemany(
+                """
+                INSERT INTO journal_lines (entry_id, date, account, debit, credit)
+                VALUES (?, ?, ?, ?, ?)
+                """, [(entry_id, date, account, debit, credit)
+                      for account, (debit, credit) in legs.items()])
+            for account, (debit, credit) in legs.items():
+                self._add_to_balances(connection, account, day, debit, credit)
+        return entry_id
+
+    def _add_to_balances(self, connection, account, day, debit, credit):
+        # Open the day's row carrying the running totals of the day before
+        connection.execute(
+            """
+            INSERT OR IGNORE INTO account_balances (account, day, cum_debit, cum_credit)
+            SELECT ?, ?, COALESCE(MAX(cum_debit), 0), COALESCE(MAX(cum_credit), 0)
+            FROM (SELECT cum_debit, cum_credit FROM account_balances
+                  WHERE account = ? AND day < ? ORDER BY day DESC LIMIT 1)
+            """, (account, day, account, day))
+        connection.execute(
+            "UPDATE account_balances SET debit = debit + ?, credit = credit + ? "
+            "WHERE account = ? AND day = ?", (debit, credit, account, day))
+        # Entries are almost always dated today, so this touches one row;
+        # a back-dated entry carries forward into the days after it
+        connection.execute(
+            "UPDATE account_balances SET cum_debit = cum_debit + ?, cum_credit = cum_credit + ? "
+            "WHERE account = ? AND day >= ?", (debit, credit, account, day))
+
+    def post_sale(self, sale_items, date=None, reference=None, source='bill',
+                  source_id=None):
+        """Cash received against sales, output GST and cess"""
+        subtotal = money_sum(item['subtotal'] for item in sale_items)
+        gst = money_sum(item['gst_amount'] for item in sale_items)
+        cess = money_sum(item['cess'] for item in sale_items)
+        # Cash is the sum of the rounded legs, so the entry always balances
+        entry = (AccountingEntry(date or sale_items[0]['date'],
+                                 f"Sale {reference}" if reference else "Sale",
+                                 reference=reference, source=source, source_id=source_id)
+                 .debit('Cash', money_sum((subtotal, gst, cess)))
+                 .credit('Sales', subtotal)
+                 .credit('GST Payable', gst)
+                 .credit('Cess Payable', cess))
+        return self.add_entry(entry)
+
+    def post_purchase(self, purchase):
+        """Cash paid for stock, with the GST and cess available as input credit"""
+        subtotal = purchase['subtotal']
+        gst = purchase['gst_amount']
+        cess = purchase['cess']
+        entry = (AccountingEntry(purchase['date'],
+                                 f"Purchase of {purchase['product_name']}",
+                                 source='purchase', source_id=purchase.get('id'))
+                 .debit('Purchases', subtotal)
+                 .debit('GST Input Credit', gst)
+                 .debit('Cess Input Credit', cess)
+                 .credit('Cash', money_sum((subtotal, gst, cess))))
+        return self.add_entry(entry)
+
+    def _cumulative(self, accounts, through_day):
+        """(cum_debit, cum_credit) per account at the end of through_day"""
+        totals = {}
+        with self.db.connection() as connection:
+            for account in accounts:
+                row = connection.execute(
+                    """
+                    SELECT cum_debit, cum_credit FROM account_balances
+                    WHERE account = ? AND day <= ? ORDER BY day DESC LIMIT 1
+                    """, (account, through_day)).fetchone()
+                totals[account] = (row[0], row[1]) if row else (0.0, 0.0)
+        return totals
+
+    @staticmethod
+    def _signed(account, debit, credit):
+        return debit - credit if ACCOUNTS[account] in DEBIT_TYPES else credit - debit
+
+    def balances(self, as_of=None, accounts=None):
+        """Closing balance of each account, in its natural sign, at the end of as_of"""
+        accounts = accounts or list(ACCOUNTS)
+        through_day = _day(as_of) if as_of else '9999-12-31'
+        return {
+            account: round(self._signed(account, debit, credit), 2)
+            for account, (debit, credit) in self._cumulative(accounts, through_day).items()
+        }
+
+    def movements(self, start_date=None, end_date=None, accounts=None):
+        """Net movement of each account between two inclusive dates"""
+        accounts = accounts or list(ACCOUNTS)
+        closing = self.balances(end_date, accounts)
+        if not start_date:
+            return closing
+        opening = self.balances(_previous_day(_day(start_date)), accounts)
+        return {account: round(closing[account] - opening[account], 2)
+                for account in accounts}
+
+    def get_balance_sheet(self, as_of=None):
+        balances = self.balances(as_of)
+        by_type = {}
+        for account, balance in balances.items():
+            by_type.setdefault(ACCOUNTS[account], {})[account] = balance
+        assets = sum(by_type.get('asset', {}).values())
+        liabilities = sum(by_type.get('liability', {}).values())
+        return {
+            'assets': round(assets, 2),
+            'liabilities': round(liabilities, 2),
+            'equity': round(assets - liabilities, 2),
+            'accounts': by_type
+        }
+
+    def get_income_statement(self, start_date=None, end_date=None):
+        movements = self.movements(start_date, end_date,
+                                   ['Sales', 'Purchases', 'Expenses'])
+        sales = movements['Sales']
+        purchases = movements['Purchases']
+        expenses = movements['Expenses']
+        return {
+            'sales': sales,
+            'purchases': purchases,
+            'expenses': expenses,
+            'profit': round(sales - purchases - expenses, 2)
+        }
+
+    def get_ledger(self, account, start_date=None, end_date=None, limit=500):
+        """Journal lines of one account, oldest first"""
+        clauses = ["l.account = ?"]
+        params = [account]
+        if start_date:
+            clauses.append("l.date >= ?")
+            params.append(_day(start_date))
+        if end_date:
+            clauses.append("l.date <= ?")
+            params.append(_day(end_date) + '~')
+        params.append(int(limit))
+        rows = self.db.execute_query(
+            f"""
+            SELECT l.date, e.description, e.reference, l.debit, l.credit
+            FROM journal_lines l JOIN journal_entries e ON e.id = l.entry_id
+            WHERE {' AND '.join(clauses)}
+            ORDER BY l.date, l.id
+            LIMIT ?
+            """, params)
+        return [dict(row) for row in rows]
+
+    def rebuild_balances(self):
+        """Recompute account_balances from journal_lines.
+
+        Returns the number of (account, day) rows written.
+        """
+        with self.db.transaction() as connection:
+            connection.execute("DELETE FROM account_balances")
+            connection.execute(
+                """
+                INSERT INTO account_balances (account, day, debit, credit, cum_debit, cum_credit)
+                SELECT account, day, debit, credit,
+                       SUM(debit) OVER (PARTITION BY account ORDER BY day),
+                       SUM(credit) OVER (PARTITION BY account ORDER BY day)
+                FROM (SELECT account, substr(date, 1, 10) AS day,
+                             SUM(debit) AS debit, SUM(credit) AS credit
+                      FROM journal_lines GROUP BY account, day)
+                """)
+            return connection.execute("SELECT COUNT(*) FROM account_balances").fetchone()[0]
+
+    def is_empty(self):
+        return not self.db.execute_query("SELECT 1 FROM journal_entries LIMIT 1")
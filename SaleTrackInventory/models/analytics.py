@@ -0,0 +1,224 @@
+import glob
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Columns copied out of the ledger tables; everything else the reports need
+# is looked up by product_id when they run
+SNAPSHOT_COLUMNS = ('id', 'date', 'product_id', 'quantity', 'subtotal', 'gst_amount',
+                    'cess', 'total')
+_DTYPES = {'id': 'int64', 'product_id': 'int64', 'quantity': 'float64',
+           'subtotal': 'float64', 'gst_amount': 'float64', 'cess': 'float64',
+           'total': 'float64'}
+TABLES = ('sale_lines', 'purchase_lines')
+FREQUENCIES = {'day': 'D', 'week': 'W', 'month': 'M'}
+TOP_BY = ('revenue', 'quantity', 'margin')
+
+
+def parquet_engine():
+    """The Parquet engine pandas can write with, or None"""
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return engine
+        except ImportError:
+            continue
+    return None
+
+
+def _empty():
+    frame = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in _DTYPES.items()})
+    frame['date'] = pd.Series(dtype='datetime64[ns]')
+    return frame[list(SNAPSHOT_COLUMNS)]
+
+
+def _frame(rows):
+    frame = pd.DataFrame.from_records(rows, columns=SNAPSHOT_COLUMNS).astype(_DTYPES)
+    frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d %H:%M:%S')
+    return frame
+
+
+def _in_range(frame, start_date=None, end_date=None):
+    mask = np.ones(len(frame), dtype=bool)
+    if start_date:
+        mask &= (frame['date'] >= pd.Timestamp(str(start_date)[:10])).to_numpy()
+    if end_date:
+        end = pd.Timestamp(str(end_date)[:10]) + pd.Timedelta(days=1)
+        mask &= (frame['date'] < end).to_numpy()
+    return frame[mask]
+
+
+class SalesAnalytics:
+    """Columnar snapshot of sale and purchase lines for the reports page.
+
+    Each table is held in memory as a pandas frame, one column per field,
+    and the reports run as vectorized group-bys over it instead of walking
+    line dicts. Lines are only ever appended, so a refresh reads just the
+    rows past the highest id already held and appends them.
+
+    With a directory and a Parquet engine (pyarrow or fastparquet), each
+    appended batch is also written out as Parquet files partitioned by
+    month: <directory>/<table>/month=YYYY-MM/part-<first id>-<last id>.parquet.
+    A restart then loads the files and reads only the newer lines.
+    Without a Parquet engine the snapshot lives in memory only.
+
+    Reads refresh the snapshot when it is older than refresh_seconds.
+    """
+
+    def __init__(self, db, directory=None, refresh_seconds=60):
+        self.db = db
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self.engine = parquet_engine() if directory else None
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._refreshed_at = None
+
+    def _table_dir(self, table):
+        return os.path.join(self.directory, table)
+
+    def _load(self, table):
+        """Frame of the Parquet files already written, or an empty one"""
+        if not self.engine:
+            return _empty()
+        paths = sorted(glob.glob(os.path.join(self._table_dir(table), 'month=*', '*.parquet')))
+        if not paths:
+            return _empty()
+        frame = pd.concat([pd.read_parquet(path, engine=self.engine) for path in paths],
+                          ignore_index=True)
+        # Two processes refreshing at once can both write a part for the same
+        # lines; the rows are identical, so any one copy will do
+        frame = frame.drop_duplicates('id', keep='last').sort_values('id', ignore_index=True)
+        # A database that was recreated starts its ids again; start over
+        latest = self.db.execute_query(f"SELECT MAX(id) FROM {table}")[0][0] or 0
+        if frame['id'].iloc[-1] > latest:
+            logging.warning(f"Analytics snapshot of {table} is ahead of the database; "
+                            "rebuilding it")
+            shutil.rmtree(self._table_dir(table), ignore_errors=True)
+            return _empty()
+        return frame[list(SNAPSHOT_COLUMNS)]
+
+    def _write(self, table, frame):
+        months = frame['date'].dt.strftime('%Y-%m')
+        for month, part in frame.groupby(months, sort=True):
+            directory = os.path.join(self._table_dir(table), f'month={month}')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory,
+                                f"part-{part['id'].iloc[0]:012d}-{part['id'].iloc[-1]:012d}.parquet")
+            # Written under a temporary name so readers never see half a file
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            os.close(fd)
+            try:
+                part.to_parquet(temp_path, engine=self.engine, index=False)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    def refresh(self):
+        """Append the lines written since the last refresh; returns how many"""
+        appended = 0
+        with self._lock:
+            for table in TABLES:
+                if table not in self._frames:
+                    self._frames[table] = self._load(table)
+                frame = self._frames[table]
+                watermark = int(frame['id'].iloc[-1]) if len(frame) else 0
+                rows = self.db.execute_query(
+                    f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM {table} "
+                    f"WHERE id > ? ORDER BY id", (watermark, ))
+                if not rows:
+                    continue
+                new = _frame(rows)
+                if self.engine:
+                    self._write(table, new)
+                self._frames[table] = pd.concat([frame, new], ignore_index=True).drop_duplicates(
+                    'id', keep='last', ignore_index=True) if len(frame) else new
+                appended += len(new)
+            self._refreshed_at = time.monotonic()
+        return appended
+
+    def frame(self, table):
+        """The table's snapshot, refreshed first if it has gone stale"""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        stale = (self._refreshed_at is None or
+                 time.monotonic() - self._refreshed_at >= self.refresh_seconds)
+        if stale:
+            self.refresh()
+        return self._frames[table]
+
+    def _products(self):
+        rows = self.db.execute_query("SELECT id, name, category FROM products")
+        products = pd.DataFrame.from_records(rows, columns=['product_id', 'name', 'category'])
+        products['category'] = products['category'].fillna('').replace('', 'Uncategorized')
+        return products.set_index('product_id')
+
+    def _unit_costs(self):
+        """Weighted average purchase price per product, from the snapshot"""
+        purchases = self.frame('purchase_lines')
+        totals = purchases.groupby('product_id')[['subtotal', 'quantity']].sum()
+        return (totals['subtotal'] / totals['quantity'].where(totals['quantity'] != 0)).rename(
+            'unit_cost')
+
+    def _sales_with_margin(self, start_date=None, end_date=None):
+        sales = _in_range(self.frame('sale_lines'), start_date, end_date)
+        unit_cost = self._unit_costs().reindex(sales['product_id']).to_numpy()
+        # Products never purchased have no known cost, and so no margin
+        return sales.assign(margin=sales['subtotal'].to_numpy() -
+                            sales['quantity'].to_numpy() * unit_cost)
+
+    def top_products(self, start_date=None, end_date=None, limit=10, by='revenue'):
+        """Best-selling products by taxable revenue, quantity or margin"""
+        if by not in TOP_BY:
+            raise ValueError(f"Cannot rank products by {by!r}")
+        sales = self._sales_with_margin(start_date, end_date)
+        # min_count keeps a product with no known cost at NaN rather than 0
+        grouped = sales.groupby('product_id')[['quantity', 'subtotal', 'margin']].sum(
+            min_count=1).rename(columns={'subtotal': 'revenue'})
+        top = grouped.nlargest(int(limit), by)
+        names = self._products()['name'].reindex(top.index)
+        return [{'product_id': int(product_id), 'name': names.get(product_id),
+                 'quantity': float(row.quantity), 'revenue': round(float(row.revenue), 2),
+                 'margin': None if pd.isna(row.margin) else round(float(row.margin), 2)}
+                for product_id, row in top.iterrows()]
+
+    def time_series(self, start_date=None, end_date=None, frequency='day'):
+        """Taxable sales, purchases and their difference per day, week or month"""
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Unknown frequency: {frequency}")
+        freq = FREQUENCIES[frequency]
+        totals = {}
+        for label, table in (('sales', 'sale_lines'), ('purchases', 'purchase_lines')):
+            frame = _in_range(self.frame(table), start_date, end_date)
+            buckets = frame['date'].dt.to_period(freq).dt.start_time
+            totals[label] = frame['subtotal'].groupby(buckets).sum()
+        series = pd.DataFrame(totals).fillna(0.0).sort_index()
+        series['profit'] = series['sales'] - series['purchases']
+        return [{'period': period.strftime('%Y-%m-%d'),
+                 'sales': round(float(row.sales), 2),
+                 'purchases': round(float(row.purchases), 2),
+                 'profit': round(float(row.profit), 2)}
+                for period, row in series.iterrows()]
+
+    def categories(self, start_date=None, end_date=None):
+        """Quantity, taxable revenue, GST and margin per product category"""
+        sales = self._sales_with_margin(start_date, end_date)
+        category = self._products()['category'].reindex(sales['product_id']).fillna(
+            'Uncategorized').to_numpy()
+        grouped = sales.assign(category=category, lines=1).groupby('category')[
+            ['lines', 'quantity', 'subtotal', 'gst_amount', 'margin']].sum(min_count=1).rename(
+            columns={'subtotal': 'revenue', 'gst_amount': 'gst'})
+        grouped = grouped.sort_values('revenue', ascending=False)
+        return [{'category': name, 'lines': int(row.lines), 'quantity': float(row.quantity),
+                 'revenue': round(float(row.revenue), 2), 'gst': round(float(row.gst), 2),
+                 'margin': None if pd.isna(row.margin) else round(float(row.margin), 2),
+                 'margin_pct': (None if pd.isna(row.margin) or not row.revenue
+                                else round(float(row.margin / row.revenue * 100), 1))}
+                for name, row in grouped.iterrows()]
@@ -1,49 +1,66 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 
-class Customer:
-    def __init__(self, name, mobile, email=None, gst_no=None):
-        self.id = None  # Will be set when added to storage
-        self.name = name
-        self.mobile = mobile
-        self.email = email
-        self.gst_no = gst_no
-        self.created_at = datetime.now()
-        self.total_purchases = 0
-        self.last_purchase_date = None
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'mobile': self.mobile,
-            'email': self.email,
-            'gst_no': self.gst_no,
-            'created_at': self.created_at,
-            'total_purchases': self.total_purchases,
-            'last_purchase_date': self.last_purchase_date
-        }
-
-class Bill:
-    def __init__(self, customer, items, bill_no):
-        self.bill_no = bill_no
-        self.customer = customer
-        self.items = items
-        self.date = datetime.now()
-        self.subtotal = sum(item['subtotal'] for item in items)
-        self.total_gst = sum(item['gst_amount'] for item in items)
-        self.total = self.subtotal + self.total_gst
-        self.payment_method = None
-        self.status = 'pending'
-
-    def to_dict(self):
-        return {
-            'bill_no': self.bill_no,
-            'customer': self.customer.to_dict() if self.customer else None,
-            'items': self.items,
-            'date': self.date,
-            'subtotal': self.subtotal,
-            'total_gst': self.total_gst,
-            'total': self.total,
-            'payment_method': self.payment_method,
-            'status': self.status
-        }
+from models.records import Record, as_datetime
+from utils.money import to_paise, to_rupees
+
+
+@dataclass(slots=True)
+class Customer(Record):
+    name: str
+    mobile: str
+    email: str = None
+    gst_no: str = None
+    id: int = None  # Will be set when added to storage
+    created_at: datetime = field(default_factory=datetime.now)
+    total_purchases: float = 0
+    last_purchase_date: datetime = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['name'], row['mobile'], row['email'], row['gst_no'],
+                   id=row['id'],
+                   created_at=as_datetime(row['created_at']),
+                   total_purchases=row['total_purchases'],
+                   last_purchase_date=as_datetime(row['last_purchase_date']))
+
+
+@dataclass(slots=True)
+class Bill(Record):
+    customer: Customer = None
+    items: list = field(default_factory=list)
+    bill_no: str = None
+    date: datetime = field(default_factory=datetime.now)
+    customer_id: int = None
+    subtotal: float = None
+    gst_amount: float = None
+    cess: float = None
+    total: float = None
+    id: int = None
+    payment_method: str = None
+    status: str = 'pending'
+
+    def __post_init__(self):
+        # Bill(customer, items, bill_no) works out its own totals, in paise
+        if self.customer_id is None and self.customer is not None:
+            self.customer_id = self.customer.id
+        if None not in (self.subtotal, self.gst_amount, self.cess, self.total):
+            return
+        heads = {head: sum(to_paise(item.get(head)) for item in self.items)
+                 for head in ('subtotal', 'gst_amount', 'cess')}
+        for head, paise in heads.items():
+            if getattr(self, head) is None:
+                setattr(self, head, to_rupees(paise))
+        if self.total is None:
+            self.total = to_rupees(sum(heads.values()))
+
+    @classmethod
+    def from_row(cls, row, items=()):
+        return cls(id=row['id'], bill_no=row['bill_no'], date=as_datetime(row['date']),
+                   customer_id=row['customer_id'], subtotal=row['subtotal'],
+                   gst_amount=row['gst_amount'], cess=row['cess'], total=row['total'],
+                   items=list(items))
+
+    @property
+    def total_gst(self):
+        return self.gst_amount
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+
+from utils.money import to_paise, to_rupees
+
+
+class DashboardAggregates:
+    """Running dashboard totals, updated on every committed write.
+
+    Totals are adjusted by deltas and the most recent transactions live in
+    fixed-size ring buffers, so reading the dashboard never touches the
+    ledger. rebuild() recomputes everything from the database and is the
+    consistency check for drift (e.g. rows written by another process).
+
+    The totals are kept in integer paise, so a long run of deltas adds up
+    exactly; callers pass and get back rupees.
+    """
+
+    def __init__(self, recent_size=5):
+        self.recent_size = recent_size
+        self._lock = threading.Lock()
+        self.total_sales = 0
+        self.total_purchases = 0
+        self.total_inventory = 0
+        self.recent_sales = deque(maxlen=recent_size)
+        self.recent_purchases = deque(maxlen=recent_size)
+
+    def record_sale(self, sale, cost_price):
+        with self._lock:
+            self.total_sales += to_paise(sale['total'])
+            self.total_inventory -= to_paise(sale['quantity'] * cost_price)
+            self.recent_sales.appendleft(sale)
+
+    def record_purchase(self, purchase, cost_price):
+        with self._lock:
+            self.total_purchases += to_paise(purchase['total'])
+            self.total_inventory += to_paise(purchase['quantity'] * cost_price)
+            self.recent_purchases.appendleft(purchase)
+
+    def adjust_inventory(self, delta):
+        with self._lock:
+            self.total_inventory += to_paise(delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'total_sales': to_rupees(self.total_sales),
+                'total_purchases': to_rupees(self.total_purchases),
+                'total_inventory': to_rupees(self.total_inventory),
+                'profit': to_rupees(self.total_sales - self.total_purchases),
+                'recent_sales': list(self.recent_sales),
+                'recent_purchases': list(self.recent_purchases)
+            }
+
+    def rebuild(self, totals, recent_sales, recent_purchases):
+        """Replace the running state with freshly computed values.
+
+        Returns the fields whose running value had drifted, mapped to
+        (running, rebuilt) pairs.
+        """
+        totals = {key: to_paise(value) for key, value in totals.items()}
+        with self._lock:
+            drift = {
+                key: (to_rupees(getattr(self, key)), to_rupees(value))
+                for key, value in totals.items()
+                if getattr(self, key) != value
+            }
+            self.total_sales = totals['total_sales']
+            self.total_purchases = totals['total_purchases']
+            self.total_inventory = totals['total_inventory']
+            self.recent_sales = deque(recent_sales, maxlen=self.recent_size)
+            self.recent_purchases = deque(recent_purchases,
+                                          maxlen=self.recent_size)
+        return drift
@@ -0,0 +1,309 @@
+import calendar
+import re
+from datetime import datetime
+
+from utils.customer_index import state_code
+from utils.money import to_rupees
+
+_PERIOD = re.compile(r'^(\d{4})-(\d{2})$')
+
+# Tax heads summed per group. SQL sums them in paise, so every figure in a
+# return is an exact sum of its lines.
+_COLUMNS = ('subtotal', 'cgst', 'sgst', 'igst', 'cess')
+_HEADS = ('txval', 'cgst', 'sgst', 'igst', 'cess')
+_PAISE_SUMS = ', '.join(f"SUM(CAST(ROUND(l.{column} * 100) AS INTEGER))"
+                        for column in _COLUMNS)
+_HSN = "COALESCE(NULLIF(l.hsn_code, ''), 'NA')"
+
+
+def period_bounds(period):
+    """'YYYY-MM' -> inclusive ('YYYY-MM-01', 'YYYY-MM-DD~') date bounds"""
+    match = _PERIOD.match(str(period or ''))
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Return period must be YYYY-MM, got {period!r}")
+    year, month = int(match.group(1)), int(match.group(2))
+    last_day = calendar.monthrange(year, month)[1]
+    # '~' sorts after every time-of-day suffix, so the last day is inclusive
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last_day:02d}~"
+
+
+def filing_period(period):
+    """'YYYY-MM' -> GSTN's 'MMYYYY'"""
+    period_bounds(period)
+    return period[5:7] + period[:4]
+
+
+def _bounds(start_date, end_date):
+    return str(start_date)[:10], str(end_date)[:10] + '~'
+
+
+def _rate(rate):
+    # GSTN takes the rate as a number; whole rates go out without a .0
+    return int(rate) if float(rate) == int(rate) else float(rate)
+
+
+class _Group:
+    """Lines of one HSN, rate and supply type, amounts in paise"""
+
+    __slots__ = ('hsn_code', 'gst_rate', 'b2b', 'interstate', 'description', 'lines',
+                 'quantity', 'paise')
+
+    def __init__(self, hsn_code, gst_rate, b2b, interstate, description=None):
+        self.hsn_code = hsn_code
+        self.gst_rate = gst_rate
+        self.b2b = b2b
+        self.interstate = interstate
+        self.description = description
+        self.lines = 0
+        self.quantity = 0
+        self.paise = [0] * len(_HEADS)
+
+    def add(self, lines, quantity, paise, sign=1):
+        self.lines += sign * lines
+        self.quantity += sign * (quantity or 0)
+        self.paise = [total + sign * (value or 0) for total, value in zip(self.paise, paise)]
+
+    def amounts(self):
+        """Paise per head, with only the heads charged on this supply type"""
+        txval, cgst, sgst, igst, cess = self.paise
+        if self.interstate:
+            cgst = sgst = 0
+        else:
+            igst = 0
+        return {'txval': txval, 'cgst': cgst, 'sgst': sgst, 'igst': igst, 'cess': cess,
+                'total': txval + cgst + sgst + igst + cess}
+
+
+def _rupees(paise):
+    return {head: to_rupees(value) for head, value in paise.items()}
+
+
+class GstReturns:
+    """Monthly GSTR-1 and GSTR-3B figures from grouped queries over sale lines.
+
+    A period takes two grouped queries. The first sums the period's days
+    in gst_daily, the per-day HSN and rate rollup that triggers keep in
+    step with sale_lines. The second reads only the lines billed to
+    customers with a GSTIN, through the customer index, grouped by
+    invoice, HSN and rate. B2C is the first minus the second. The
+    rate-wise, HSN-wise and B2B/B2C views are all folded from those
+    groups in Python.
+
+    A supply is interstate when the customer's GSTIN is from a different
+    state than ours. Interstate lines are reported with their IGST instead
+    of CGST + SGST. B2C supplies are taken to be made in our own state.
+    """
+
+    def __init__(self, db, gstin=None):
+        self.db = db
+        self.gstin = (gstin or '').strip().upper() or None
+        self.home_state = state_code(self.gstin)
+
+    def _interstate(self, gstin):
+        return bool(self.home_state and state_code(gstin) != self.home_state)
+
+    def _b2b_rows(self, start, end):
+        return self.db.execute_query(
+            f"""
+            SELECT c.gst_key, b.id, b.bill_no, b.date, b.total, {_HSN}, l.gst_rate,
+                   COUNT(*), SUM(l.quantity), {_PAISE_SUMS}
+            FROM customers c
+            JOIN sale_lines l ON l.customer_id = c.id
+            JOIN bills b ON b.id = l.bill_id
+            WHERE c.gst_key IS NOT NULL AND l.date >= ? AND l.date <= ?
+            GROUP BY b.id, {_HSN}, l.gst_rate
+            ORDER BY c.gst_key, b.date, b.id, l.gst_rate
+            """, (start, end))
+
+    def _groups(self, start, end, b2b_rows):
+        # gst_daily holds the lines already summed per day, HSN and rate
+        rows = self.db.execute_query(
+            """
+            SELECT hsn_code, gst_rate, SUM(lines), SUM(quantity), MIN(description),
+                   SUM(subtotal), SUM(cgst), SUM(sgst), SUM(igst), SUM(cess)
+            FROM gst_daily
+            WHERE day >= ? AND day <= ? AND lines != 0
+            GROUP BY hsn_code, gst_rate
+            """, (start, end))
+        groups = {}
+        for row in rows:
+            b2c = _Group(row[0], row[1], False, False, row[4])
+            b2c.add(row[2], row[3], row[5:])
+            groups[(row[0], row[1], False, False)] = b2c
+        for row in b2b_rows:
+            hsn_code, gst_rate = row[5], row[6]
+            interstate = self._interstate(row[0])
+            key = (hsn_code, gst_rate, True, interstate)
+            if key not in groups:
+                groups[key] = _Group(hsn_code, gst_rate, True, interstate,
+                                     groups[(hsn_code, gst_rate, False, False)].description)
+            groups[key].add(row[7], row[8], row[9:])
+            # What is left in the all-lines group is B2C
+            groups[(hsn_code, gst_rate, False, False)].add(row[7], row[8], row[9:], -1)
+        return [group for group in groups.values() if group.lines]
+
+    def _read(self, start, end):
+        """(B2B rows, groups) for a period, both read from one snapshot"""
+        # A deferred transaction is a read snapshot under WAL and does not
+        # hold up the tills
+        with self.db.transaction(immediate=False):
+            b2b_rows = self._b2b_rows(start, end)
+            return b2b_rows, self._groups(start, end, b2b_rows)
+
+    @staticmethod
+    def _summarize(groups, start, end):
+        def bucket(**fields):
+            return {**fields, 'lines': 0, 'paise': dict.fromkeys(_HEADS + ('total', ), 0)}
+
+        totals, b2b, b2c = bucket(), bucket(), bucket()
+        by_rate = {}
+        by_hsn = {}
+        for group in groups:
+            rate = by_rate.setdefault(group.gst_rate, bucket(gst_rate=group.gst_rate))
+            hsn = by_hsn.setdefault((group.hsn_code, group.gst_rate), bucket(
+                hsn_code=group.hsn_code, gst_rate=group.gst_rate,
+                description=group.description, quantity=0))
+            hsn['quantity'] += group.quantity
+            amounts = group.amounts()
+            for target in (totals, rate, hsn, b2b if group.b2b else b2c):
+                target['lines'] += group.lines
+                for head, value in amounts.items():
+                    target['paise'][head] += value
+
+        def rupees(target):
+            return {**{key: value for key, value in target.items() if key != 'paise'},
+                    **_rupees(target['paise'])}
+
+        return {
+            'start_date': start[:10],
+            'end_date': end[:10],
+            'totals': rupees(totals),
+            'by_rate': [rupees(by_rate[rate]) for rate in sorted(by_rate)],
+            'by_hsn': [rupees(by_hsn[key]) for key in sorted(by_hsn)],
+            'b2b': rupees(b2b),
+            'b2c': rupees(b2c)
+        }
+
+    def summary(self, start_date, end_date):
+        """Totals, rate-wise, HSN-wise and B2B/B2C figures between two dates.
+
+        Dates are inclusive 'YYYY-MM-DD' strings.
+        """
+        start, end = _bounds(start_date, end_date)
+        _, groups = self._read(start, end)
+        return self._summarize(groups, start, end)
+
+    def _invoices(self, b2b_rows):
+        invoices = {}
+        for row in b2b_rows:
+            invoice = invoices.setdefault(row[1], {
+                'gstin': row[0], 'bill_id': row[1], 'bill_no': row[2], 'date': row[3],
+                'value': row[4], 'interstate': self._interstate(row[0]), 'rates': {}})
+            rate = invoice['rates'].setdefault(row[6], [0] * len(_HEADS))
+            invoice['rates'][row[6]] = [total + (value or 0)
+                                        for total, value in zip(rate, row[9:])]
+        for invoice in invoices.values():
+            rates = {}
+            for gst_rate, paise in sorted(invoice['rates'].items()):
+                group = _Group(None, gst_rate, True, invoice['interstate'])
+                group.paise = paise
+                rates[gst_rate] = _rupees(group.amounts())
+            invoice['rates'] = rates
+        return list(invoices.values())
+
+    def b2b_invoices(self, start_date, end_date):
+        """Invoices raised to customers with a GSTIN, with their tax per rate"""
+        return self._invoices(self._b2b_rows(*_bounds(start_date, end_date)))
+
+    def _itc(self, start, end):
+        """Input tax on purchases, by head.
+
+        Purchase lines carry no supplier, so they are taken as intrastate.
+        """
+        row = self.db.execute_query(
+            f"""
+            SELECT {_PAISE_SUMS} FROM purchase_lines l
+            WHERE l.date >= ? AND l.date <= ?
+            """, (start, end))[0]
+        return {head: to_rupees(value or 0) for head, value in zip(_HEADS, row)}
+
+    def gstr1(self, period):
+        """GSTR-1 for a 'YYYY-MM' period in the GSTN offline-tool JSON layout"""
+        start, end = period_bounds(period)
+        b2b_rows, groups = self._read(start, end)
+
+        b2b = {}
+        for invoice in self._invoices(b2b_rows):
+            customer = b2b.setdefault(invoice['gstin'], {'ctin': invoice['gstin'], 'inv': []})
+            customer['inv'].append({
+                'inum': invoice['bill_no'],
+                'idt': datetime.strptime(invoice['date'][:10], '%Y-%m-%d').strftime('%d-%m-%Y'),
+                'val': round(invoice['value'], 2),
+                'pos': state_code(invoice['gstin']) or self.home_state,
+                'rchrg': 'N',
+                'inv_typ': 'R',
+                'itms': [{'num': number, 'itm_det': {
+                    'rt': _rate(gst_rate), 'txval': amounts['txval'],
+                    'iamt': amounts['igst'], 'camt': amounts['cgst'],
+                    'samt': amounts['sgst'], 'csamt': amounts['cess']}}
+                    for number, (gst_rate, amounts)
+                    in enumerate(invoice['rates'].items(), start=1)]
+            })
+
+        b2cs = {}
+        for group in groups:
+            if group.b2b:
+                continue
+            entry = b2cs.setdefault(group.gst_rate, dict.fromkeys(_HEADS, 0))
+            for head, value in group.amounts().items():
+                if head in entry:
+                    entry[head] += value
+
+        hsn = [{'num': number, 'hsn_sc': row['hsn_code'], 'desc': row['description'],
+                'uqc': 'NOS', 'qty': row['quantity'], 'rt': _rate(row['gst_rate']),
+                'txval': row['txval'], 'iamt': row['igst'], 'camt': row['cgst'],
+                'samt': row['sgst'], 'csamt': row['cess']}
+               for number, row in enumerate(self._summarize(groups, start, end)['by_hsn'],
+                                            start=1)]
+
+        return {
+            'gstin': self.gstin,
+            'fp': filing_period(period),
+            'b2b': list(b2b.values()),
+            'b2cs': [{'sply_ty': 'INTRA', 'pos': self.home_state, 'typ': 'OE',
+                      'rt': _rate(gst_rate), 'txval': to_rupees(paise['txval']),
+                      'iamt': 0.0, 'camt': to_rupees(paise['cgst']),
+                      'samt': to_rupees(paise['sgst']), 'csamt': to_rupees(paise['cess'])}
+                     for gst_rate, paise in sorted(b2cs.items())],
+            'hsn': {'data': hsn}
+        }
+
+    def gstr3b(self, period):
+        """GSTR-3B tables 3.1 (outward supplies) and 4 (ITC) for a 'YYYY-MM' period"""
+        start, end = period_bounds(period)
+        taxable = dict.fromkeys(_HEADS, 0)
+        exempt = dict.fromkeys(_HEADS, 0)
+        _, groups = self._read(start, end)
+        for group in groups:
+            supplies = taxable if group.gst_rate else exempt
+            amounts = group.amounts()
+            for head in _HEADS:
+                supplies[head] += amounts[head]
+        taxable, exempt = _rupees(taxable), _rupees(exempt)
+        itc = self._itc(start, end)
+        itc_row = {'iamt': 0.0, 'camt': itc['cgst'], 'samt': itc['sgst'],
+                   'csamt': itc['cess']}
+        return {
+            'gstin': self.gstin,
+            'ret_period': filing_period(period),
+            'sup_details': {
+                'osup_det': {'txval': taxable['txval'], 'iamt': taxable['igst'],
+                             'camt': taxable['cgst'], 'samt': taxable['sgst'],
+                             'csamt': taxable['cess']},
+                'osup_nil_exmp': {'txval': exempt['txval']}
+            },
+            'itc_elg': {
+                'itc_avl': [{'ty': 'OTH', **itc_row}],
+                'itc_net': itc_row
+            }
+        }
@@ -0,0 +1,91 @@
+import sys
+from dataclasses import dataclass, fields
+from datetime import datetime
+from functools import lru_cache
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def intern_text(value):
+    """Product names and HSN codes repeat on every line; keep one copy of each"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=1024)
+def parse_date(value):
+    # Lines of one bill share a timestamp, and with it one datetime object
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def as_datetime(value):
+    return parse_date(value) if isinstance(value, str) else value
+
+
+class Record:
+    """Read access by key for slotted records.
+
+    Lines and customers used to be dicts, so record['total'],
+    record.get('bill_id') and dict(record) keep working alongside
+    attribute access. Flask serializes the dataclasses to JSON as is.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def field_names(cls):
+        return tuple(field.name for field in fields(cls))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.field_names()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.field_names()}
+
+
+@dataclass(slots=True, kw_only=True)
+class _Line(Record):
+    date: datetime
+    product_id: int
+    product_name: str
+    hsn_code: str = None
+    quantity: int
+    price: float
+    subtotal: float
+    cgst: float = 0.0
+    sgst: float = 0.0
+    igst: float = 0.0
+    cess: float = 0.0
+    gst_rate: int = 0
+    gst_amount: float = 0.0
+    total: float
+    id: int = None
+
+    def __post_init__(self):
+        self.date = as_datetime(self.date)
+        self.product_name = intern_text(self.product_name)
+        self.hsn_code = intern_text(self.hsn_code)
+
+    @classmethod
+    def from_row(cls, row):
+        names = row.keys()
+        return cls(**{name: row[name] for name in cls.field_names() if name in names})
+
+
+@dataclass(slots=True, kw_only=True)
+class SaleLine(_Line):
+    bill_id: int = None
+    customer_id: int = None
+
+
+@dataclass(slots=True, kw_only=True)
+class PurchaseLine(_Line):
+    pass
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+from utils.money import to_rupees
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+# Range shown when the caller gives no start date, counted back from the end
+DEFAULT_SPAN = {'hour': timedelta(days=2), 'day': timedelta(days=30),
+                'week': timedelta(weeks=26), 'month': timedelta(days=365)}
+# Enough for 5000 hours or 13 years of days; coarser grains cover more
+MAX_BUCKETS = 5000
+_FORMATS = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d', 'week': '%Y-%m-%d',
+            'month': '%Y-%m-01'}
+# Monday of the day's week; weeks are summed from the day rollup
+_WEEK = "date(bucket, '-6 days', 'weekday 1')"
+
+
+def parse_moment(value):
+    """'YYYY-MM-DD' or an ISO date-time -> datetime, None if empty"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Not a date: {value!r}") from None
+
+
+def bucket_start(moment, granularity):
+    """Start of the hour, day, week (Monday) or month holding moment"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+class SalesTrends:
+    """Sales, purchases and profit series for the dashboard charts.
+
+    Reads the sales_rollups table the ledger triggers keep, one row per
+    bucket, so a series costs the same however many lines each bucket
+    holds. Every bucket in the range is returned, empty ones as zeros.
+    Profit is sales less purchases, as on the dashboard totals.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _bounds(self, granularity, start_date, end_date):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+        end = parse_moment(end_date) or datetime.now()
+        if end_date and len(str(end_date).strip()) == 10:
+            # A bare end date means the whole of that day
+            end = end.replace(hour=23, minute=59, second=59)
+        start = parse_moment(start_date) or end - DEFAULT_SPAN[granularity]
+        if start > end:
+            raise ValueError("Start date is after the end date")
+        first, last = bucket_start(start, granularity), bucket_start(end, granularity)
+        if (last - first) / (next_bucket(first, granularity) - first) >= MAX_BUCKETS:
+            raise ValueError(f"Range has more than {MAX_BUCKETS} {granularity} buckets; "
+                             "use a coarser granularity")
+        return first, last
+
+    def _rows(self, granularity, first, last):
+        if granularity == 'week':
+            # The day rollup from the Monday of the first week to the end of the last
+            query = f"""
+                SELECT {_WEEK}, SUM(sale_lines), SUM(sales), SUM(purchase_lines), SUM(purchases)
+                FROM sales_rollups
+                WHERE grain = 'day' AND bucket >= ? AND bucket <= ?
+                GROUP BY 1
+            """
+            bounds = (first.strftime('%Y-%m-%d'),
+                      (last + timedelta(days=6)).strftime('%Y-%m-%d'))
+        else:
+            query = """
+                SELECT bucket, sale_lines, sales, purchase_lines, purchases
+                FROM sales_rollups
+                WHERE grain = ? AND bucket >= ? AND bucket <= ?
+            """
+            fmt = _FORMATS[granularity]
+            bounds = (granularity, first.strftime(fmt), last.strftime(fmt))
+        return {row[0]: row[1:] for row in self.db.execute_query(query, bounds)}
+
+    def series(self, granularity='day', start_date=None, end_date=None):
+        first, last = self._bounds(granularity, start_date, end_date)
+        rows = self._rows(granularity, first, last)
+        buckets = []
+        totals = [0, 0, 0, 0]
+        moment = first
+        while moment <= last:
+            key = moment.strftime(_FORMATS[granularity])
+            sale_lines, sales, purchase_lines, purchases = rows.get(key, (0, 0, 0, 0))
+            buckets.append({
+                'period': key,
+                'sales': to_rupees(sales),
+                'purchases': to_rupees(purchases),
+                'profit': to_rupees(sales - purchases),
+                'sale_lines': sale_lines,
+                'purchase_lines': purchase_lines
+            })
+            for index, value in enumerate((sale_lines, sales, purchase_lines, purchases)):
+                totals[index] += value
+            moment = next_bucket(moment, granularity)
+        sale_lines, sales, purchase_lines, purchases = totals
+        return {
+            'granularity': granularity,
+            'start': first.strftime(_FORMATS[granularity]),
+            'end': last.strftime(_FORMATS[granularity]),
+            'buckets': buckets,
+            'totals': {'sales': to_rupees(sales), 'purchases': to_rupees(purchases),
+                       'profit': to_rupees(sales - purchases), 'sale_lines': sale_lines,
+                       'purchase_lines': purchase_lines}
+        }
@@ -102,3 +102,61 @@ function initializeDashboard(stats) {
     // Initialize Feather icons
     feather.replace();
 }
+
+// Sales, purchases and profit per bucket, read from the server-side rollups
+function initializeTrendChart(seriesUrl) {
+    const ctx = document.getElementById('trendChart').getContext('2d');
+    const chart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: [],
+            datasets: [
+                {label: 'Sales', data: [], borderColor: '#0d6efd', tension: 0.1, fill: false},
+                {label: 'Purchases', data: [], borderColor: '#dc3545', tension: 0.1, fill: false},
+                {label: 'Profit', data: [], borderColor: '#198754', tension: 0.1, fill: false}
+            ]
+        },
+        options: {
+            responsive: true,
+            scales: {
+                y: {
+                    title: {
+                        display: true,
+                        text: 'Amount'
+                    }
+                }
+            },
+            plugins: {
+                legend: {
+                    position: 'top'
+                }
+            }
+        }
+    });
+
+    const controls = ['trendGranularity', 'trendStart', 'trendEnd'].map(id => document.getElementById(id));
+
+    function load() {
+        const [granularity, start, end] = controls.map(control => control.value);
+        const params = new URLSearchParams({granularity: granularity});
+        if (start) params.append('start', start);
+        if (end) params.append('end', end);
+        fetch(`${seriesUrl}?${params.toString()}`)
+            .then(response => response.json())
+            .then(series => {
+                if (!series.buckets) {
+                    console.error(series.message);
+                    return;
+                }
+                chart.data.labels = series.buckets.map(bucket =>
+                    granularity === 'hour' ? bucket.period.slice(5, 16) : bucket.period);
+                chart.data.datasets[0].data = series.buckets.map(bucket => bucket.sales);
+                chart.data.datasets[1].data = series.buckets.map(bucket => bucket.purchases);
+                chart.data.datasets[2].data = series.buckets.map(bucket => bucket.profit);
+                chart.update();
+            });
+    }
+
+    controls.forEach(control => control.addEventListener('change', load));
+    load();
+}
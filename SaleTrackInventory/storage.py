@@ -1,14 +1,159 @@
 from datetime import datetime
-import csv
-from io import StringIO
-import pandas as pd
-from flask import send_file
-import pdfkit
-import qrcode
-import json
+import atexit
 import base64
-from io import BytesIO
-#from .models.accounting import AccountingSystem
+import json
+from flask import Response
+import os
+import re
+import sqlite3
+from models.accounting import AccountingSystem
+from models.analytics import SalesAnalytics
+from models.customers import Bill, Customer
+from models.dashboard import DashboardAggregates
+from models.gst_returns import GstReturns
+from models.records import PurchaseLine, SaleLine
+from models.sales_trends import SalesTrends
+from utils.batch_invoices import render_in_parallel
+from utils.bill_cache import BillCache, content_key
+from utils.bill_sender import BillSender
+from utils.customer_index import (CustomerIndex, looks_like_gstin,
+                                  normalize_gstin, normalize_mobile,
+                                  normalize_name, prefix_bounds)
+from utils.delivery_queue import DeliveryQueue
+from utils.invoice_numbers import InvoiceNumberAllocator, invoice_filename
+from utils.invoice_renderer import (DEFAULT_COMPANY_INFO, InvoiceRenderer,
+                                    interstate_supply)
+from utils.money import (calculate_tax, calculate_tax_batch, money_sum, tax_rows,
+                         to_paise, to_rupees)
+from utils.product_cache import HotProductCache, normalize_barcode
+from utils.pdf_renderer import get_backend, render_invoice_pdf
+from utils.qr_codes import cached_qr_png, qr_base64
+from utils.render_queue import RenderJob, RenderQueue
+from utils.render_worker import init_worker, render_invoice
+from utils.report_export import CSV_MIMETYPE, XLSX_MIMETYPE, stream_csv, stream_xlsx
+from utils.product_import import (PRODUCT_FIELDS, TEMPLATE_MAPPINGS,
+                                  ImportAborted, ImportReport, clean_code,
+                                  product_rows, validate_products)
+from utils.sheet_reader import DEFAULT_CHUNK_SIZE, iter_sheet_chunks
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SALE_LINE_COLUMNS = ('bill_id', 'date', 'product_id', 'product_name',
+                     'hsn_code', 'customer_id', 'quantity', 'price',
+                     'subtotal', 'cgst', 'sgst', 'igst', 'cess', 'gst_rate',
+                     'gst_amount', 'total')
+
+INVOICE_ITEM_FIELDS = ('product_name', 'hsn_code', 'quantity', 'price',
+                       'subtotal', 'gst_rate', 'gst_amount', 'cess', 'total')
+
+PURCHASE_LINE_COLUMNS = ('date', 'product_id', 'product_name', 'hsn_code',
+                         'quantity', 'price', 'subtotal', 'cgst', 'sgst',
+                         'igst', 'cess', 'gst_rate', 'gst_amount', 'total')
+
+PRODUCT_COLUMNS = ('id', 'name', 'price', 'quantity', 'mrp', 'barcode', 'unit',
+                   'category', 'hsn_code', 'gst_rate', 'cess_rate')
+
+LOW_STOCK_THRESHOLD = 10
+
+# Columns indexed in products_fts and the weight of a match in each
+SEARCH_COLUMNS = ('name', 'category', 'barcode', 'hsn_code')
+SEARCH_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+
+# Only the first SEARCH_CANDIDATES matches are ranked, so a broad prefix
+# like 'ma' costs the same as a narrow one
+SEARCH_CANDIDATES = 200
+
+_SEARCH_TOKEN = re.compile(r'\w+')
+
+CUSTOMER_FIELDS = ('id', 'name', 'mobile', 'email', 'gst_no', 'created_at',
+                   'total_purchases', 'last_purchase_date')
+
+
+def _date_bounds(start_date=None, end_date=None):
+    """Turn inclusive 'YYYY-MM-DD' filters into an indexable WHERE clause"""
+    clauses = []
+    params = []
+    if start_date:
+        clauses.append("date >= %s")
+        params.append(str(start_date)[:10])
+    if end_date:
+        # '~' sorts after every time-of-day suffix, so the end day is inclusive
+        clauses.append("date <= %s")
+        params.append(str(end_date)[:10] + '~')
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _search_score(row, tokens, phrase):
+    """Weight of the best column each token prefixes a word of, see search_products"""
+    words = [_SEARCH_TOKEN.findall(str(row[column]).casefold()) if row[column] else ()
+             for column in SEARCH_COLUMNS]
+    score = 0.0
+    for token in tokens:
+        score += max((weight for column_words, weight in zip(words, SEARCH_WEIGHTS)
+                      if any(word.startswith(token) for word in column_words)),
+                     default=0.0)
+    if row['name'].casefold().startswith(phrase):
+        score += SEARCH_WEIGHTS[0]
+    return score
+
+
+def _report_filename(report_type, start_date, end_date, extension):
+    period = '_'.join(str(date)[:10] for date in (start_date, end_date) if date)
+    return f"{report_type}_report{'_' + period if period else ''}.{extension}"
+
+
+def _with_totals(rows, width, money_columns):
+    """Pass the rows through, then a Total row of the money columns summed in paise"""
+    totals = dict.fromkeys(money_columns, 0)
+    for row in rows:
+        for column in money_columns:
+            totals[column] += to_paise(row[column])
+        yield row
+    yield tuple('Total' if column == 0 else
+                to_rupees(totals[column]) if column in totals else None
+                for column in range(width))
+
+
+def _download(chunks, mimetype, filename):
+    """Attachment response whose body is produced as the client reads it"""
+    response = Response(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def _customer_key(column, customer):
+    if column == 'mobile_key':
+        return normalize_mobile(customer['mobile'])
+    return normalize_gstin(customer['gst_no'])
+
+
+def _raise_customer_conflict(error):
+    """A duplicate mobile or GSTIN becomes a ValueError; other failures propagate"""
+    if 'UNIQUE' in str(error):
+        raise ValueError("A customer with this mobile number or GSTIN already exists") from None
+    raise error
+
+
+class InsufficientStock(ValueError):
+    """A basket line asked for more than is on hand"""
+
+    def __init__(self, product, requested, available):
+        super().__init__(f"Insufficient stock for {product['name']}: "
+                         f"{requested} requested, {available} available")
+        self.product_id = product['id']
+        self.requested = requested
+        self.available = available
 
 
 class Storage:
@@ -18,29 +163,89 @@ class Storage:
         self.db = Database()
         self.users = {}
         self.products = {}
-        self.customers = {}
-        self.sales = []
-        self.purchases = []
         self.next_product_id = 1
-        self.next_customer_id = 1
-        self.next_bill_no = 1000
-
-        # Create products table if it doesn't exist
-        self.db.execute_query("""
-            CREATE TABLE IF NOT EXISTS products (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                quantity INTEGER NOT NULL,
-                mrp DECIMAL(10,2) NOT NULL,
-                barcode VARCHAR(255),
-                unit VARCHAR(50),
-                category VARCHAR(100),
-                hsn_code VARCHAR(50),
-                gst_rate INTEGER DEFAULT 0,
-                cess_rate INTEGER DEFAULT 0
-            )
-        """)
+
+        # Invoice numbers are issued from invoice_sequences inside the
+        # checkout transaction, per series and financial year
+        self.invoice_numbers = InvoiceNumberAllocator(
+            self.db,
+            block_size=int(os.environ.get('INVOICE_BLOCK_SIZE', 1)),
+            default_series=os.environ.get('INVOICE_SERIES', 'INV'))
+        if self.invoice_numbers.block_size > 1:
+            atexit.register(self.invoice_numbers.release)
+
+        # Normalized mobile / GSTIN -> customer id for the POS lookups
+        self.customer_index = CustomerIndex()
+        self.customer_index.load(
+            self.db.execute_query("SELECT id, mobile_key, gst_key FROM customers"))
+
+        # Recently scanned products, for the barcode fast path
+        self.hot_products = HotProductCache(
+            maxsize=int(os.environ.get('HOT_PRODUCT_CACHE_SIZE', 2048)))
+
+        self.dashboard = DashboardAggregates()
+        self.rebuild_dashboard_stats()
+        # Chart series read the per-hour/day/month rollups the ledger triggers keep
+        self.sales_trends = SalesTrends(self.db)
+
+        # Sales and purchases post to the double-entry journal as they commit
+        self.accounting = AccountingSystem(self.db)
+        if self.accounting.is_empty():
+            self.backfill_journal()
+
+        # Monthly GSTR-1 / GSTR-3B figures, grouped straight from sale_lines
+        self.gst_returns = GstReturns(self.db, os.environ.get('COMPANY_GSTIN'))
+
+        # Columnar copy of the sale and purchase lines for the analytics
+        # reports, topped up with the lines added since its last refresh
+        self.analytics = SalesAnalytics(
+            self.db,
+            os.environ.get('ANALYTICS_DIR', 'cache/analytics'),
+            refresh_seconds=float(os.environ.get('ANALYTICS_REFRESH_SECONDS', 60)))
+
+        # Rendered PDFs and QR codes, keyed by a hash of their content
+        self.bill_cache = BillCache(
+            os.environ.get('BILL_CACHE_DIR', 'cache/bills'),
+            max_bytes=int(os.environ.get('BILL_CACHE_MAX_MB', 256)) * 1024 * 1024)
+
+        # Invoices carry the GSTIN the returns are filed under, which also
+        # decides whether a bill is interstate
+        company = dict(DEFAULT_COMPANY_INFO)
+        if self.gst_returns.gstin:
+            company['gst'] = self.gst_returns.gstin
+        self.invoice_renderer = InvoiceRenderer(company)
+
+        # Bill PDFs render in worker processes, off the checkout request
+        # A mistyped INVOICE_PDF_BACKEND fails here, not in a render worker
+        self.pdf_backend = get_backend().name
+        self.render_queue = RenderQueue(
+            render_invoice,
+            workers=int(os.environ.get('PDF_WORKERS', 2)),
+            max_pending=int(os.environ.get('PDF_QUEUE_SIZE', 64)),
+            on_done=lambda job, pdf: self.bill_cache.put('pdf', job.key, pdf),
+            initializer=init_worker,
+            initargs=(self.pdf_backend, ))
+
+        # E-mail and WhatsApp bills go through a persistent outbox so
+        # checkout never waits on an external provider
+        self.bill_sender = BillSender(
+            os.environ.get('SMTP_HOST', 'localhost'),
+            int(os.environ.get('SMTP_PORT', 587)),
+            os.environ.get('SMTP_USER'),
+            os.environ.get('SMTP_PASSWORD'),
+            os.environ.get('WHATSAPP_TOKEN'),
+            use_tls=os.environ.get('SMTP_TLS', '1') != '0')
+        self.deliveries = DeliveryQueue(
+            self.db,
+            self.bill_sender,
+            load_attachment=self.bill_pdf,
+            workers=int(os.environ.get('DELIVERY_WORKERS', 2)),
+            rates={
+                'email': float(os.environ.get('EMAIL_RATE', 5)),
+                'whatsapp': float(os.environ.get('WHATSAPP_RATE', 1))
+            },
+            lease_seconds=float(os.environ.get('DELIVERY_LEASE_SECONDS', 300)))
+        self.deliveries.start()
 
     def validate_product_data(self, data):
         required = ['name', 'price', 'mrp', 'quantity']
@@ -56,6 +261,8 @@ class Storage:
             raise ValueError("Customer name is required")
         if not data.get('mobile'):
             raise ValueError("Mobile number is required")
+        if not normalize_mobile(data['mobile']):
+            raise ValueError("Mobile number must contain digits")
         if 'email' in data and data['email']:
             if '@' not in data['email']:
                 raise ValueError("Invalid email format")
@@ -85,10 +292,15 @@ class Storage:
             (name, price, quantity, mrp, barcode, unit, category, hsn_code, gst_rate, cess_rate)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        self.db.execute_query(query, (
-            name, price, quantity, mrp, barcode, unit, category,
-            hsn_code, gst_rate, cess_rate
-        ))
+        try:
+            self.db.execute_query(query, (
+                name, price, quantity, mrp, normalize_barcode(barcode), unit,
+                category, hsn_code, gst_rate, cess_rate
+            ))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Barcode {barcode} is already assigned to another product")
+        self.db.on_commit(
+            lambda: self.dashboard.adjust_inventory(quantity * price))
 
     def update_product(self,
                        id,
@@ -109,10 +321,18 @@ class Storage:
                     unit = %s, category = %s, hsn_code = %s, gst_rate = %s, cess_rate = %s
                 WHERE id = %s
             """
-            self.db.execute_query(query, (
-                name, price, quantity, mrp, barcode, unit, category,
-                hsn_code, gst_rate, cess_rate, id
-            ))
+            with self.db.transaction():
+                previous = self.get_product(id)
+                self.db.execute_query(query, (
+                    name, price, quantity, mrp, normalize_barcode(barcode),
+                    unit, category, hsn_code, gst_rate, cess_rate, id
+                ))
+                self.db.on_commit(lambda: self.hot_products.invalidate(id))
+                if previous:
+                    delta = (quantity * price -
+                             previous['quantity'] * previous['price'])
+                    self.db.on_commit(
+                        lambda: self.dashboard.adjust_inventory(delta))
             return True
         except Exception as e:
             print(f"Error updating product: {e}")
@@ -138,360 +358,960 @@ class Storage:
             for row in rows
         ]
 
-    def calculate_tax(self, price, quantity, gst_rate, cess_rate=0):
-        subtotal = price * quantity
-        gst_amount = subtotal * (gst_rate / 100)
-        cgst = gst_amount / 2
-        sgst = gst_amount / 2
-        igst = gst_amount  # For interstate sales
-        cess = subtotal * (cess_rate / 100)
+    def query_products(self,
+                       fields=None,
+                       category=None,
+                       name_prefix=None,
+                       low_stock=None,
+                       order='id',
+                       after=None,
+                       limit=50):
+        """One page of products, filtered and projected in SQL.
 
-        return {
-            'subtotal': subtotal,
-            'cgst': cgst,
-            'sgst': sgst,
-            'igst': igst,
-            'cess': cess,
-            'total': subtotal + gst_amount + cess
-        }
+        Pages are keyset-paginated: pass the returned next_cursor as `after`
+        to continue, so page N costs the same as page 1. order is 'id' or
+        'name'; low_stock is a stock threshold (True means the default).
+        Returns {'items': [...], 'next_cursor': str or None}.
+        """
+        if order not in ('id', 'name'):
+            raise ValueError(f"Unknown order: {order}")
+        fields = [field for field in (fields or PRODUCT_COLUMNS) if field in PRODUCT_COLUMNS]
+        if not fields:
+            raise ValueError("No valid product fields requested")
+        # The cursor is built from the sort key, so always select it
+        sort_key = ['name', 'id'] if order == 'name' else ['id']
+        selected = fields + [key for key in sort_key if key not in fields]
+
+        clauses = []
+        params = []
+        if category:
+            clauses.append("category = %s")
+            params.append(category)
+        if name_prefix:
+            low, high = prefix_bounds(name_prefix.strip())
+            clauses.append("name COLLATE NOCASE >= %s AND name COLLATE NOCASE < %s")
+            params.extend((low, high))
+        if low_stock:
+            clauses.append("quantity < %s")
+            params.append(LOW_STOCK_THRESHOLD if low_stock is True else int(low_stock))
+        if after:
+            position = _decode_cursor(after)
+            if order == 'name':
+                # The leading >= gives SQLite a range to seek to in the index
+                clauses.append("name COLLATE NOCASE >= %s AND "
+                               "(name COLLATE NOCASE > %s OR id > %s)")
+                params.extend((position[0], position[0], int(position[1])))
+            else:
+                clauses.append("id > %s")
+                params.append(int(position[0]))
+
+        limit = max(1, min(int(limit), 500))
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        order_by = "name COLLATE NOCASE, id" if order == 'name' else "id"
+        rows = self.db.execute_query(
+            f"SELECT {', '.join(selected)} FROM products{where} "
+            f"ORDER BY {order_by} LIMIT %s", params + [limit + 1])
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor([items[-1][key] for key in sort_key])
+        for item in items:
+            for key in selected:
+                if key not in fields:
+                    del item[key]
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def search_products(self, query, limit=20, fields=None):
+        """Ranked as-you-type search over name, category, barcode and HSN code.
+
+        Every word must match as a prefix ('amul but' finds 'Amul Butter
+        500g'). Single characters are ignored until the next keystroke, as a
+        one-letter prefix matches most of the catalogue. An exact barcode
+        comes first. Without FTS5 this degrades to a name-prefix match.
+
+        FTS5 returns up to SEARCH_CANDIDATES matches, which are ranked here
+        by the column each word matched in (SEARCH_WEIGHTS), a bonus when
+        the name starts with the typed text, and then shorter names. Every
+        candidate contains every word, so bm25's IDF term would not change
+        the order. Computing it would cost a scan of each word's whole
+        posting list, which for a popular brand prefix is tens of
+        milliseconds.
+        """
+        fields = [field for field in (fields or PRODUCT_COLUMNS) if field in PRODUCT_COLUMNS]
+        if 'id' not in fields:
+            fields = ['id'] + fields
+        limit = max(1, min(int(limit), 100))
+        tokens = [token for token in _SEARCH_TOKEN.findall((query or '').casefold())
+                  if len(token) > 1]
+        if not tokens:
+            return []
+        if not self.db.has_fts:
+            return self.query_products(fields=fields, name_prefix=query, order='name',
+                                       limit=limit)['items']
+
+        results = []
+        exact = self.get_product_by_barcode(query.strip()) if len(tokens) == 1 else None
+        if exact:
+            results.append({field: exact[field] for field in fields})
+
+        # Quote each token so FTS5 operators typed by the user stay literal
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        selected = list(dict.fromkeys(fields + list(SEARCH_COLUMNS)))
+        rows = self.db.execute_query(
+            f"""
+            SELECT {', '.join('p.' + field for field in selected)}
+            FROM (
+                SELECT rowid AS id FROM products_fts
+                WHERE products_fts MATCH %s
+                LIMIT {SEARCH_CANDIDATES}
+            ) hits
+            JOIN products p ON p.id = hits.id
+            """, (match, ))
+
+        phrase = ' '.join(query.casefold().split())
+        seen = {result['id'] for result in results}
+        ranked = sorted((row for row in rows if row['id'] not in seen),
+                        key=lambda row: (-_search_score(row, tokens, phrase),
+                                         len(row['name']), row['id']))
+        results.extend({field: row[field] for field in fields}
+                       for row in ranked[:limit])
+        return results[:limit]
+
+    def get_categories(self):
+        rows = self.db.execute_query(
+            "SELECT DISTINCT category FROM products WHERE category IS NOT NULL "
+            "AND category != '' ORDER BY category")
+        return [row[0] for row in rows]
+
+    def get_product(self, product_id):
+        rows = self.db.execute_query("SELECT * FROM products WHERE id = %s",
+                                     (product_id, ))
+        return dict(rows[0]) if rows else None
+
+    def get_product_by_barcode(self, barcode):
+        """Scan lookup: hot-SKU LRU first, then the unique barcode index"""
+        barcode = normalize_barcode(barcode)
+        if barcode is None:
+            return None
+        product = self.hot_products.get(barcode)
+        if product is not None:
+            return product
+        rows = self.db.execute_query(
+            "SELECT * FROM products WHERE barcode = %s AND barcode IS NOT NULL AND barcode != ''",
+            (barcode, ))
+        if not rows:
+            return None
+        product = dict(rows[0])
+        self.hot_products.put(barcode, product)
+        return product
+
+    def calculate_tax(self, price, quantity, gst_rate, cess_rate=0):
+        return calculate_tax(price, quantity, gst_rate, cess_rate)
 
     def add_customer(self, name, mobile, email=None, gst_no=None):
-        customer_id = self.next_customer_id
-        self.customers[customer_id] = {
-            'id': customer_id,
-            'name': name,
-            'mobile': mobile,
-            'email': email,
-            'gst_no': gst_no,
-            'created_at': datetime.now(),
-            'total_purchases': 0,
-            'last_purchase_date': None
-        }
-        self.next_customer_id += 1
+        self.validate_customer_data({'name': name, 'mobile': mobile, 'email': email})
+        mobile_key = normalize_mobile(mobile)
+        gst_key = normalize_gstin(gst_no)
+        self._check_customer_keys(mobile_key, gst_key)
+
+        try:
+            with self.db.transaction():
+                customer_id = self.db.execute_insert(
+                    """
+                    INSERT INTO customers (name, name_key, mobile, mobile_key, email,
+                                           gst_no, gst_key, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (name, normalize_name(name), mobile, mobile_key, email,
+                          gst_no or None, gst_key, datetime.now().strftime(DATE_FORMAT)))
+                self.db.on_commit(lambda: self.customer_index.add(
+                    customer_id, mobile_key, gst_key))
+        except sqlite3.IntegrityError as e:
+            # Another process got there first; the unique index is the arbiter
+            _raise_customer_conflict(e)
         return customer_id
 
+    def update_customer(self, customer_id, **changes):
+        """Update name, mobile, email and/or gst_no, keeping the lookups in sync"""
+        current = self.get_customer(customer_id)
+        if not current:
+            raise ValueError(f"Unknown customer: {customer_id}")
+        fields = {key: changes.get(key, current[key])
+                  for key in ('name', 'mobile', 'email', 'gst_no')}
+        self.validate_customer_data(fields)
+        old_keys = (normalize_mobile(current['mobile']), normalize_gstin(current['gst_no']))
+        new_keys = (normalize_mobile(fields['mobile']), normalize_gstin(fields['gst_no']))
+        self._check_customer_keys(*new_keys, customer_id=current['id'])
+
+        try:
+            with self.db.transaction():
+                self.db.execute_query(
+                    """
+                    UPDATE customers SET name = %s, name_key = %s, mobile = %s,
+                        mobile_key = %s, email = %s, gst_no = %s, gst_key = %s
+                    WHERE id = %s
+                    """, (fields['name'], normalize_name(fields['name']),
+                          fields['mobile'], new_keys[0], fields['email'],
+                          fields['gst_no'] or None, new_keys[1], current['id']))
+                self.db.on_commit(lambda: self.customer_index.replace(
+                    current['id'], old_keys, new_keys))
+        except sqlite3.IntegrityError as e:
+            _raise_customer_conflict(e)
+        return self.get_customer(current['id'])
+
+    def _check_customer_keys(self, mobile_key, gst_key, customer_id=None):
+        owner = self.customer_index.by_mobile(mobile_key)
+        if owner is not None and owner != customer_id:
+            raise ValueError(f"Mobile number already registered to customer {owner}")
+        owner = self.customer_index.by_gst(gst_key) if gst_key else None
+        if owner is not None and owner != customer_id:
+            raise ValueError(f"GSTIN already registered to customer {owner}")
+
     def get_customer(self, customer_id):
-        return self.customers.get(customer_id)
+        if not customer_id:
+            return None
+        rows = self.db.execute_query(
+            f"SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers WHERE id = %s",
+            (customer_id, ))
+        return Customer.from_row(rows[0]) if rows else None
+
+    def _customer_by_key(self, column, key, cached_id):
+        if not key:
+            return None
+        if cached_id is not None:
+            customer = self.get_customer(cached_id)
+            if customer is not None and _customer_key(column, customer) == key:
+                return customer
+            # Changed or removed by another worker since this map learned it
+            self.customer_index.discard(cached_id, **{column: key})
+        # Not in this process's map: another worker may have added it, so
+        # fall back to the unique index and remember the answer
+        rows = self.db.execute_query(
+            f"SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers WHERE {column} = %s",
+            (key, ))
+        if not rows:
+            return None
+        customer = Customer.from_row(rows[0])
+        self.customer_index.add(customer['id'], normalize_mobile(customer['mobile']),
+                                normalize_gstin(customer['gst_no']))
+        return customer
 
     def get_customer_by_mobile(self, mobile):
-        return next((customer for customer in self.customers.values()
-                     if customer['mobile'] == mobile), None)
+        key = normalize_mobile(mobile)
+        return self._customer_by_key('mobile_key', key, self.customer_index.by_mobile(key))
 
     def get_customer_by_gst(self, gst_no):
-        return next((customer for customer in self.customers.values()
-                     if customer['gst_no'] == gst_no), None)
+        key = normalize_gstin(gst_no)
+        return self._customer_by_key('gst_key', key, self.customer_index.by_gst(key))
+
+    def search_customers(self, query, limit=10):
+        """Typeahead: prefix match on mobile, GSTIN or name, each an index range scan"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        mobile_key = normalize_mobile(query)
+        if looks_like_gstin(query):
+            column, prefix = 'gst_key', normalize_gstin(query)
+        elif mobile_key and len(mobile_key) == len(query.replace(' ', '').lstrip('+')):
+            column, prefix = 'mobile_key', mobile_key
+        else:
+            column, prefix = 'name_key', normalize_name(query)
+        low, high = prefix_bounds(prefix)
+        rows = self.db.execute_query(
+            f"""
+            SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers
+            WHERE {column} >= %s AND {column} < %s
+            ORDER BY {column} LIMIT %s
+            """, (low, high, int(limit)))
+        return [Customer.from_row(row) for row in rows]
 
-    def get_customers(self):
-        return list(self.customers.values())
+    def get_customers(self, limit=None):
+        query = f"SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers ORDER BY name_key"
+        params = ()
+        if limit:
+            query += " LIMIT %s"
+            params = (int(limit), )
+        return [Customer.from_row(row) for row in self.db.execute_query(query, params)]
 
     def update_customer_stats(self, customer_id, bill_total):
-        if customer_id in self.customers:
-            self.customers[customer_id]['total_purchases'] += bill_total
-            self.customers[customer_id]['last_purchase_date'] = datetime.now()
+        self.db.execute_query(
+            """
+            UPDATE customers
+            SET total_purchases = total_purchases + %s, last_purchase_date = %s
+            WHERE id = %s
+            """, (bill_total, datetime.now().strftime(DATE_FORMAT), customer_id))
 
     def generate_bill_qr(self, bill_data):
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(json.dumps(bill_data))
-        qr.make(fit=True)
+        return qr_base64(bill_data, self.bill_cache)
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered)
-        return base64.b64encode(buffered.getvalue()).decode()
+    def build_invoice(self,
+                      sale_items,
+                      customer=None,
+                      company_info=None,
+                      bill_no=None,
+                      date=None):
+        """Collect everything an invoice backend draws into a plain dict.
 
-    def generate_bill_html(self, sale_items, customer=None, company_info=None):
-        bill_no = f"INV-{self.next_bill_no:05d}"
-        self.next_bill_no += 1
+        The dict is picklable, so it can be handed to render workers as is.
+        """
+        if bill_no is None:
+            # A preview; numbers are only issued when a bill is recorded
+            bill_no = 'DRAFT'
+        date = (date or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
 
+        items = [{field: item.get(field) for field in INVOICE_ITEM_FIELDS}
+                 for item in sale_items]
+        company = dict(company_info or self.invoice_renderer.company)
+        customer = {
+            'name': customer.get('name'),
+            'mobile': customer.get('mobile'),
+            'gst_no': customer.get('gst_no')
+        } if customer else None
+        totals = InvoiceRenderer.totals(items, interstate_supply(company, customer))
         bill_data = {
             'bill_no': bill_no,
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'total': sum(item['total'] for item in sale_items)
+            'date': date,
+            'total': totals['total']
         }
-        qr_code = self.generate_bill_qr(bill_data)
-
-        company_info = company_info or {
-            'name': 'Your Company Name',
-            'address': 'Your Company Address',
-            'gst': 'Your GST Number',
-            'phone': 'Your Phone',
-            'email': 'your@email.com'
+
+        return {
+            'company': company,
+            'bill_no': bill_no,
+            'date': date,
+            'items': items,
+            'customer': customer,
+            'totals': totals,
+            'qr_png': cached_qr_png(bill_data, self.bill_cache)
         }
 
-        items_html = '\n'.join(f"""
-            <tr>
-                <td>{item['product_name']}</td>
-                <td>{item.get('hsn_code', '-')}</td>
-                <td>{item['quantity']}</td>
-                <td>₹{item['price']:.2f}</td>
-                <td>₹{item['subtotal']:.2f}</td>
-                <td>{item['gst_rate']}%</td>
-                <td>₹{item['gst_amount']:.2f}</td>
-                <td>₹{item['total']:.2f}</td>
-            </tr>
-            """ for item in sale_items)
-
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Tax Invoice</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ text-align: center; margin-bottom: 20px; }}
-                .company-details {{ margin-bottom: 20px; }}
-                .customer-details {{ margin-bottom: 20px; }}
-                .bill-items {{ width: 100%; border-collapse: collapse; margin-bottom: 20px; }}
-                .bill-items th, .bill-items td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                .totals {{ float: right; width: 300px; }}
-                .qr-code {{ text-align: center; margin-top: 20px; }}
-                .footer {{ text-align: center; margin-top: 20px; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>{company_info['name']}</h1>
-                <p>{company_info['address']}</p>
-                <p>GST No: {company_info['gst']}</p>
-                <h2>Tax Invoice</h2>
-            </div>
-
-            <div class="company-details">
-                <p>Phone: {company_info['phone']}</p>
-                <p>Email: {company_info['email']}</p>
-                <p>Invoice No: {bill_no}</p>
-                <p>Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            </div>
-
-            <div class="customer-details">
-                <h3>Bill To:</h3>
-                <p>{customer['name'] if customer else 'Walk-in Customer'}</p>
-                {f'<p>Mobile: {customer["mobile"]}</p>' if customer else ''}
-                {f'<p>GST No: {customer["gst_no"]}</p>' if customer and customer.get('gst_no') else ''}
-            </div>
-
-            <table class="bill-items">
-                <thead>
-                    <tr>
-                        <th>Item</th>
-                        <th>HSN</th>
-                        <th>Quantity</th>
-                        <th>Rate</th>
-                        <th>Amount</th>
-                        <th>GST %</th>
-                        <th>GST Amt</th>
-                        <th>Total</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {items_html}
-            </table>
-
-            <div class="totals">
-                <p><strong>Subtotal:</strong> ₹{sum(item['subtotal'] for item in sale_items):.2f}</p>
-                <p><strong>CGST:</strong> ₹{sum(item['gst_amount']/2 for item in sale_items):.2f}</p>
-                <p><strong>SGST:</strong> ₹{sum(item['gst_amount']/2 for item in sale_items):.2f}</p>
-                <p><strong>Total:</strong> ₹{sum(item['total'] for item in sale_items):.2f}</p>
-            </div>
-
-            <div class="qr-code">
-                <img src="data:image/png;base64,{qr_code}" width="150">
-                <p>Scan to verify bill</p>
-            </div>
-
-            <div class="footer">
-                <p>This is a computer generated invoice</p>
-            </div>
-        </body>
-        </html>
+    def generate_bill_html(self, sale_items, customer=None, company_info=None, **kwargs):
+        invoice = self.build_invoice(sale_items, customer, company_info, **kwargs)
+        renderer = self.invoice_renderer
+        if invoice['company'] != renderer.company:
+            renderer = InvoiceRenderer(invoice['company'])
+        return renderer.render_invoice(invoice)
+
+    def generate_bill_pdf(self, sale_items, customer=None, company_info=None, **kwargs):
+        invoice = self.build_invoice(sale_items, customer, company_info, **kwargs)
+        return self.render_pdf_cached(invoice)[1]
+
+    def invoice_key(self, invoice):
+        # The QR image is derived from the other fields, so it stays out of the hash
+        content = {key: value for key, value in invoice.items() if key != 'qr_png'}
+        return content_key('pdf', self.pdf_backend, content)
+
+    def render_pdf_cached(self, invoice):
+        """Render synchronously unless an identical invoice was rendered before.
+
+        Returns (content key, pdf bytes); the key doubles as an ETag.
         """
-        return html
-
-    def generate_bill_pdf(self, sale_items, customer=None, company_info=None):
-        html = self.generate_bill_html(sale_items, customer, company_info)
-
-        options = {
-            'page-size': 'A4',
-            'margin-top': '0.75in',
-            'margin-right': '0.75in',
-            'margin-bottom': '0.75in',
-            'margin-left': '0.75in',
-            'encoding': "UTF-8",
-        }
+        key = self.invoice_key(invoice)
+        pdf = self.bill_cache.get('pdf', key)
+        if pdf is None:
+            pdf = render_invoice_pdf(invoice, self.pdf_backend)
+            self.bill_cache.put('pdf', key, pdf)
+        return key, pdf
 
-        return pdfkit.from_string(html, False, options=options)
-
-    def add_sale(self, product_id, quantity, price, customer_id=None):
-        if product_id in self.products:
-            product = self.products[product_id]
-            tax_details = self.calculate_tax(price, quantity,
-                                             product['gst_rate'],
-                                             product['cess_rate'])
-
-            sale_data = {
-                'date':
-                datetime.now(),
-                'product_id':
-                product_id,
-                'product_name':
-                product['name'],
-                'quantity':
-                quantity,
-                'price':
-                price,
-                'subtotal':
-                tax_details['subtotal'],
-                'cgst':
-                tax_details['cgst'],
-                'sgst':
-                tax_details['sgst'],
-                'igst':
-                tax_details['igst'],
-                'cess':
-                tax_details['cess'],
-                'total':
-                tax_details['total'],
-                'hsn_code':
-                product['hsn_code'],
-                'gst_rate':
-                product['gst_rate'],
-                'gst_amount':
-                tax_details['total'] - tax_details['subtotal'] -
-                tax_details['cess'],
-                'customer_id':
-                customer_id
-            }
+    def get_bill(self, bill_id):
+        rows = self.db.execute_query("SELECT * FROM bills WHERE id = %s",
+                                     (bill_id, ))
+        if not rows:
+            return None
+        return Bill.from_row(rows[0], (
+            SaleLine.from_row(row) for row in self.db.execute_query(
+                "SELECT * FROM sale_lines WHERE bill_id = %s ORDER BY id",
+                (bill_id, ))))
+
+    def bill_invoice(self, bill, company_info=None):
+        customer = self.get_customer(bill['customer_id']) if bill['customer_id'] else None
+        return self.build_invoice(bill['items'], customer, company_info,
+                                  bill_no=bill['bill_no'],
+                                  date=bill['date'])
+
+    def bill_pdf(self, bill_id):
+        """PDF bytes for a stored bill, rendered now unless already cached"""
+        bill = self.get_bill(bill_id)
+        if not bill:
+            return None
+        return self.render_pdf_cached(self.bill_invoice(bill))[1]
+
+    def send_bill(self, bill_id, channel, recipient=None):
+        """Queue a bill for delivery and return the outbox id.
+
+        The recipient defaults to the bill customer's e-mail or mobile. The
+        PDF is attached when the delivery is sent, not when it is queued.
+        """
+        rows = self.db.execute_query(
+            "SELECT bill_no, customer_id, total FROM bills WHERE id = %s", (bill_id, ))
+        if not rows:
+            raise ValueError(f"Unknown bill: {bill_id}")
+        bill = rows[0]
+        customer = self.get_customer(bill['customer_id']) if bill['customer_id'] else None
+        if not recipient and customer:
+            recipient = customer.get('email') if channel == 'email' else customer.get('mobile')
+
+        greeting = f"Dear {customer['name']}," if customer else "Hello,"
+        body = (f"{greeting}\n\nThank you for your purchase. Your bill "
+                f"{bill['bill_no']} for Rs.{bill['total']:.2f} is attached.")
+        return self.deliveries.enqueue(channel, recipient, body,
+                                       subject=f"Invoice {bill['bill_no']}",
+                                       bill_id=bill_id,
+                                       filename=invoice_filename(bill['bill_no']))
+
+    def find_bill_ids(self, start_date=None, end_date=None, bill_nos=None):
+        if bill_nos:
+            bill_nos = list(bill_nos)
+            ids = []
+            for start in range(0, len(bill_nos), 900):
+                chunk = bill_nos[start:start + 900]
+                rows = self.db.execute_query(
+                    f"SELECT id FROM bills WHERE bill_no IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk)
+                ids.extend(row[0] for row in rows)
+            return sorted(ids)
 
-            self.sales.append(sale_data)
-            self.products[product_id]['quantity'] -= quantity
+        where, params = _date_bounds(start_date, end_date)
+        rows = self.db.execute_query(
+            f"SELECT id FROM bills{where} ORDER BY date, id", params)
+        return [row[0] for row in rows]
+
+    def iter_bill_pdfs(self, bill_ids):
+        """Yield (bill_no, pdf) for each bill, rendering in parallel.
+
+        Bills are loaded one at a time as the render window advances, and
+        cached PDFs are reused, so a month-end reprint never holds more
+        than a window's worth of documents. Renders run on the render
+        queue's worker pool.
+        """
+        def entries():
+            for bill_id in bill_ids:
+                bill = self.get_bill(bill_id)
+                if not bill:
+                    continue
+                invoice = self.bill_invoice(bill)
+                key = self.invoice_key(invoice)
+                cached = self.bill_cache.get('pdf', key)
+                yield (bill['bill_no'], key, cached is None), invoice, cached
+
+        for (bill_no, key, rendered), pdf in render_in_parallel(
+                entries(), self.render_queue.executor(), self.pdf_backend,
+                window=self.render_queue.workers * 4):
+            if rendered:
+                self.bill_cache.put('pdf', key, pdf)
+            yield bill_no, pdf
+
+    def queue_bill_pdf(self, bill_id, company_info=None):
+        """Return the render job for a bill's PDF, queueing it if needed.
+
+        Jobs are keyed by a hash of the invoice content, so a cached PDF comes
+        back as an already-finished job and an edited bill gets a new key.
+        Raises utils.render_queue.QueueFull when the renderer is saturated.
+        """
+        bill = self.get_bill(bill_id)
+        if not bill:
+            return None
+        invoice = self.bill_invoice(bill, company_info)
+        key = self.invoice_key(invoice)
+        self.bill_cache.link(bill_id, key)
+
+        pdf = self.bill_cache.get('pdf', key)
+        if pdf is not None:
+            return RenderJob.completed(key, pdf)
+        return self.render_queue.submit(key, invoice, self.pdf_backend)
+
+    def _insert_line(self, table, columns, line):
+        query = f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+        """
+        values = [
+            line.date.strftime(DATE_FORMAT) if column == 'date' else getattr(line, column)
+            for column in columns
+        ]
+        return self.db.execute_insert(query, values)
+
+    def _sale_line(self, product, quantity, price, customer_id=None, bill_id=None,
+                   date=None, tax_details=None):
+        if tax_details is None:
+            tax_details = calculate_tax(price, quantity, product['gst_rate'],
+                                        product['cess_rate'])
+        return SaleLine(
+            bill_id=bill_id,
+            date=date or datetime.now().replace(microsecond=0),
+            product_id=product['id'],
+            product_name=product['name'],
+            quantity=quantity,
+            price=to_rupees(to_paise(price)),
+            subtotal=tax_details['subtotal'],
+            cgst=tax_details['cgst'],
+            sgst=tax_details['sgst'],
+            igst=tax_details['igst'],
+            cess=tax_details['cess'],
+            total=tax_details['total'],
+            hsn_code=product['hsn_code'],
+            gst_rate=product['gst_rate'],
+            gst_amount=tax_details['gst_amount'],
+            customer_id=customer_id)
+
+    def _take_stock(self, connection, product, quantity):
+        """Decrement stock only if enough is on hand.
+
+        The check lives in the UPDATE's WHERE clause, so it holds however
+        many tills sell the same SKU at once.
+        """
+        updated = connection.execute(
+            "UPDATE products SET quantity = quantity - ? WHERE id = ? AND quantity >= ?",
+            (quantity, product['id'], quantity)).rowcount
+        if not updated:
+            row = connection.execute("SELECT quantity FROM products WHERE id = ?",
+                                     (product['id'], )).fetchone()
+            raise InsufficientStock(product, quantity, row[0] if row else 0)
+        self.db.on_commit(lambda: self.hot_products.invalidate(product['id']))
+
+    def add_sale(self, product_id, quantity, price, customer_id=None, bill_id=None):
+        customer_id = int(customer_id) if customer_id else None
+
+        # The line, the stock decrement and the customer's running total
+        # commit together or not at all
+        with self.db.transaction() as connection:
+            product = self.get_product(product_id)
+            if not product:
+                return None
+
+            self._take_stock(connection, product, quantity)
+            sale_data = self._sale_line(product, quantity, price, customer_id,
+                                        bill_id)
+            sale_data.id = self._insert_line('sale_lines', SALE_LINE_COLUMNS, sale_data)
+            self.db.on_commit(lambda: self.dashboard.record_sale(
+                sale_data, product['price']))
+            self.accounting.post_sale([sale_data], source='sale',
+                                      source_id=sale_data.id)
 
             if customer_id:
-                self.update_customer_stats(customer_id, tax_details['total'])
+                self.update_customer_stats(customer_id, sale_data.total)
 
-            return sale_data
+        return sale_data
 
-    def add_purchase(self, product_id, quantity, price):
-        if product_id in self.products:
-            product = self.products[product_id]
-            tax_details = self.calculate_tax(price, quantity,
-                                             product['gst_rate'],
-                                             product['cess_rate'])
-
-            self.purchases.append({
-                'date': datetime.now(),
-                'product_id': product_id,
-                'product_name': product['name'],
-                'quantity': quantity,
-                'price': price,
-                'subtotal': tax_details['subtotal'],
-                'cgst': tax_details['cgst'],
-                'sgst': tax_details['sgst'],
-                'igst': tax_details['igst'],
-                'cess': tax_details['cess'],
-                'total': tax_details['total'],
-                'hsn_code': product['hsn_code'],
-                'gst_rate': product['gst_rate']
-            })
-            self.products[product_id]['quantity'] += quantity
-
-    def get_sales(self):
-        return self.sales
-
-    def get_purchases(self):
-        return self.purchases
-
-    def import_products_from_excel(self, file_content):
-        df = pd.read_excel(file_content)
-
-        for _, row in df.iterrows():
+    def _validate_basket(self, basket):
+        lines = []
+        for item in basket:
             try:
-                self.add_product(
-                    name=str(row['Product Name*']),
-                    price=float(row['Price*']),
-                    quantity=int(row['Quantity*']),
-                    barcode=str(row['Barcode']) if not pd.isna(row['Barcode']) else None,
-                    unit=str(row['Unit']) if not pd.isna(row['Unit']) else None,
-                    category=str(row['Category']) if not pd.isna(row['Category']) else None,
-                    hsn_code=str(row['HSN Code']) if not pd.isna(row['HSN Code']) else None,
-                    gst_rate=float(row['GST Rate']) if not pd.isna(row['GST Rate']) else 0,
-                    cess_rate=0
-                )
-            except Exception as e:
-                print(f"Error importing row: {row}, Error: {str(e)}")
-                continue
+                product_id = int(item['product_id'])
+                quantity = int(item['quantity'])
+                price = float(item['price'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Invalid basket line: {item!r}")
+            if quantity <= 0:
+                raise ValueError(f"Quantity must be positive for product {product_id}")
+            if price < 0:
+                raise ValueError(f"Price cannot be negative for product {product_id}")
+            lines.append((product_id, quantity, price))
+        if not lines:
+            raise ValueError("The basket is empty")
+        return lines
 
-    def export_products_to_excel(self):
-        if not self.products:
-            return None
+    def checkout(self, basket, customer_id=None, series=None):
+        """Sell a whole basket as one bill, atomically.
+
+        basket is a list of dicts with product_id, quantity and price. Every
+        line is validated and every SKU's stock is decremented with a
+        conditional update inside one transaction, together with the bill,
+        its lines and the customer's totals. A line that cannot be filled
+        raises InsufficientStock and nothing is written, not even an
+        invoice number.
+
+        Returns the bill id, its invoice number and its sale lines.
+        """
+        lines = self._validate_basket(basket)
+        customer_id = int(customer_id) if customer_id else None
+        product_ids = sorted({product_id for product_id, _, _ in lines})
+
+        with self.db.transaction() as connection:
+            if customer_id and not connection.execute(
+                    "SELECT 1 FROM customers WHERE id = ?", (customer_id, )).fetchone():
+                raise ValueError(f"Unknown customer: {customer_id}")
+
+            rows = connection.execute(
+                f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products "
+                f"WHERE id IN ({', '.join('?' * len(product_ids))})",
+                product_ids).fetchall()
+            products = {row['id']: dict(row) for row in rows}
+            missing = [product_id for product_id in product_ids
+                       if product_id not in products]
+            if missing:
+                raise ValueError(f"Unknown product: {missing[0]}")
+
+            for product_id, quantity, _ in lines:
+                self._take_stock(connection, products[product_id], quantity)
+
+            # The whole basket's tax in one pass, in paise
+            taxes = tax_rows(calculate_tax_batch(
+                [price for _, _, price in lines],
+                [quantity for _, quantity, _ in lines],
+                [products[product_id]['gst_rate'] or 0 for product_id, _, _ in lines],
+                [products[product_id]['cess_rate'] or 0 for product_id, _, _ in lines]))
+            now = datetime.now().replace(microsecond=0)
+            sale_items = [
+                self._sale_line(products[product_id], quantity, price, customer_id,
+                                date=now, tax_details=tax_details)
+                for (product_id, quantity, price), tax_details in zip(lines, taxes)
+            ]
+
+            bill_id, bill_no = self._insert_bill(sale_items, customer_id, now, series)
+            for item in sale_items:
+                item.bill_id = bill_id
+                item.id = self._insert_line('sale_lines', SALE_LINE_COLUMNS, item)
+
+            if customer_id:
+                self.update_customer_stats(customer_id,
+                                           money_sum(item.total for item in sale_items))
+            self.accounting.post_sale(sale_items, now, bill_no, source_id=bill_id)
+
+            def record():
+                for item in sale_items:
+                    self.dashboard.record_sale(item, products[item.product_id]['price'])
 
-        df = pd.DataFrame(self.products.values())
-        output = StringIO()
-        df.to_excel(output, index=False)
-        output.seek(0)
+            self.db.on_commit(record)
 
-        return send_file(
-            output,
-            mimetype=
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='products_export.xlsx')
+        return {'bill_id': bill_id, 'bill_no': bill_no, 'items': sale_items}
+
+    def _insert_bill(self, sale_items, customer_id, date, series=None):
+        bill_no = self.invoice_numbers.allocate(series, date)
+        bill_id = self.db.execute_insert(
+            """
+            INSERT INTO bills (bill_no, date, customer_id, subtotal, gst_amount, cess, total)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (bill_no, date.strftime(DATE_FORMAT), customer_id,
+             money_sum(item.subtotal for item in sale_items),
+             money_sum(item.gst_amount for item in sale_items),
+             money_sum(item.cess for item in sale_items),
+             money_sum(item.total for item in sale_items)))
+        return bill_id, bill_no
+
+    def record_bill(self, sale_items, customer_id=None, series=None):
+        """Insert a bills row for already-recorded sale lines and link them to it"""
+        customer_id = int(customer_id) if customer_id else None
+        with self.db.transaction():
+            bill_id, _ = self._insert_bill(sale_items, customer_id, datetime.now(),
+                                           series)
+            self.db.executemany(
+                "UPDATE sale_lines SET bill_id = ? WHERE id = ?",
+                [(bill_id, item.id) for item in sale_items])
+        for item in sale_items:
+            item.bill_id = bill_id
+        return bill_id
+
+    def add_purchase(self, product_id, quantity, price):
+        with self.db.transaction():
+            product = self.get_product(product_id)
+            if not product:
+                return None
+
+            tax_details = calculate_tax(price, quantity, product['gst_rate'],
+                                        product['cess_rate'])
+
+            purchase_data = PurchaseLine(
+                date=datetime.now().replace(microsecond=0),
+                product_id=product_id,
+                product_name=product['name'],
+                quantity=quantity,
+                price=to_rupees(to_paise(price)),
+                subtotal=tax_details['subtotal'],
+                cgst=tax_details['cgst'],
+                sgst=tax_details['sgst'],
+                igst=tax_details['igst'],
+                cess=tax_details['cess'],
+                total=tax_details['total'],
+                hsn_code=product['hsn_code'],
+                gst_rate=product['gst_rate'],
+                gst_amount=tax_details['gst_amount'])
+
+            purchase_data.id = self._insert_line('purchase_lines', PURCHASE_LINE_COLUMNS,
+                                                 purchase_data)
+            self.db.execute_query(
+                "UPDATE products SET quantity = quantity + %s WHERE id = %s",
+                (quantity, product_id))
+            self.db.on_commit(lambda: self.dashboard.record_purchase(
+                purchase_data, product['price']))
+            self.accounting.post_purchase(purchase_data)
+            self.db.on_commit(lambda: self.hot_products.invalidate(product['id']))
+
+        return purchase_data
+
+    def backfill_journal(self):
+        """Post the sales and purchases recorded before the journal existed.
+
+        Returns the number of journal entries written.
+        """
+        posted = 0
+        with self.db.transaction():
+            bills = self.db.execute_query(
+                """
+                SELECT b.id, b.bill_no, b.date, SUM(l.subtotal) AS subtotal,
+                       SUM(l.gst_amount) AS gst_amount, SUM(l.cess) AS cess
+                FROM bills b JOIN sale_lines l ON l.bill_id = b.id
+                GROUP BY b.id ORDER BY b.id
+                """)
+            for bill in bills:
+                self.accounting.post_sale([dict(bill)], bill['date'], bill['bill_no'],
+                                          source_id=bill['id'])
+                posted += 1
+            for line in self.db.execute_query(
+                    "SELECT * FROM sale_lines WHERE bill_id IS NULL ORDER BY id"):
+                self.accounting.post_sale([dict(line)], line['date'], source='sale',
+                                          source_id=line['id'])
+                posted += 1
+            for line in self.db.execute_query("SELECT * FROM purchase_lines ORDER BY id"):
+                self.accounting.post_purchase(dict(line))
+                posted += 1
+        return posted
+
+    def get_sale(self, sale_id):
+        rows = self.db.execute_query("SELECT * FROM sale_lines WHERE id = %s",
+                                     (sale_id, ))
+        return SaleLine.from_row(rows[0]) if rows else None
+
+    def _ledger_page(self, table, record, start_date, end_date, after, limit):
+        """Newest-first page of a ledger table, keyset-paginated on (date, id)"""
+        where, params = _date_bounds(start_date, end_date)
+        if after:
+            position = _decode_cursor(after)
+            # The leading <= gives SQLite a range to seek to in the date index
+            where += (' AND ' if where else ' WHERE ') + \
+                "date <= %s AND (date < %s OR id < %s)"
+            params.extend((position[0], position[0], int(position[1])))
+        limit = max(1, min(int(limit), 500))
+        rows = self.db.execute_query(
+            f"SELECT * FROM {table}{where} ORDER BY date DESC, id DESC LIMIT %s",
+            params + [limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = _encode_cursor([rows[limit - 1]['date'], rows[limit - 1]['id']])
+        return {'items': [record.from_row(row) for row in rows[:limit]],
+                'next_cursor': next_cursor}
+
+    def page_sales(self, start_date=None, end_date=None, after=None, limit=50):
+        """One page of sale lines, newest first; pass next_cursor as `after`"""
+        return self._ledger_page('sale_lines', SaleLine, start_date, end_date, after, limit)
+
+    def page_purchases(self, start_date=None, end_date=None, after=None, limit=50):
+        """One page of purchase lines, newest first; pass next_cursor as `after`"""
+        return self._ledger_page('purchase_lines', PurchaseLine, start_date, end_date,
+                                 after, limit)
+
+    def get_sales(self, start_date=None, end_date=None, limit=None):
+        where, params = _date_bounds(start_date, end_date)
+        query = f"SELECT * FROM sale_lines{where} ORDER BY date DESC, id DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return [SaleLine.from_row(row) for row in self.db.execute_query(query, params)]
+
+    def get_purchases(self, start_date=None, end_date=None, limit=None):
+        where, params = _date_bounds(start_date, end_date)
+        query = f"SELECT * FROM purchase_lines{where} ORDER BY date DESC, id DESC"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        return [PurchaseLine.from_row(row) for row in self.db.execute_query(query, params)]
+
+    def find_existing_barcodes(self, barcodes):
+        """Return the subset of barcodes already present in products.
+
+        The blank-barcode condition matches the partial unique index, so each
+        chunk is answered from the index rather than a table scan.
+        """
+        barcodes = list(barcodes)
+        found = set()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(barcodes), 900):
+            chunk = barcodes[start:start + 900]
+            rows = self.db.execute_query(
+                f"SELECT barcode FROM products WHERE barcode IN ({', '.join(['%s'] * len(chunk))}) "
+                "AND barcode IS NOT NULL AND barcode != ''",
+                chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def import_products(self,
+                        df,
+                        mappings,
+                        dry_run=False,
+                        partial=False,
+                        seen_barcodes=()):
+        """Validate a sheet column-wise and insert it with one executemany.
+
+        With partial=False nothing is written if any row fails. Returns the
+        ImportReport describing row-level errors.
+        """
+        barcode_column = next(
+            (column for column, field in mappings.items() if field == 'barcode'),
+            None)
+        existing = set()
+        if barcode_column is not None:
+            # Earlier chunks of this file are visible in the open
+            # transaction; those are reported as in-file repeats instead
+            existing = self.find_existing_barcodes(
+                clean_code(df[barcode_column]).dropna().unique()) - set(
+                    seen_barcodes)
+
+        valid, report = validate_products(df, mappings, existing, dry_run,
+                                          seen_barcodes)
+        if dry_run or valid.empty or (report.errors and not partial):
+            return report
+
+        query = f"""
+            INSERT INTO products ({', '.join(PRODUCT_FIELDS)})
+            VALUES ({', '.join(['?'] * len(PRODUCT_FIELDS))})
+        """
+        inventory_value = float((valid['quantity'] * valid['price']).sum())
+        with self.db.transaction():
+            report.imported = self.db.executemany(query, product_rows(valid))
+            self.db.on_commit(
+                lambda: self.dashboard.adjust_inventory(inventory_value))
+        return report
+
+    def import_products_chunked(self,
+                                stream,
+                                filename,
+                                mappings=None,
+                                dry_run=False,
+                                partial=False,
+                                chunksize=DEFAULT_CHUNK_SIZE):
+        """Import a sheet of any size in fixed-size batches.
+
+        Only one chunk is held in memory at a time. All chunks share one
+        transaction, so with partial=False a single bad row anywhere rolls
+        back the whole file. mappings=None means the import template headers.
+        """
+        report = ImportReport(0, dry_run)
+        seen_barcodes = set()
+
+        def run():
+            for chunk in iter_sheet_chunks(stream, filename, chunksize):
+                chunk_mappings = mappings or {
+                    column: field
+                    for column, field in TEMPLATE_MAPPINGS.items()
+                    if column in chunk.columns
+                }
+                report.merge(
+                    self.import_products(chunk,
+                                         chunk_mappings,
+                                         dry_run=dry_run,
+                                         partial=True,
+                                         seen_barcodes=seen_barcodes))
+                barcode_column = next((column
+                                       for column, field in chunk_mappings.items()
+                                       if field == 'barcode'), None)
+                if barcode_column is not None:
+                    seen_barcodes.update(
+                        clean_code(chunk[barcode_column]).dropna())
+
+        if dry_run:
+            run()
+            return report
+
+        try:
+            with self.db.transaction():
+                run()
+                if report.errors and not partial:
+                    raise ImportAborted()
+        except ImportAborted:
+            report.imported = 0
+        return report
+
+    def import_products_from_excel(self, file_content, dry_run=False):
+        report = self.import_products_chunked(
+            getattr(file_content, 'stream', file_content),
+            getattr(file_content, 'filename', None) or 'upload.xlsx',
+            dry_run=dry_run,
+            partial=True)
+        for error in report.errors:
+            print(f"Error importing row {error['row']}: {error['message']}")
+        return report
+
+    def export_products_to_excel(self):
+        header, rows = self.report_rows('products')
+        return _download(stream_xlsx(header, rows, 'Products'), XLSX_MIMETYPE,
+                         'products_export.xlsx')
 
     def get_dashboard_stats(self):
-        # Get products from database
-        products = self.get_products()
-        total_inventory = sum(product['quantity'] * product['price'] for product in products)
+        return self.dashboard.snapshot()
 
-        # Use existing sales and purchases lists for now
-        total_sales = sum(sale['total'] for sale in self.sales)
-        total_purchases = sum(purchase['total'] for purchase in self.purchases)
-        recent_sales = sorted(self.sales, key=lambda x: x['date'], reverse=True)[:5]
-        recent_purchases = sorted(self.purchases, key=lambda x: x['date'], reverse=True)[:5]
+    def get_sales_series(self, granularity='day', start_date=None, end_date=None):
+        return self.sales_trends.series(granularity, start_date, end_date)
 
-        return {
-            'total_sales': total_sales,
-            'total_purchases': total_purchases,
-            'total_inventory': total_inventory,
-            'profit': total_sales - total_purchases,
-            'recent_sales': recent_sales,
-            'recent_purchases': recent_purchases
-        }
+    def rebuild_dashboard_stats(self):
+        """Recompute dashboard aggregates from the database.
+
+        Returns the totals that had drifted from their running values, so the
+        result doubles as a consistency check.
+        """
+        # Summed in paise, a row at a time, the way the running totals add up
+        paise = "COALESCE(SUM(CAST(ROUND({} * 100) AS INTEGER)), 0)"
+        total_inventory = self.db.execute_query(
+            f"SELECT {paise.format('quantity * price')} FROM products")[0][0]
+        total_sales = self.db.execute_query(
+            f"SELECT {paise.format('total')} FROM sale_lines")[0][0]
+        total_purchases = self.db.execute_query(
+            f"SELECT {paise.format('total')} FROM purchase_lines")[0][0]
+
+        return self.dashboard.rebuild(
+            {
+                'total_sales': to_rupees(total_sales),
+                'total_purchases': to_rupees(total_purchases),
+                'total_inventory': to_rupees(total_inventory)
+            },
+            self.get_sales(limit=self.dashboard.recent_size),
+            self.get_purchases(limit=self.dashboard.recent_size))
+
+    def report_rows(self, report_type, start_date=None, end_date=None, category=None):
+        """Header and a lazy row iterator for a report, read straight off the cursor"""
+        if report_type in ('sales', 'purchases'):
+            table = 'sale_lines' if report_type == 'sales' else 'purchase_lines'
+            where, params = _date_bounds(start_date, end_date)
+            header = ['Date', 'Product', 'HSN', 'Quantity', 'Price', 'Subtotal',
+                      'CGST', 'SGST', 'IGST', 'Total']
+            rows = self.db.iter_query(
+                f"""
+                SELECT date, product_name, hsn_code, quantity, price, subtotal,
+                       cgst, sgst, igst, total
+                FROM {table}{where}
+                ORDER BY date, id
+                """, params)
+            rows = _with_totals(rows, len(header), range(5, 10))
+        elif report_type == 'inventory':
+            header = ['ID', 'Product', 'Category', 'HSN', 'Quantity', 'Price', 'MRP',
+                      'Stock Value']
+            where, params = (" WHERE category = %s", [category]) if category else ('', [])
+            rows = self.db.iter_query(
+                f"""
+                SELECT id, name, category, hsn_code, quantity, price, mrp,
+                       quantity * price
+                FROM products{where}
+                ORDER BY id
+                """, params)
+        elif report_type == 'products':
+            header = list(PRODUCT_COLUMNS)
+            rows = self.db.iter_query(
+                f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products ORDER BY id")
+        else:
+            raise ValueError(f"Unknown report type: {report_type}")
+        return header, rows
+
+    def generate_csv_report(self, report_type, start_date=None, end_date=None,
+                            category=None):
+        header, rows = self.report_rows(report_type, start_date, end_date, category)
+        return _download(stream_csv(header, rows), CSV_MIMETYPE,
+                         _report_filename(report_type, start_date, end_date, 'csv'))
 
-    def generate_csv_report(self, report_type):
-        si = StringIO()
-        writer = csv.writer(si)
-
-        if report_type == 'sales':
-            writer.writerow([
-                'Date', 'Product', 'HSN', 'Quantity', 'Price', 'Subtotal',
-                'CGST', 'SGST', 'IGST', 'Total'
-            ])
-            for sale in self.sales:
-                writer.writerow([
-                    sale['date'].strftime('%Y-%m-%d %H:%M:%S'),
-                    sale['product_name'], sale['hsn_code'], sale['quantity'],
-                    sale['price'], sale['subtotal'], sale['cgst'],
-                    sale['sgst'], sale['igst'], sale['total']
-                ])
-
-        elif report_type == 'purchases':
-            writer.writerow([
-                'Date', 'Product', 'HSN', 'Quantity', 'Price', 'Subtotal',
-                'CGST', 'SGST', 'IGST', 'Total'
-            ])
-            for purchase in self.purchases:
-                writer.writerow([
-                    purchase['date'].strftime('%Y-%m-%d %H:%M:%S'),
-                    purchase['product_name'], purchase['hsn_code'],
-                    purchase['quantity'], purchase['price'],
-                    purchase['subtotal'], purchase['cgst'], purchase['sgst'],
-                    purchase['igst'], purchase['total']
-                ])
-
-        output = si.getvalue()
-        si.close()
-
-        return send_file(StringIO(output),
-                         mimetype='text/csv',
-                         as_attachment=True,
-                         download_name=f'{report_type}_report.csv')
\ No newline at end of file
+    def export_report_to_excel(self, report_type, start_date=None, end_date=None,
+                               category=None):
+        header, rows = self.report_rows(report_type, start_date, end_date, category)
+        if report_type in ('sales', 'purchases'):
+            # Real dates, so Excel can sort and filter on them
+            rows = ((datetime.strptime(row[0], DATE_FORMAT) if row[0] != 'Total' else row[0],
+                     *row[1:]) for row in rows)
+        return _download(stream_xlsx(header, rows, report_type.title()), XLSX_MIMETYPE,
+                         _report_filename(report_type, start_date, end_date, 'xlsx'))
@@ -0,0 +1,69 @@
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+
+from utils.render_worker import render_invoice
+
+
+def render_in_parallel(entries, executor, backend_name=None, window=8):
+    """Render invoices on a process pool, yielding (meta, pdf) in input order.
+
+    executor is the render queue's pool (RenderQueue.executor()), so a
+    batch reuses its running workers. entries yields (meta, invoice,
+    cached_pdf); entries with a cached PDF skip the pool. At most `window`
+    renders are in flight, so memory stays bounded however many bills are
+    requested and checkout renders queued meanwhile wait behind at most
+    that many.
+    """
+    in_flight = deque()
+    for meta, invoice, cached_pdf in entries:
+        if cached_pdf is not None:
+            future = Future()
+            future.set_result(cached_pdf)
+        else:
+            future = executor.submit(render_invoice, invoice, backend_name)
+        in_flight.append((meta, future))
+
+        while len(in_flight) >= window:
+            meta, future = in_flight.popleft()
+            yield meta, future.result()
+
+    while in_flight:
+        meta, future = in_flight.popleft()
+        yield meta, future.result()
+
+
+class _ZipSink:
+    """Write-only file object that hands buffered bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    """Yield a ZIP archive chunk by chunk from (name, bytes) pairs.
+
+    PDFs are already compressed, so entries are stored rather than deflated.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# In-progress writes carry this suffix until they are renamed into place
+TEMP_SUFFIX = '.tmp'
+# A temp file this old was left by a writer that died mid-write
+STALE_TEMP_SECONDS = 3600
+# Links whose PDF is not cached yet (still rendering, or the render failed)
+# are kept up to this many beyond the cached entries
+MAX_PENDING_LINKS = 1024
+
+
+def content_key(*parts):
+    """Stable hash of the content a cached artefact was built from"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class BillCache:
+    """Disk-backed, content-addressed cache for bill PDFs and QR images.
+
+    Entries live at <directory>/<kind>/<key[:2]>/<key>. Because keys hash
+    the content, a changed bill simply maps to a new key; link() also drops
+    the entries of the bill's previous version straight away. Least
+    recently used entries are evicted once max_bytes is exceeded.
+
+    The in-memory index is per process. An entry written by another worker
+    is picked up from disk the first time it is asked for.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._links = OrderedDict()
+        self._owners = {}
+        self._stats = {}
+        self._load()
+
+    def _load(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(TEMP_SUFFIX):
+                    # Another process may still be writing a recent one
+                    if time.time() - stat.st_mtime > STALE_TEMP_SECONDS:
+                        self._remove(path)
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._size += size
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, kind, key[:2], key)
+
+    def _count(self, kind, outcome):
+        counters = self._stats.setdefault(kind, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+    def get(self, kind, key):
+        path = self._path(kind, key)
+        with self._lock:
+            known = path in self._entries
+            if known:
+                self._entries.move_to_end(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        evicted = []
+        with self._lock:
+            if data is None:
+                self._forget(path)
+                self._count(kind, 'misses')
+                return None
+            if not known:
+                # Written by another process since this index was loaded
+                self._size -= self._entries.pop(path, 0)
+                self._entries[path] = len(data)
+                self._size += len(data)
+                evicted = self._evict()
+            self._count(kind, 'hits')
+        for victim in evicted:
+            self._remove(victim)
+        return data
+
+    def put(self, kind, key, data):
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._size -= self._entries.pop(path, 0)
+            self._entries[path] = len(data)
+            self._size += len(data)
+            evicted = self._evict()
+        for victim in evicted:
+            self._remove(victim)
+
+    def _evict(self):
+        evicted = []
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            victim, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._unlink_owners(victim)
+            evicted.append(victim)
+        return evicted
+
+    def _forget(self, path):
+        """Drop path from the index and its owners' links; caller holds the lock"""
+        self._size -= self._entries.pop(path, 0)
+        self._unlink_owners(path)
+
+    def _unlink_owners(self, path):
+        for owner in self._owners.pop(path, ()):
+            if self._links.get(owner) == path:
+                del self._links[owner]
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def discard(self, key, kinds=('pdf', 'qr')):
+        for kind in kinds:
+            path = self._path(kind, key)
+            with self._lock:
+                self._forget(path)
+            self._remove(path)
+
+    def link(self, owner, key):
+        """Record that owner (e.g. a bill id) now renders to key.
+
+        If the owner previously rendered to a different key its stale PDF is
+        discarded immediately rather than waiting for LRU eviction. A link
+        is dropped when its PDF leaves the cache; at most MAX_PENDING_LINKS
+        more are kept for PDFs not cached yet.
+        """
+        path = self._path('pdf', key)
+        with self._lock:
+            previous = self._links.pop(owner, None)
+            self._links[owner] = path
+            self._owners.setdefault(path, set()).add(owner)
+            while len(self._links) > len(self._entries) + MAX_PENDING_LINKS:
+                oldest, linked = self._links.popitem(last=False)
+                owners = self._owners.get(linked, set())
+                owners.discard(oldest)
+                if not owners:
+                    self._owners.pop(linked, None)
+        if previous and previous != path:
+            self.discard(os.path.basename(previous), kinds=('pdf', ))
+
+    def stats(self):
+        with self._lock:
+            kinds = {}
+            for kind, counters in self._stats.items():
+                lookups = counters['hits'] + counters['misses']
+                kinds[kind] = {
+                    **counters,
+                    'hit_rate': round(counters['hits'] / lookups, 4) if lookups else None
+                }
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'kinds': kinds
+            }
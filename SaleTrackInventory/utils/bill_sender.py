@@ -1,20 +1,111 @@
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 import os
-from whatsapp import WhatsApp
+import queue
+import tempfile
+try:
+    from whatsapp import WhatsApp
+except ImportError:
+    WhatsApp = None
+
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open between messages.
+
+    A session idle for longer than idle_timeout, or one that fails a NOOP,
+    is replaced with a fresh connection instead of being reused.
+    """
+
+    def __init__(self, host, port, user=None, password=None, size=2,
+                 use_tls=True, idle_timeout=60, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.use_tls = use_tls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.password:
+            server.login(self.user, self.password)
+        self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _alive(self, server, last_used):
+        if time.monotonic() - last_used > self.idle_timeout:
+            return False
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if self._alive(server, last_used):
+                    return server
+                self._close(server)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server, broken=False):
+        if broken:
+            self._close(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(server)
+
 
 class BillSender:
-    def __init__(self, smtp_host, smtp_port, smtp_user, smtp_pass, whatsapp_token):
+    def __init__(self, smtp_host, smtp_port, smtp_user, smtp_pass, whatsapp_token,
+                 pool_size=2, use_tls=True, idle_timeout=60):
         self.smtp_host = smtp_host
         self.smtp_port = smtp_port
         self.smtp_user = smtp_user
         self.smtp_pass = smtp_pass
-        self.whatsapp = WhatsApp(token=whatsapp_token)
+        self.whatsapp = WhatsApp(token=whatsapp_token) if WhatsApp and whatsapp_token else None
+        self.smtp_pool = SMTPConnectionPool(smtp_host, smtp_port, smtp_user,
+                                            smtp_pass, size=pool_size,
+                                            use_tls=use_tls,
+                                            idle_timeout=idle_timeout)
 
-    def send_email(self, to_email, subject, body, pdf_content):
-        """Send bill via email"""
+    def build_email(self, to_email, subject, body, pdf_content, filename='bill.pdf'):
         msg = MIMEMultipart()
         msg['From'] = self.smtp_user
         msg['To'] = to_email
@@ -23,29 +114,79 @@ class BillSender:
         msg.attach(MIMEText(body, 'plain'))
 
         pdf_attachment = MIMEApplication(pdf_content, _subtype='pdf')
-        pdf_attachment.add_header('Content-Disposition', 'attachment', filename='bill.pdf')
+        pdf_attachment.add_header('Content-Disposition', 'attachment', filename=filename)
         msg.attach(pdf_attachment)
+        return msg
 
-        with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_pass)
-            server.send_message(msg)
+    def _send_message(self, msg):
+        # A pooled session can still drop between NOOP and send; retry once
+        # on a fresh connection before giving up. SMTPException subclasses
+        # OSError, so the order of the handlers matters.
+        for attempt in range(2):
+            server = self.smtp_pool.acquire()
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self.smtp_pool.release(server, broken=True)
+                if attempt:
+                    raise
+            except smtplib.SMTPException:
+                # The server refused this message; smtplib has reset the
+                # session, which stays usable, and resending would be refused
+                # again (or deliver twice)
+                self.smtp_pool.release(server)
+                raise
+            except OSError:
+                self.smtp_pool.release(server, broken=True)
+                raise
+            else:
+                self.smtp_pool.release(server)
+                return
+
+    def send_email(self, to_email, subject, body, pdf_content, filename='bill.pdf'):
+        """Send bill via email"""
+        self._send_message(self.build_email(to_email, subject, body, pdf_content,
+                                            filename))
+
+    def send_bulk(self, messages, concurrency=None):
+        """Send many bills over a few pooled connections.
+
+        messages is an iterable of dicts with to_email, subject, body and
+        pdf_content. Returns one result per message, in order, with ok and
+        error set; a failed message does not stop the rest.
+        """
+        concurrency = min(concurrency or self.smtp_pool.size, self.smtp_pool.size)
 
-    def send_whatsapp(self, phone_number, message, pdf_content):
-        """Send bill via WhatsApp"""
+        def send(message):
+            try:
+                self.send_email(message['to_email'], message['subject'],
+                                message['body'], message['pdf_content'])
+                return {'to_email': message['to_email'], 'ok': True, 'error': None}
+            except Exception as e:
+                return {'to_email': message['to_email'], 'ok': False, 'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(send, messages))
+
+    def close(self):
+        self.smtp_pool.close()
+
+    def send_whatsapp(self, phone_number, message, pdf_content, filename='bill.pdf'):
+        """Send bill via WhatsApp.
+
+        The client uploads documents from a path, so each send gets its own
+        temporary file; concurrent sends never share one.
+        """
+        if self.whatsapp is None:
+            raise RuntimeError("WhatsApp is not configured")
+
+        fd, temp_path = tempfile.mkstemp(prefix='bill-', suffix=os.path.splitext(filename)[1])
         try:
-            # Save PDF temporarily
-            temp_path = 'temp_bill.pdf'
-            with open(temp_path, 'wb') as f:
+            with os.fdopen(fd, 'wb') as f:
                 f.write(pdf_content)
 
             # Send message and document via WhatsApp
             self.whatsapp.send_message(phone_number, message)
             self.whatsapp.send_document(phone_number, temp_path)
-
-            # Clean up temporary file
+        finally:
             os.remove(temp_path)
-            return True
-        except Exception as e:
-            print(f"Error sending WhatsApp message: {str(e)}")
-            return False
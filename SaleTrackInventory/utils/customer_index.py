@@ -0,0 +1,91 @@
+import re
+import threading
+
+_NON_DIGITS = re.compile(r'\D')
+_GSTIN_PREFIX = re.compile(r'^\d{2}[A-Z]')
+
+
+def normalize_mobile(mobile):
+    """Digits only, without a +91 / 0 trunk prefix on a 10-digit number"""
+    digits = _NON_DIGITS.sub('', str(mobile or ''))
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits or None
+
+
+def normalize_gstin(gst_no):
+    gst_no = re.sub(r'\s+', '', str(gst_no or '')).upper()
+    return gst_no or None
+
+
+def normalize_name(name):
+    return ' '.join(str(name or '').split()).casefold()
+
+
+def state_code(gstin):
+    """The two-digit state code a GSTIN starts with, if it has one"""
+    gstin = (gstin or '').strip()
+    return gstin[:2] if gstin[:2].isdigit() else None
+
+
+def looks_like_gstin(text):
+    return bool(_GSTIN_PREFIX.match(normalize_gstin(text) or ''))
+
+
+def prefix_bounds(prefix):
+    """Half-open [low, high) range matching every string starting with prefix"""
+    return prefix, prefix + '\U0010ffff'
+
+
+class CustomerIndex:
+    """In-process hash maps from normalized mobile and GSTIN to customer id.
+
+    The customers table enforces uniqueness; these maps just turn the POS
+    lookups into a dict probe. Storage updates them only after a commit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_mobile = {}
+        self._by_gst = {}
+
+    def __len__(self):
+        return len(self._by_mobile)
+
+    def load(self, rows):
+        by_mobile = {}
+        by_gst = {}
+        for customer_id, mobile_key, gst_key in rows:
+            by_mobile[mobile_key] = customer_id
+            if gst_key:
+                by_gst[gst_key] = customer_id
+        with self._lock:
+            self._by_mobile = by_mobile
+            self._by_gst = by_gst
+
+    def add(self, customer_id, mobile_key, gst_key=None):
+        with self._lock:
+            if mobile_key:
+                self._by_mobile[mobile_key] = customer_id
+            if gst_key:
+                self._by_gst[gst_key] = customer_id
+
+    def discard(self, customer_id, mobile_key=None, gst_key=None):
+        """Drop the keys that still point at customer_id"""
+        with self._lock:
+            if mobile_key and self._by_mobile.get(mobile_key) == customer_id:
+                del self._by_mobile[mobile_key]
+            if gst_key and self._by_gst.get(gst_key) == customer_id:
+                del self._by_gst[gst_key]
+
+    def replace(self, customer_id, old_keys, new_keys):
+        self.discard(customer_id, *old_keys)
+        self.add(customer_id, *new_keys)
+
+    def by_mobile(self, mobile_key):
+        return self._by_mobile.get(mobile_key)
+
+    def by_gst(self, gst_key):
+        return self._by_gst.get(gst_key)
@@ -0,0 +1,274 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+CHANNELS = ('email', 'whatsapp')
+
+DELIVERY_FIELDS = ('id', 'channel', 'recipient', 'subject', 'bill_id', 'status',
+                   'attempts', 'max_attempts', 'next_attempt_at', 'last_error',
+                   'created_at', 'sent_at')
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` sends per second with bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, stop=None):
+        """Block until a token is available; False if stop was set meanwhile"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.rate
+            if stop is not None:
+                if stop.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+
+
+class DeliveryQueue:
+    """Durable outbox for bill e-mails and WhatsApp messages.
+
+    enqueue() only writes an outbox row, so it can join the checkout
+    transaction and never waits on a provider. Worker threads claim due
+    rows, wait for their channel's rate limiter and send through the
+    BillSender. A failed send is retried with exponential backoff until
+    max_attempts, after which the row is marked failed.
+
+    Rows with no stored attachment but a bill_id get the bill PDF from
+    load_attachment(bill_id) at send time.
+
+    A claimed row is stamped with claimed_at. On start, rows still 'sending'
+    whose lease_seconds have run out were left by a worker that died and go
+    back to pending; younger ones may belong to another process still
+    sending them.
+    """
+
+    def __init__(self,
+                 db,
+                 sender,
+                 load_attachment=None,
+                 workers=2,
+                 rates=None,
+                 max_attempts=5,
+                 base_delay=2.0,
+                 max_delay=600.0,
+                 poll_interval=1.0,
+                 lease_seconds=300.0):
+        self.db = db
+        self.sender = sender
+        self.load_attachment = load_attachment
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        rates = {'email': 5, 'whatsapp': 1, **(rates or {})}
+        self.limiters = {channel: RateLimiter(rate) for channel, rate in rates.items()}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    def start(self):
+        if self._threads:
+            return
+        # A lease that ran out belongs to a worker that was interrupted
+        self.db.execute_query(
+            """
+            UPDATE outbox SET status = 'pending', claimed_at = NULL
+            WHERE status = 'sending' AND (claimed_at IS NULL OR claimed_at < %s)
+            """, (time.time() - self.lease_seconds, ))
+        self._stop.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name=f'delivery-{number}',
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, channel, recipient, body='', subject=None, bill_id=None,
+                attachment=None, filename=None, max_attempts=None):
+        """Record a delivery and return its id; sending happens in the background"""
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown delivery channel: {channel}")
+        if not recipient:
+            raise ValueError(f"A recipient is required for {channel} delivery")
+
+        delivery_id = self.db.execute_insert(
+            """
+            INSERT INTO outbox (channel, recipient, subject, body, bill_id,
+                                attachment, filename, max_attempts,
+                                next_attempt_at, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (channel, recipient, subject, body, bill_id, attachment,
+                  filename, max_attempts or self.max_attempts, time.time(),
+                  datetime.now().strftime(DATE_FORMAT)))
+        with self._lock:
+            self._counters['enqueued'] += 1
+        # Wake a worker once the row is visible, not before
+        self.db.on_commit(self._wake.set)
+        return delivery_id
+
+    def _claim(self):
+        # An idle poll is a plain read; the write lock is only taken to claim
+        # a row, and the status check keeps two workers from both claiming it
+        while True:
+            rows = self.db.execute_query(
+                """
+                SELECT * FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= %s
+                ORDER BY next_attempt_at, id
+                LIMIT 1
+                """, (time.time(), ))
+            if not rows:
+                return None
+            row = rows[0]
+            with self.db.connection() as connection:
+                claimed = connection.execute(
+                    """
+                    UPDATE outbox SET status = 'sending', attempts = attempts + 1,
+                                      claimed_at = ?
+                    WHERE id = ? AND status = 'pending'
+                    """, (time.time(), row['id'])).rowcount
+            if claimed:
+                delivery = dict(row)
+                delivery['attempts'] += 1
+                return delivery
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivery = self._claim()
+            except Exception as e:
+                logging.error(f"Could not claim delivery: {e}")
+                delivery = None
+            if delivery is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            limiter = self.limiters.get(delivery['channel'])
+            if limiter is not None and not limiter.wait(self._stop):
+                self._release(delivery)
+                return
+            self._deliver(delivery)
+
+    def _release(self, delivery):
+        self.db.execute_query(
+            "UPDATE outbox SET status = 'pending', attempts = attempts - 1 WHERE id = %s",
+            (delivery['id'], ))
+
+    def _send(self, delivery):
+        attachment = delivery['attachment']
+        if attachment is None and delivery['bill_id'] and self.load_attachment:
+            attachment = self.load_attachment(delivery['bill_id'])
+        if attachment is None:
+            raise ValueError("Nothing to attach")
+        filename = delivery['filename'] or 'bill.pdf'
+
+        if delivery['channel'] == 'email':
+            self.sender.send_email(delivery['recipient'],
+                                   delivery['subject'] or 'Your bill',
+                                   delivery['body'], bytes(attachment), filename)
+        else:
+            self.sender.send_whatsapp(delivery['recipient'], delivery['body'],
+                                      bytes(attachment), filename)
+
+    def _deliver(self, delivery):
+        try:
+            self._send(delivery)
+        except Exception as e:
+            self._failed(delivery, e)
+            return
+        self.db.execute_query(
+            "UPDATE outbox SET status = 'sent', sent_at = %s, last_error = NULL WHERE id = %s",
+            (datetime.now().strftime(DATE_FORMAT), delivery['id']))
+        with self._lock:
+            self._counters['sent'] += 1
+
+    def _failed(self, delivery, error):
+        attempts = delivery['attempts']
+        if attempts >= delivery['max_attempts']:
+            logging.error(f"Delivery {delivery['id']} failed after {attempts} attempts: {error}")
+            self.db.execute_query(
+                "UPDATE outbox SET status = 'failed', last_error = %s WHERE id = %s",
+                (str(error), delivery['id']))
+            with self._lock:
+                self._counters['failed'] += 1
+            return
+
+        # Full jitter keeps retries from many rows from landing together
+        delay = min(self.max_delay, self.base_delay * 2**(attempts - 1))
+        delay = random.uniform(delay / 2, delay)
+        logging.warning(
+            f"Delivery {delivery['id']} failed ({error}), retrying in {delay:.1f}s")
+        self.db.execute_query(
+            """
+            UPDATE outbox SET status = 'pending', last_error = %s, next_attempt_at = %s
+            WHERE id = %s
+            """, (str(error), time.time() + delay, delivery['id']))
+        with self._lock:
+            self._counters['retried'] += 1
+
+    def retry(self, delivery_id):
+        """Put a failed delivery back in the queue with a fresh attempt budget"""
+        self.db.execute_query(
+            """
+            UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = %s
+            WHERE id = %s AND status = 'failed'
+            """, (time.time(), delivery_id))
+        self._wake.set()
+        return self.get(delivery_id)
+
+    def get(self, delivery_id):
+        rows = self.db.execute_query(
+            f"SELECT {', '.join(DELIVERY_FIELDS)} FROM outbox WHERE id = %s",
+            (delivery_id, ))
+        return dict(rows[0]) if rows else None
+
+    def for_bill(self, bill_id):
+        rows = self.db.execute_query(
+            f"SELECT {', '.join(DELIVERY_FIELDS)} FROM outbox WHERE bill_id = %s ORDER BY id",
+            (bill_id, ))
+        return [dict(row) for row in rows]
+
+    def metrics(self):
+        rows = self.db.execute_query(
+            "SELECT channel, status, COUNT(*) AS count FROM outbox GROUP BY channel, status")
+        depth = {}
+        for row in rows:
+            depth.setdefault(row['channel'], {})[row['status']] = row['count']
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            'workers': len(self._threads),
+            'rates': {channel: limiter.rate for channel, limiter in self.limiters.items()},
+            'outbox': depth,
+            **counters
+        }
@@ -0,0 +1,147 @@
+import heapq
+import re
+import threading
+from datetime import datetime
+
+# GST invoice numbers are at most 16 characters of letters, digits, '-' and
+# '/'; 'SSSS/25-26/00001' leaves four for the series
+_SERIES = re.compile(r'^[A-Z0-9][A-Z0-9-]{0,3}$')
+
+
+def financial_year(date=None):
+    """Indian financial year label for a date, e.g. '25-26' for April 2025 - March 2026"""
+    date = date or datetime.now()
+    start = date.year if date.month >= 4 else date.year - 1
+    return f"{start % 100:02d}-{(start + 1) % 100:02d}"
+
+
+def normalize_series(series):
+    series = str(series or '').strip().upper()
+    if not _SERIES.match(series):
+        raise ValueError(f"Invalid invoice series {series!r}: use 1-4 letters, digits or '-'")
+    return series
+
+
+def format_invoice_no(series, fy, number):
+    return f"{series}/{fy}/{number:05d}"
+
+
+def invoice_filename(bill_no, extension='pdf'):
+    """File name for a bill; the '/' separators would otherwise become directories"""
+    return f"{str(bill_no).replace('/', '-')}.{extension}"
+
+
+class _Block:
+    """Numbers [next, end) reserved in invoice_sequences for this process"""
+
+    __slots__ = ('next', 'end', 'free')
+
+    def __init__(self, start, end):
+        self.next = start
+        self.end = end
+        self.free = []
+
+    def exhausted(self):
+        return not self.free and self.next >= self.end
+
+    def take(self):
+        # Numbers handed back by a rolled-back checkout are reissued first
+        if self.free:
+            return heapq.heappop(self.free)
+        number = self.next
+        self.next += 1
+        return number
+
+    def give_back(self, number):
+        heapq.heappush(self.free, number)
+
+    def unused_from(self):
+        """First number of the unused tail, counting handed-back numbers"""
+        unused_from = self.next
+        for number in sorted(self.free, reverse=True):
+            if number != unused_from - 1:
+                break
+            unused_from = number
+        return unused_from
+
+
+class InvoiceNumberAllocator:
+    """Sequential invoice numbers per series and financial year.
+
+    The counter lives in invoice_sequences and is advanced inside the
+    caller's transaction, so a checkout that rolls back takes its number
+    with it and the sequence stays gapless.
+
+    With block_size > 1 the allocator instead reserves that many numbers at
+    a time and hands them out from memory, so processes sharing a database
+    only touch the sequence row once per block. Numbers from a rolled-back
+    checkout are reissued; release() gives the unused tail back on a clean
+    shutdown. A process that dies holding a block leaves that remainder
+    unissued, which is the price of not serializing on one row.
+    """
+
+    def __init__(self, db, block_size=1, default_series='INV'):
+        self.db = db
+        self.block_size = max(1, int(block_size))
+        self.default_series = normalize_series(default_series)
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _reserve(self, series, fy, count):
+        """Advance the stored counter by count and return the first number reserved"""
+        with self.db.transaction() as connection:
+            last_no = connection.execute(
+                """
+                INSERT INTO invoice_sequences (series, fy, last_no) VALUES (?, ?, ?)
+                ON CONFLICT (series, fy) DO UPDATE SET last_no = last_no + excluded.last_no
+                RETURNING last_no
+                """, (series, fy, count)).fetchone()[0]
+        return last_no - count + 1
+
+    def allocate(self, series=None, date=None):
+        """Issue the next invoice number; call inside the transaction that writes the bill"""
+        series = normalize_series(series) if series else self.default_series
+        fy = financial_year(date)
+        if self.block_size == 1:
+            return format_invoice_no(series, fy, self._reserve(series, fy, 1))
+
+        key = (series, fy)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None or block.exhausted():
+                start = self._reserve(series, fy, self.block_size)
+                block = _Block(start, start + self.block_size)
+                self._blocks[key] = block
+                # The reservation itself is undone by the rollback
+                self.db.on_rollback(lambda: self._discard(key, block))
+            number = block.take()
+        self.db.on_rollback(lambda: self._give_back(block, number))
+        return format_invoice_no(series, fy, number)
+
+    def _discard(self, key, block):
+        with self._lock:
+            if self._blocks.get(key) is block:
+                del self._blocks[key]
+
+    def _give_back(self, block, number):
+        with self._lock:
+            block.give_back(number)
+
+    def release(self):
+        """Return each block's unused tail if no later block was reserved after it"""
+        with self._lock:
+            blocks, self._blocks = self._blocks, {}
+        for (series, fy), block in blocks.items():
+            self.db.execute_query(
+                """
+                UPDATE invoice_sequences SET last_no = %s
+                WHERE series = %s AND fy = %s AND last_no = %s
+                """, (block.unused_from() - 1, series, fy, block.end - 1))
+
+    def peek(self, series=None, date=None):
+        """Last number reserved in the database for a series and year"""
+        series = normalize_series(series) if series else self.default_series
+        rows = self.db.execute_query(
+            "SELECT last_no FROM invoice_sequences WHERE series = %s AND fy = %s",
+            (series, financial_year(date)))
+        return rows[0][0] if rows else 0
@@ -0,0 +1,112 @@
+import base64
+import os
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+from utils.customer_index import state_code
+from utils.money import to_paise, to_rupees
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'templates')
+
+DEFAULT_COMPANY_INFO = {
+    'name': 'Your Company Name',
+    'address': 'Your Company Address',
+    'gst': 'Your GST Number',
+    'phone': 'Your Phone',
+    'email': 'your@email.com'
+}
+
+# One environment for every invoice: templates are compiled on first use and
+# kept in the environment's cache, and auto_reload skips the mtime check
+_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR),
+                   autoescape=select_autoescape(['html']),
+                   auto_reload=False,
+                   trim_blocks=True,
+                   lstrip_blocks=True)
+
+_HEADER = _env.from_string("""<div class="header">
+        <h1>{{ company.name }}</h1>
+        <p>{{ company.address }}</p>
+        <p>GST No: {{ company.gst }}</p>
+        <h2>Tax Invoice</h2>
+    </div>""")
+
+
+def interstate_supply(company, customer):
+    """True when the customer's GSTIN is from another state than ours.
+
+    The rule GstReturns files by; a customer without a GSTIN is taken to
+    be in our own state.
+    """
+    home = state_code((company or {}).get('gst'))
+    other = state_code((customer or {}).get('gst_no'))
+    return bool(home and other and other != home)
+
+
+class InvoiceRenderer:
+    """Renders the A4 tax invoice shared by Storage and BillGenerator.
+
+    The company header is rendered once per renderer; each bill then only
+    renders its own details and line rows.
+    """
+
+    def __init__(self, company_info=None):
+        self.company = dict(company_info or DEFAULT_COMPANY_INFO)
+        self.template = _env.get_template('invoice.html')
+        self.header = Markup(_HEADER.render(company=self.company))
+
+    @staticmethod
+    def totals(items, interstate=False):
+        """Bill totals summed in paise, one entry per tax head.
+
+        On an interstate bill the GST charged is shown as IGST instead of
+        CGST + SGST. The total is the sum of the heads, so the printed lines
+        always add up to it and to the line totals.
+        """
+        subtotal = sum(to_paise(item['subtotal']) for item in items)
+        gst_amount = sum(to_paise(item['gst_amount']) for item in items)
+        cess = sum(to_paise(item.get('cess')) for item in items)
+        if interstate:
+            cgst = sgst = 0
+            igst = gst_amount
+        else:
+            # Lines carry equal halves; an odd paisa on older lines goes to CGST
+            sgst = gst_amount // 2
+            cgst = gst_amount - sgst
+            igst = 0
+        return {
+            'subtotal': to_rupees(subtotal),
+            'cgst': to_rupees(cgst),
+            'sgst': to_rupees(sgst),
+            'igst': to_rupees(igst),
+            'cess': to_rupees(cess),
+            'total': to_rupees(subtotal + cgst + sgst + igst + cess)
+        }
+
+    def _context(self, bill_no, date, items, customer, qr_code):
+        return {
+            'header': self.header,
+            'company': self.company,
+            'bill_no': bill_no,
+            'date': date,
+            'items': items,
+            'customer': customer,
+            'qr_code': qr_code,
+            'totals': self.totals(items, interstate_supply(self.company, customer))
+        }
+
+    def stream(self, bill_no, date, items, customer=None, qr_code=''):
+        """Yield the invoice in chunks, one line row at a time"""
+        return self.template.generate(
+            self._context(bill_no, date, items, customer, qr_code))
+
+    def render(self, bill_no, date, items, customer=None, qr_code=''):
+        return ''.join(self.stream(bill_no, date, items, customer, qr_code))
+
+    def render_invoice(self, invoice):
+        """Render an invoice dict as built by Storage.build_invoice"""
+        qr_code = base64.b64encode(invoice.get('qr_png') or b'').decode()
+        return self.render(invoice['bill_no'], invoice['date'], invoice['items'],
+                           invoice['customer'], qr_code)
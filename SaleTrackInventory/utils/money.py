@@ -0,0 +1,142 @@
+"""Money in integer paise, with GST rounding.
+
+Amounts are computed in whole paise and rounded half up to the paisa per
+tax head, the way GST invoices are rounded: CGST and SGST are each levied
+at half the rate on the line's taxable value and rounded separately, so
+the GST on a line is always exactly CGST + SGST and bill totals are plain
+integer sums of their lines. The database keeps rupees; convert with
+to_paise() on the way in and to_rupees() on the way out.
+"""
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+# Absorbs binary error in prices such as 10.005, whose float is 10.00499...
+_EPSILON = 1e-6
+_PAISA = Decimal('0.01')
+
+
+def to_paise(amount):
+    """Rupees (float, int, str or Decimal) to whole paise, rounding half up"""
+    if amount is None:
+        return 0
+    if isinstance(amount, (str, Decimal)):
+        return int(Decimal(amount).quantize(_PAISA, ROUND_HALF_UP) * 100)
+    scaled = abs(amount) * 100
+    paise = math.floor(scaled + 0.5 + _EPSILON)
+    return -paise if amount < 0 else paise
+
+
+def to_rupees(paise):
+    return paise / 100
+
+
+def to_decimal(paise):
+    return Decimal(int(paise)) / 100
+
+
+def rate_basis_points(rate):
+    """A percentage rate in hundredths of a percent: 18 -> 1800, 0.25 -> 25"""
+    return round((rate or 0) * 100)
+
+
+def _levy(taxable, basis_points, divisor=10000):
+    """taxable * basis_points / divisor, rounded half up to the paisa"""
+    amount = taxable * basis_points
+    quotient = (2 * abs(amount) + divisor) // (2 * divisor)
+    return -quotient if amount < 0 else quotient
+
+
+def _taxable(price_paise, quantity):
+    if isinstance(quantity, int):
+        return price_paise * quantity
+    # Loose goods sold by weight
+    return to_paise(price_paise * quantity / 100)
+
+
+def tax_paise(price, quantity, gst_rate, cess_rate=0):
+    """One line's tax heads in paise"""
+    subtotal = _taxable(to_paise(price), quantity)
+    gst_bp = rate_basis_points(gst_rate)
+    cgst = _levy(subtotal, gst_bp, 20000)
+    gst_amount = 2 * cgst
+    cess = _levy(subtotal, rate_basis_points(cess_rate))
+    return {
+        'subtotal': subtotal,
+        'cgst': cgst,
+        'sgst': cgst,
+        # Charged instead of CGST + SGST on an interstate invoice, and
+        # rounded at the full rate there
+        'igst': _levy(subtotal, gst_bp),
+        'cess': cess,
+        'gst_amount': gst_amount,
+        'total': subtotal + gst_amount + cess
+    }
+
+
+def calculate_tax(price, quantity, gst_rate, cess_rate=0):
+    """One line's tax heads in rupees"""
+    return {head: to_rupees(paise)
+            for head, paise in tax_paise(price, quantity, gst_rate, cess_rate).items()}
+
+
+def _levy_batch(taxable, basis_points, divisor=10000):
+    amount = taxable * basis_points
+    quotient = (2 * np.abs(amount) + divisor) // (2 * divisor)
+    return np.where(amount < 0, -quotient, quotient)
+
+
+def _paise_batch(amounts):
+    amounts = np.asarray(amounts, dtype=np.float64)
+    paise = np.floor(np.abs(amounts) * 100 + 0.5 + _EPSILON).astype(np.int64)
+    return np.where(amounts < 0, -paise, paise)
+
+
+def tax_paise_batch(prices, quantities, gst_rates, cess_rates=None):
+    """tax_paise() for many lines at once, as int64 arrays keyed by tax head.
+
+    Gives exactly the same paise as tax_paise() line by line.
+    """
+    price_paise = _paise_batch(prices)
+    quantities = np.asarray(quantities)
+    if np.issubdtype(quantities.dtype, np.integer):
+        subtotal = price_paise * quantities.astype(np.int64)
+    else:
+        subtotal = _paise_batch(price_paise * quantities / 100)
+    gst_bp = np.rint(np.asarray(gst_rates, dtype=np.float64) * 100).astype(np.int64)
+    if cess_rates is None:
+        cess = np.zeros_like(subtotal)
+    else:
+        cess_bp = np.rint(np.asarray(cess_rates, dtype=np.float64) * 100).astype(np.int64)
+        cess = _levy_batch(subtotal, cess_bp)
+    cgst = _levy_batch(subtotal, gst_bp, 20000)
+    gst_amount = 2 * cgst
+    return {
+        'subtotal': subtotal,
+        'cgst': cgst,
+        'sgst': cgst,
+        'igst': _levy_batch(subtotal, gst_bp),
+        'cess': cess,
+        'gst_amount': gst_amount,
+        'total': subtotal + gst_amount + cess
+    }
+
+
+def calculate_tax_batch(prices, quantities, gst_rates, cess_rates=None):
+    """calculate_tax() for many lines at once, as float64 rupee arrays"""
+    return {head: paise / 100
+            for head, paise in tax_paise_batch(prices, quantities, gst_rates,
+                                               cess_rates).items()}
+
+
+def tax_rows(batch):
+    """Split a calculate_tax_batch() result back into one dict per line"""
+    heads = list(batch)
+    columns = [batch[head].tolist() for head in heads]
+    return [dict(zip(heads, values)) for values in zip(*columns)]
+
+
+def money_sum(amounts):
+    """Sum rupee amounts exactly, paisa by paisa"""
+    return to_rupees(sum(to_paise(amount) for amount in amounts))
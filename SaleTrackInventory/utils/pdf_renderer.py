@@ -0,0 +1,201 @@
+import os
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0.75in',
+    'margin-right': '0.75in',
+    'margin-bottom': '0.75in',
+    'margin-left': '0.75in',
+    'encoding': "UTF-8",
+}
+
+
+def html_to_pdf(html, output_path=None):
+    """Render invoice HTML through wkhtmltopdf"""
+    # Imported here so the canvas backend works without pdfkit installed
+    import pdfkit
+
+    if output_path:
+        return pdfkit.from_string(html, output_path, options=PDF_OPTIONS)
+    return pdfkit.from_string(html, False, options=PDF_OPTIONS)
+
+
+class InvoiceBackend(ABC):
+    """Turns an invoice dict (see Storage.build_invoice) into PDF bytes"""
+
+    name = None
+
+    def load(self):
+        """Import the libraries render() needs; called once per render worker"""
+
+    @abstractmethod
+    def render(self, invoice):
+        """PDF bytes for the invoice"""
+
+
+class PdfkitBackend(InvoiceBackend):
+    """Renders the Jinja HTML invoice through a wkhtmltopdf subprocess"""
+
+    name = 'pdfkit'
+
+    def load(self):
+        import pdfkit  # noqa: F401
+        import utils.invoice_renderer  # noqa: F401
+
+    def render(self, invoice):
+        from utils.invoice_renderer import InvoiceRenderer
+        return html_to_pdf(InvoiceRenderer(invoice['company']).render_invoice(invoice))
+
+
+class CanvasBackend(InvoiceBackend):
+    """Draws the A4 tax invoice in-process with reportlab's canvas.
+
+    No subprocess and no HTML/CSS parsing. The built-in PDF fonts have no
+    rupee glyph, so amounts are prefixed with 'Rs.'.
+    """
+
+    name = 'canvas'
+
+    COLUMNS = (('Item', 0.0), ('HSN', 0.30), ('Qty', 0.40), ('Rate', 0.48),
+               ('Amount', 0.60), ('GST %', 0.72), ('GST Amt', 0.80),
+               ('Total', 0.91))
+
+    def load(self):
+        import reportlab.pdfgen.canvas  # noqa: F401
+
+    def render(self, invoice):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import inch
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        width, height = A4
+        margin = 0.75 * inch
+        left, right = margin, width - margin
+        usable = right - left
+        company = invoice['company']
+        y = height - margin
+
+        def text(x, value, size=10, font='Helvetica', align='left'):
+            pdf.setFont(font, size)
+            draw = {
+                'left': pdf.drawString,
+                'center': pdf.drawCentredString,
+                'right': pdf.drawRightString
+            }[align]
+            draw(x, y, str(value))
+
+        def money(value):
+            return f"Rs.{value:.2f}"
+
+        text(width / 2, company['name'], 16, 'Helvetica-Bold', 'center')
+        for line in (company['address'], f"GST No: {company['gst']}"):
+            y -= 14
+            text(width / 2, line, align='center')
+        y -= 20
+        text(width / 2, 'Tax Invoice', 13, 'Helvetica-Bold', 'center')
+
+        y -= 28
+        for line in (f"Phone: {company['phone']}", f"Email: {company['email']}",
+                     f"Invoice No: {invoice['bill_no']}",
+                     f"Date: {invoice['date']}"):
+            text(left, line)
+            y -= 13
+
+        y -= 8
+        text(left, 'Bill To:', 11, 'Helvetica-Bold')
+        customer = invoice['customer']
+        y -= 14
+        text(left, customer['name'] if customer else 'Walk-in Customer')
+        if customer:
+            y -= 13
+            text(left, f"Mobile: {customer['mobile']}")
+            if customer.get('gst_no'):
+                y -= 13
+                text(left, f"GST No: {customer['gst_no']}")
+
+        def table_header():
+            nonlocal y
+            y -= 22
+            for label, offset in self.COLUMNS:
+                text(left + offset * usable, label, 9, 'Helvetica-Bold')
+            pdf.line(left, y - 4, right, y - 4)
+
+        table_header()
+        for item in invoice['items']:
+            y -= 15
+            if y < margin + 40:
+                pdf.showPage()
+                y = height - margin
+                table_header()
+                y -= 15
+            values = (str(item['product_name'])[:28], item.get('hsn_code') or '-',
+                      item['quantity'], money(item['price']),
+                      money(item['subtotal']), f"{item['gst_rate']}%",
+                      money(item['gst_amount']), money(item['total']))
+            for (_, offset), value in zip(self.COLUMNS, values):
+                text(left + offset * usable, value, 9)
+
+        totals = invoice['totals']
+        if y < margin + 200:
+            pdf.showPage()
+            y = height - margin
+        y -= 28
+        taxes = ((('IGST', totals['igst']), ) if totals['igst'] else
+                 (('CGST', totals['cgst']), ('SGST', totals['sgst'])))
+        for label, value in (('Subtotal', totals['subtotal']), *taxes,
+                             ('Cess', totals['cess']), ('Total', totals['total'])):
+            text(right - 150, f"{label}:", 10, 'Helvetica-Bold')
+            text(right, money(value), align='right')
+            y -= 14
+
+        if invoice.get('qr_png'):
+            size = 110
+            y -= size + 6
+            pdf.drawImage(ImageReader(BytesIO(invoice['qr_png'])),
+                          (width - size) / 2, y, size, size)
+            y -= 12
+            text(width / 2, 'Scan to verify bill', 9, align='center')
+
+        y -= 24
+        text(width / 2, 'This is a computer generated invoice', 8, align='center')
+
+        pdf.showPage()
+        pdf.save()
+        return buffer.getvalue()
+
+
+BACKENDS = {backend.name: backend for backend in (CanvasBackend(), PdfkitBackend())}
+
+
+def default_backend_name():
+    """INVOICE_PDF_BACKEND if set, else canvas when reportlab is installed"""
+    name = os.environ.get('INVOICE_PDF_BACKEND')
+    if name:
+        return name
+    try:
+        import reportlab  # noqa: F401
+        return CanvasBackend.name
+    except ImportError:
+        return PdfkitBackend.name
+
+
+def get_backend(backend_name=None):
+    """The named backend, or the default one"""
+    name = backend_name or default_backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown invoice PDF backend {name!r}; "
+                         f"expected one of: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name]
+
+
+def render_invoice_pdf(invoice, backend_name=None):
+    """Render an invoice with the named backend.
+
+    Module-level so the render queue can ship it to worker processes.
+    """
+    return get_backend(backend_name).render(invoice)
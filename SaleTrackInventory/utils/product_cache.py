@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_barcode(barcode):
+    barcode = str(barcode).strip() if barcode is not None else ''
+    return barcode or None
+
+
+class HotProductCache:
+    """Small LRU of recently scanned products keyed by barcode.
+
+    Storage invalidates an entry as soon as a committed write touches its
+    product (sale, purchase, edit). The TTL bounds staleness from writes
+    made by other processes sharing the database.
+    """
+
+    def __init__(self, maxsize=2048, ttl=5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._barcodes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, barcode):
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(barcode)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(barcode)
+            self.misses += 1
+            return None
+
+    def put(self, barcode, product):
+        with self._lock:
+            if barcode in self._entries:
+                self._drop(barcode)
+            self._entries[barcode] = (time.monotonic() + self.ttl, product)
+            self._barcodes[product['id']] = barcode
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, barcode):
+        _, product = self._entries.pop(barcode)
+        if self._barcodes.get(product['id']) == barcode:
+            del self._barcodes[product['id']]
+
+    def invalidate(self, product_id):
+        with self._lock:
+            barcode = self._barcodes.get(product_id)
+            if barcode is not None:
+                self._drop(barcode)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._barcodes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
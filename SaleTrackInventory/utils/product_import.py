@@ -0,0 +1,167 @@
+import pandas as pd
+
+VALID_GST_RATES = (0, 5, 12, 18, 28)
+
+PRODUCT_FIELDS = ('name', 'price', 'quantity', 'mrp', 'barcode', 'unit',
+                  'category', 'hsn_code', 'gst_rate', 'cess_rate')
+
+REQUIRED_FIELDS = ('name', 'price', 'quantity')
+
+# Column headers of the downloadable import template
+TEMPLATE_MAPPINGS = {
+    'Product Name*': 'name',
+    'Price*': 'price',
+    'Quantity*': 'quantity',
+    'MRP': 'mrp',
+    'Barcode': 'barcode',
+    'Unit': 'unit',
+    'Category': 'category',
+    'HSN Code': 'hsn_code',
+    'GST Rate': 'gst_rate',
+}
+
+
+def clean_text(series):
+    """Strip cells to text, turning blanks into NA"""
+    text = series.astype('string').str.strip()
+    return text.mask(text == '')
+
+
+def _whole_float(value):
+    return isinstance(value, float) and value.is_integer()
+
+
+def clean_code(series):
+    """clean_text for barcode and HSN columns.
+
+    Excel and pandas hand numeric codes back as floats, so 8901234567890
+    arrives as 8901234567890.0. Only cells that were numbers in the sheet
+    are written back as whole numbers; a code typed as text is kept as it
+    is, '.0' and all.
+    """
+    whole = series.map(_whole_float).astype(bool)
+    if whole.any():
+        series = series.astype(object)
+        series[whole] = [str(int(value)) for value in series[whole]]
+    return clean_text(series)
+
+
+class ImportAborted(Exception):
+    """Raised inside an import transaction to roll back after row errors"""
+
+
+class ImportReport:
+    def __init__(self, total_rows, dry_run=False):
+        self.total_rows = total_rows
+        self.dry_run = dry_run
+        self.errors = []
+        self.imported = 0
+
+    @property
+    def valid_rows(self):
+        return self.total_rows - len({error['row'] for error in self.errors})
+
+    def merge(self, other):
+        self.total_rows += other.total_rows
+        self.errors.extend(other.errors)
+        self.imported += other.imported
+
+    def flag(self, frame, mask, field, message):
+        for idx in frame.index[mask.fillna(False).to_numpy(dtype=bool)]:
+            self.errors.append({
+                'row': int(idx) + 1,
+                'field': field,
+                'message': message
+            })
+
+    def to_dict(self):
+        return {
+            'total_rows': self.total_rows,
+            'valid_rows': self.valid_rows,
+            'imported': self.imported,
+            'dry_run': self.dry_run,
+            'errors': sorted(self.errors, key=lambda error: error['row'])
+        }
+
+
+def validate_products(df,
+                      mappings,
+                      existing_barcodes=(),
+                      dry_run=False,
+                      seen_barcodes=()):
+    """Validate and coerce a whole sheet column by column.
+
+    mappings maps sheet column -> product field. Returns the cleaned frame
+    (one column per product field, invalid rows removed) and an ImportReport
+    with one entry per failed check. seen_barcodes holds barcodes from
+    earlier chunks of the same file.
+    """
+    report = ImportReport(len(df), dry_run)
+    columns = {field: column for column, field in mappings.items() if field}
+
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    frame = pd.DataFrame(index=df.index)
+    for field in PRODUCT_FIELDS:
+        frame[field] = df[columns[field]] if field in columns else pd.NA
+
+    frame['name'] = clean_text(frame['name'])
+    report.flag(frame, frame['name'].isna(), 'name',
+                "Product name cannot be empty")
+
+    price = pd.to_numeric(frame['price'], errors='coerce')
+    report.flag(frame, price.isna(), 'price', "Price must be a number")
+    report.flag(frame, price <= 0, 'price', "Price must be greater than 0")
+    frame['price'] = price
+
+    mrp = pd.to_numeric(frame['mrp'], errors='coerce')
+    frame['mrp'] = mrp.fillna(price)
+
+    quantity = pd.to_numeric(frame['quantity'], errors='coerce')
+    report.flag(frame, quantity.isna() | (quantity % 1 != 0), 'quantity',
+                "Quantity must be a whole number")
+    report.flag(frame, quantity < 0, 'quantity', "Quantity cannot be negative")
+    frame['quantity'] = quantity
+
+    gst_rate = pd.to_numeric(frame['gst_rate'], errors='coerce')
+    report.flag(frame,
+                frame['gst_rate'].notna() & ~gst_rate.isin(VALID_GST_RATES),
+                'gst_rate', "Invalid GST rate. Must be 0, 5, 12, 18, or 28")
+    frame['gst_rate'] = gst_rate.fillna(0)
+    frame['cess_rate'] = pd.to_numeric(frame['cess_rate'],
+                                       errors='coerce').fillna(0)
+
+    for field in ('unit', 'category'):
+        frame[field] = clean_text(frame[field])
+    for field in ('barcode', 'hsn_code'):
+        frame[field] = clean_code(frame[field])
+
+    # Duplicate barcodes: within the sheet, then against the products table
+    barcode = frame['barcode']
+    report.flag(frame, barcode.notna() & barcode.duplicated(keep=False),
+                'barcode', "Barcode repeated in file")
+    if seen_barcodes:
+        report.flag(frame, barcode.isin(set(seen_barcodes)), 'barcode',
+                    "Barcode repeated in file")
+    clashes = set(barcode.dropna()) & set(existing_barcodes)
+    if clashes:
+        report.flag(frame, barcode.isin(clashes), 'barcode',
+                    "Duplicate barcode already in inventory")
+
+    failed = {error['row'] - 1 for error in report.errors}
+    valid = frame[~frame.index.isin(failed)].copy()
+    valid['quantity'] = valid['quantity'].astype(int)
+    valid['gst_rate'] = valid['gst_rate'].astype(int)
+    valid['cess_rate'] = valid['cess_rate'].astype(int)
+    return valid, report
+
+
+def product_rows(frame):
+    """Yield DB-ready tuples in PRODUCT_FIELDS order, with NA as None"""
+    # tolist() hands back Python scalars, which sqlite3 can bind directly
+    columns = [[None if pd.isna(value) else value
+                for value in frame[field].tolist()]
+               for field in PRODUCT_FIELDS]
+    return zip(*columns)
@@ -0,0 +1,33 @@
+import base64
+import json
+from io import BytesIO
+
+import qrcode
+
+from utils.bill_cache import content_key
+
+
+def qr_png(payload):
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(json.dumps(payload))
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffered = BytesIO()
+    img.save(buffered)
+    return buffered.getvalue()
+
+
+def cached_qr_png(payload, cache=None):
+    """PNG bytes of a QR code for payload, served from cache when possible"""
+    key = content_key('qr', payload)
+    png = cache.get('qr', key) if cache else None
+    if png is None:
+        png = qr_png(payload)
+        if cache:
+            cache.put('qr', key, png)
+    return png
+
+
+def qr_base64(payload, cache=None):
+    return base64.b64encode(cached_qr_png(payload, cache)).decode()
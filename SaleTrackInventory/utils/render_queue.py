@@ -0,0 +1,233 @@
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class QueueFull(Exception):
+    """Raised when the render queue is at capacity"""
+
+
+def _timed_render(render, args):
+    started = time.perf_counter()
+    result = render(*args)
+    return result, time.perf_counter() - started
+
+
+class RenderJob:
+    def __init__(self, key, args):
+        self.key = key
+        self.args = args
+        self.status = 'pending'
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.enqueued_at = time.time()
+        self.finished_at = None
+
+    @classmethod
+    def completed(cls, key, result):
+        """A job that was satisfied without rendering, e.g. from a cache"""
+        job = cls(key, ())
+        job.status = 'done'
+        job.result = result
+        job.finished_at = job.enqueued_at
+        return job
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'enqueued_at': self.enqueued_at,
+            'finished_at': self.finished_at
+        }
+
+
+class RenderQueue:
+    """Renders documents in a process pool off the request thread.
+
+    At most max_pending jobs may be outstanding; submit() raises QueueFull
+    beyond that so callers can shed load instead of piling up work. Failed
+    renders are retried with exponential backoff, and finished results are
+    kept for the last keep_results keys. on_done, if given, is called with
+    every successfully rendered job.
+
+    Workers are spawned and run initializer(*initargs) once at startup.
+    render and initializer should live in a module with no import-time
+    side effects, such as utils.render_worker.
+    """
+
+    def __init__(self,
+                 render,
+                 workers=2,
+                 max_pending=64,
+                 max_retries=2,
+                 retry_delay=0.5,
+                 keep_results=256,
+                 on_done=None,
+                 initializer=None,
+                 initargs=()):
+        self.render = render
+        self.initializer = initializer
+        self.initargs = initargs
+        self.on_done = on_done
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.keep_results = keep_results
+        self.jobs = OrderedDict()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._render_times = deque(maxlen=500)
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retried': 0,
+            'rejected': 0
+        }
+
+    def executor(self):
+        """The worker pool, started on first use; shared with batch renders"""
+        return self._get_executor()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded web server is not safe
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer, initargs=self.initargs)
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=False)
+            self._executor = None
+
+    def submit(self, key, *args):
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is not None and job.status in ('pending', 'done'):
+                return job
+
+            if not self._slots.acquire(blocking=False):
+                self._counters['rejected'] += 1
+                raise QueueFull(
+                    f"Render queue is full ({self.max_pending} pending)")
+
+            job = RenderJob(key, args)
+            self.jobs[key] = job
+            self.jobs.move_to_end(key)
+            self._counters['submitted'] += 1
+
+        try:
+            self._dispatch(job)
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            self._slots.release()
+            raise
+        return job
+
+    def _dispatch(self, job):
+        job.attempts += 1
+        try:
+            future = self._get_executor().submit(_timed_render, self.render,
+                                                 job.args)
+        except BrokenProcessPool:
+            self._reset_executor()
+            future = self._get_executor().submit(_timed_render, self.render,
+                                                 job.args)
+        future.add_done_callback(lambda done: self._finished(job, done))
+
+    def _finished(self, job, future):
+        try:
+            result, elapsed = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._reset_executor()
+            if job.attempts <= self.max_retries:
+                with self._lock:
+                    self._counters['retried'] += 1
+                delay = self.retry_delay * 2**(job.attempts - 1)
+                logging.warning(
+                    f"Render of {job.key} failed ({e}), retrying in {delay:.1f}s")
+                timer = threading.Timer(delay, self._retry, (job, ))
+                timer.daemon = True
+                timer.start()
+                return
+            logging.error(f"Render of {job.key} failed: {e}")
+            self._complete(job, error=e)
+        else:
+            with self._lock:
+                self._render_times.append(elapsed)
+            if self.on_done is not None:
+                try:
+                    self.on_done(job, result)
+                except Exception as e:
+                    logging.error(f"Render callback for {job.key} failed: {e}")
+            self._complete(job, result=result)
+
+    def _retry(self, job):
+        try:
+            self._dispatch(job)
+        except Exception as e:
+            logging.error(f"Render of {job.key} could not be retried: {e}")
+            self._complete(job, error=e)
+
+    def _complete(self, job, result=None, error=None):
+        job.result = result
+        job.error = str(error) if error is not None else None
+        job.status = 'failed' if error is not None else 'done'
+        job.finished_at = time.time()
+        with self._lock:
+            self._counters['failed' if error is not None else 'completed'] += 1
+            self._evict()
+        self._slots.release()
+
+    def _evict(self):
+        finished = [
+            key for key, job in self.jobs.items() if job.status != 'pending'
+        ]
+        for key in finished[:max(0, len(finished) - self.keep_results)]:
+            del self.jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            return self.jobs.get(key)
+
+    def metrics(self):
+        with self._lock:
+            times = sorted(self._render_times)
+            depth = sum(1 for job in self.jobs.values() if job.status == 'pending')
+            counters = dict(self._counters)
+
+        def percentile(pct):
+            if not times:
+                return None
+            return round(times[min(len(times) - 1, int(len(times) * pct))] * 1000, 2)
+
+        return {
+            'queue_depth': depth,
+            'max_pending': self.max_pending,
+            'workers': self.workers,
+            **counters,
+            'render_ms_avg': round(sum(times) / len(times) * 1000, 2) if times else None,
+            'render_ms_p50': percentile(0.5),
+            'render_ms_p95': percentile(0.95)
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,17 @@
+"""Entry point for the PDF render worker processes.
+
+Workers are spawned, so each one starts a fresh interpreter and imports
+only what its jobs reference. Everything they run is here or in the
+renderers it imports. Nothing here reaches app or storage, which would
+open the database and start the delivery outbox in every worker.
+"""
+from utils.pdf_renderer import get_backend, render_invoice_pdf
+
+
+def init_worker(backend_name=None):
+    """Import the backend's libraries once, before the first job arrives"""
+    get_backend(backend_name).load()
+
+
+def render_invoice(invoice, backend_name=None):
+    return render_invoice_pdf(invoice, backend_name)
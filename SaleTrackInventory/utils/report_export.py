@@ -0,0 +1,46 @@
+import csv
+import io
+import tempfile
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def stream_csv(header, rows, batch_rows=1000):
+    """Yield a CSV file as UTF-8 chunks of batch_rows rows each"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def stream_xlsx(header, rows, title='Report', chunk_size=64 * 1024):
+    """Yield an xlsx workbook in chunks, holding only one row in memory.
+
+    Write-only mode spools each appended row to a temporary file, and the
+    finished workbook is assembled on disk and read back, so memory does
+    not grow with the row count. The ZIP container is only complete after
+    the last row, so the first chunk arrives once every row is written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
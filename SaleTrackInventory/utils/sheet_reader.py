@@ -0,0 +1,117 @@
+import io
+from contextlib import contextmanager
+from itertools import islice
+
+import pandas as pd
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# CSV cells are read as text, as openpyxl hands them over, so barcodes and
+# HSN codes keep their leading zeros; only empty cells become NA. The
+# numeric columns are converted by the import validation.
+_CSV_OPTIONS = {'dtype': str, 'keep_default_na': False, 'na_values': ['']}
+
+
+def sheet_format(filename):
+    name = (filename or '').lower()
+    for extension in SUPPORTED_EXTENSIONS:
+        if name.endswith(extension):
+            return extension[1:]
+    raise ValueError("Invalid file format. Please upload an Excel or CSV file.")
+
+
+def _header(values):
+    return [str(value) if value is not None else f'Column {position + 1}'
+            for position, value in enumerate(values)]
+
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+
+    # read_only parses the sheet XML lazily instead of building every cell
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+@contextmanager
+def _csv_text(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield text
+    finally:
+        # Detach so the caller's upload stream is not closed with the wrapper
+        text.detach()
+
+
+def preview_sheet(stream, filename, rows=5):
+    """Return (columns, first `rows` records) reading only what is needed"""
+    fmt = sheet_format(filename)
+
+    if fmt == 'csv':
+        with _csv_text(stream) as text:
+            df = pd.read_csv(text, nrows=rows, **_CSV_OPTIONS)
+        return df.columns.tolist(), df.to_dict('records')
+
+    if fmt == 'xls':
+        # xlrd has no streaming mode; nrows at least bounds the DataFrame
+        df = pd.read_excel(stream, engine='xlrd', nrows=rows)
+        return df.columns.tolist(), df.to_dict('records')
+
+    sheet = _xlsx_rows(stream)
+    try:
+        columns = _header(next(sheet, ()))
+        records = [dict(zip(columns, values)) for values in islice(sheet, rows)]
+    finally:
+        sheet.close()
+    return columns, records
+
+
+def iter_sheet_chunks(stream, filename, chunksize=DEFAULT_CHUNK_SIZE):
+    """Yield the sheet as DataFrames of at most `chunksize` rows.
+
+    The index keeps counting across chunks, so row numbers in error reports
+    refer to the position in the whole file.
+    """
+    fmt = sheet_format(filename)
+
+    if fmt == 'csv':
+        with _csv_text(stream) as text:
+            with pd.read_csv(text, chunksize=chunksize, **_CSV_OPTIONS) as reader:
+                yield from reader
+        return
+
+    if fmt == 'xls':
+        df = pd.read_excel(stream, engine='xlrd')
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+
+    sheet = _xlsx_rows(stream)
+    try:
+        columns = _header(next(sheet, ()))
+        width = len(columns)
+        offset = 0
+        while True:
+            raw = list(islice(sheet, chunksize))
+            if not raw:
+                break
+            # Match pandas: ragged rows are padded, fully blank rows skipped
+            batch = [
+                tuple(values[:width]) + (None, ) * (width - len(values))
+                for values in raw
+                if any(value is not None for value in values)
+            ]
+            if not batch:
+                continue
+            yield pd.DataFrame(batch,
+                               columns=columns,
+                               index=pd.RangeIndex(offset, offset + len(batch)))
+            offset += len(batch)
+    finally:
+        sheet.close()